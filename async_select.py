@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  非同步選擇影片
+# ===================================================================================
+#
+#  說明：
+#  選擇影片時要做的事 (讀取影片資訊、解碼第一張畫面、載入既有字幕、清除暫存檔…)
+#  彼此獨立，改為同時丟到執行緒池，介面不再卡住。
+#  1. 每個工作完成時把結果放進佇列並呼叫 notify() 喚醒介面執行緒
+#     (Tk 用 event_generate，Qt 用 signal)，介面執行緒再呼叫 drain() 套用結果。
+#  2. 每次選擇都有新的世代編號；使用者在工作完成前又選了別的影片時，
+#     舊世代的結果在 drain() 時直接丟棄，不會蓋掉新影片的畫面。
+#  3. read_poster() 在背景讀取影片資訊並解碼、縮放第一張畫面，介面執行緒只需顯示。
+#  4. 影片旁的 .srt 就是上次辨識的結果，播放器以它作為轉錄快取，在背景讀取：VLC 版直接掛上播放，
+#     OpenCV 版需要提取出的音訊作為時鐘，改為沿用它排入處理佇列 (不重新執行 whisper.cpp)。
+#     沒有另外的轉錄快取。
+#
+# ===================================================================================
+
+import queue, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from log_util import log
+
+class AsyncSelector:
+    def __init__(self, notify, max_workers=4):
+        '''notify(): 可在任何執行緒呼叫、用來喚醒介面執行緒的函式。'''
+        self.notify = notify
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="select")
+        self.pending = queue.Queue()
+        self.generation = 0
+
+    def select(self, path, tasks, on_result):
+        '''tasks: {名稱: fn(path)}；每個工作完成後在介面執行緒呼叫 on_result(名稱, 結果, 例外)。'''
+        self.generation += 1
+        gen, t0 = self.generation, time.perf_counter()
+        for name, fn in tasks.items():
+            future = self.pool.submit(fn, path)
+            future.add_done_callback(lambda f, name=name: self._done(gen, name, f, on_result, t0))
+        return gen
+
+    def _done(self, gen, name, future, on_result, t0):
+        self.pending.put((gen, name, future, on_result, (time.perf_counter() - t0) * 1000))
+        self.notify()
+
+    def drain(self):
+        '''在介面執行緒呼叫：套用已完成且仍屬於目前選擇的結果。'''
+        while True:
+            try: gen, name, future, on_result, elapsed_ms = self.pending.get_nowait()
+            except queue.Empty: return
+            if gen != self.generation: continue  # 已被新的選擇取代
+            error = future.exception()
+            if error: log(f"選擇影片工作 {name} 失敗: {''.join(traceback.format_exception_only(type(error), error)).strip()}")
+            else: log(f"選擇影片工作 {name} 完成 ({elapsed_ms:.0f} ms)")
+            on_result(name, None if error else future.result(), error)
+
+    def cancel(self):
+        '''丟棄目前選擇尚未套用的結果。'''
+        self.generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def read_poster(path, max_size=None):
+    '''讀取影片資訊並解碼第一張畫面 (縮到 max_size 以內的 RGB PIL 影像)，供選擇影片時預覽。'''
+    import cv2
+    from PIL import Image
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened(): raise RuntimeError(f"無法開啟影片: {path}")
+        fps, frame_count = cap.get(cv2.CAP_PROP_FPS), cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        info = {'fps': fps if fps > 0 else 30, 'frame_count': int(frame_count),
+                'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                'duration_ms': frame_count / fps * 1000 if fps > 0 else 0, 'image': None}
+        ret, frame = cap.read()
+        if ret:
+            img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if max_size and min(max_size) > 1: img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            info['image'] = img
+        return info
+    finally:
+        cap.release()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  音訊主時鐘 (pygame.mixer.music)
+# ===================================================================================
+#
+#  說明：
+#  pygame.mixer.music.get_pos() 回傳的是「上一次 play() 之後播放了多久」，
+#  跳轉後就不再是影片的絕對時間。AudioClock 自行記錄偏移量，
+#  使 position_ms() 在跳轉與暫停後仍是絕對播放位置，供影像同步使用。
+#  1. 跳轉優先使用 set_pos() 在現有串流上移動，不重新 load 檔案也不重啟串流；
+#     格式不支援時才退回 play(start=...)。
+#  2. seek() 記錄時間戳，畫面顯示後呼叫 frame_presented() 即可取得
+#     「跳轉到第一張畫面」的延遲，超過 SEEK_LATENCY_BUDGET_MS 會寫入日誌。
+#
+# ===================================================================================
+
+import time
+import pygame
+from log_util import log
+
+SEEK_LATENCY_BUDGET_MS = 100
+
+class AudioClock:
+    def __init__(self):
+        self.loaded = None
+        self.offset_ms = 0
+        self.started = False
+        self.paused = False
+        self.seek_latencies = []
+        self._seek_t0 = None
+
+    def load(self, path):
+        pygame.mixer.music.load(path)
+        self.loaded = path
+        self.offset_ms, self.started, self.paused = 0, False, False
+
+    def _start(self, ms):
+        try:
+            pygame.mixer.music.play(start=ms / 1000.0)
+            self.offset_ms = ms
+        except pygame.error:
+            pygame.mixer.music.play()
+            try:
+                pygame.mixer.music.set_pos(ms / 1000.0)
+                self.offset_ms = ms
+            except pygame.error as e:
+                log(f"此音訊格式不支援跳轉，將從頭播放: {e}")
+                self.offset_ms = 0
+        self.started, self.paused = True, False
+
+    def play(self, start_ms=0):
+        self._start(max(0, start_ms))
+
+    def pause(self):
+        if self.started and not self.paused:
+            pygame.mixer.music.pause()
+            self.paused = True
+
+    def resume(self):
+        if self.paused:
+            pygame.mixer.music.unpause()
+            self.paused = False
+
+    def stop(self):
+        if pygame.mixer.get_init(): pygame.mixer.music.stop()
+        self.offset_ms, self.started, self.paused = 0, False, False
+
+    def unload(self):
+        self.stop()
+        self.loaded = None
+
+    def is_finished(self):
+        return self.started and not self.paused and not pygame.mixer.music.get_busy()
+
+    def position_ms(self):
+        '''目前的絕對播放位置 (毫秒)。'''
+        if not self.started: return self.offset_ms
+        return self.offset_ms + max(0, pygame.mixer.music.get_pos())
+
+    def seek(self, ms, paused=False):
+        '''跳轉到絕對位置 ms；paused=True 時跳轉後保持暫停。'''
+        ms = max(0, ms)
+        self._seek_t0 = time.perf_counter()
+        if self.started and not self.is_finished():
+            try:
+                pygame.mixer.music.set_pos(ms / 1000.0)
+                self.offset_ms = ms - max(0, pygame.mixer.music.get_pos())
+            except pygame.error:
+                self._start(ms)
+        else:
+            self._start(ms)
+        if paused: self.pause()
+        elif self.paused: self.resume()
+
+    def frame_presented(self):
+        '''畫面顯示後呼叫；若之前有跳轉，回傳並記錄跳轉到第一張畫面的延遲 (毫秒)。'''
+        if self._seek_t0 is None: return None
+        latency = (time.perf_counter() - self._seek_t0) * 1000
+        self._seek_t0 = None
+        self.seek_latencies.append(latency)
+        if latency > SEEK_LATENCY_BUDGET_MS:
+            log(f"警告: 跳轉延遲 {latency:.1f} ms 超過 {SEEK_LATENCY_BUDGET_MS} ms")
+        return latency
+
+    def seek_latency_stats(self):
+        if not self.seek_latencies: return None
+        return {'count': len(self.seek_latencies), 'avg_ms': sum(self.seek_latencies) / len(self.seek_latencies), 'max_ms': max(self.seek_latencies)}
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  雙語字幕燒錄匯出 (串流編碼管線)
+# ===================================================================================
+#
+#  說明：
+#  給不支援外掛字幕的裝置使用：把字幕直接畫進畫面，輸出一個新的 mp4。
+#  1. 解碼、疊字幕、編碼三段各自執行：解碼執行緒以 OpenCV 依序讀取影格，疊字幕執行緒
+#     只在有字幕的影格上以 SubtitleRenderer 疊上預先畫好的字幕條，原始影格直接寫入
+#     ffmpeg 編碼行程的 stdin (rawvideo)，三段之間以有上限的佇列相連，記憶體用量固定。
+#  2. 聲音由 ffmpeg 從原始影片直接取出並轉成 AAC，與燒錄後的畫面合併。
+#  3. progress(完成影格數, 總影格數, 每秒影格數) 每秒約回報一次；取消或失敗時終止
+#     ffmpeg 並刪除未完成的輸出檔。
+#
+# ===================================================================================
+
+import os, queue, subprocess, sys, tempfile, threading, time
+from cue_index import CueIndex
+from subtitle_render import SubtitleRenderer
+from log_util import log
+
+_END = None  # 佇列結束標記
+
+def encoder_command(ffmpeg, video, width, height, fps, out_path, crf=20, preset="veryfast"):
+    '''回傳由 stdin 讀取 BGR 原始影格、並從原始影片取聲音的 ffmpeg 命令。'''
+    return [ffmpeg, "-v", "error", "-y", "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:.6f}", "-i", "-",
+            "-i", video, "-map", "0:v", "-map", "1:a?", "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "192k", "-shortest", "-movflags", "+faststart", out_path]
+
+def _put(q, item, stop):
+    '''放入有上限的佇列；另一端已停止時放棄，避免永遠卡住。'''
+    while not stop.is_set():
+        try: q.put(item, timeout=0.2); return True
+        except queue.Full: pass
+    return False
+
+def _get(q, stop):
+    while not stop.is_set():
+        try: return q.get(timeout=0.2)
+        except queue.Empty: pass
+    return _END
+
+def export_burnin(video, cues, out_path, fonts, ffmpeg="ffmpeg", crf=20, preset="veryfast", queue_size=32,
+                  progress=None, cancelled=None):
+    '''把 cues 燒錄進 video，輸出到 out_path；回傳 out_path，被取消時回傳 None。
+    progress(完成, 總數, fps) 在呼叫端執行緒 (編碼段) 呼叫，可丟出例外中止匯出。'''
+    import cv2
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened(): raise RuntimeError(f"無法開啟影片: {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    renderer, index = SubtitleRenderer(fonts), CueIndex.from_cues(cues)
+    decoded, composed = queue.Queue(queue_size), queue.Queue(queue_size)
+    stop, errors = threading.Event(), []
+
+    def decode():
+        try:
+            n = 0
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret: break
+                if not _put(decoded, (n, frame), stop): return
+                n += 1
+        except Exception as e: errors.append(e)
+        finally: _put(decoded, _END, stop)
+
+    def composite():
+        # 每一格都是新解碼的影格，可以直接修改；沒有字幕的影格原封不動送去編碼
+        try:
+            while True:
+                item = _get(decoded, stop)
+                if item is _END: break
+                n, frame = item
+                ms = int(n * 1000 / fps)
+                cue_id = index.find(ms)
+                if cue_id >= 0: renderer.draw(frame, cues[cue_id], ms)
+                if not _put(composed, frame, stop): return
+        except Exception as e: errors.append(e)
+        finally: _put(composed, _END, stop)
+
+    stderr = tempfile.TemporaryFile()  # 不用 PIPE：沒有人讀取時緩衝區滿了會讓 ffmpeg 卡住
+    proc = subprocess.Popen(encoder_command(ffmpeg, video, width, height, fps, out_path, crf, preset), stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, stderr=stderr, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+    threads = [threading.Thread(target=decode, name="burnin-decode", daemon=True), threading.Thread(target=composite, name="burnin-composite", daemon=True)]
+    for t in threads: t.start()
+    t0 = last = time.perf_counter()
+    done, finished = 0, False
+    try:
+        while True:
+            if cancelled and cancelled(): break
+            frame = _get(composed, stop)
+            if frame is _END: break
+            try: proc.stdin.write(frame.tobytes())
+            except (BrokenPipeError, OSError): break  # ffmpeg 已結束，錯誤訊息由下面的 returncode 檢查回報
+            done += 1
+            now = time.perf_counter()
+            if progress and now - last >= 1:
+                progress(done, total, done / (now - t0)); last = now
+        if errors: raise errors[0]
+        if cancelled and cancelled():
+            log(f"字幕燒錄已取消: {out_path}"); return None
+        try: proc.stdin.close()
+        except OSError: pass
+        if proc.wait():
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg 編碼失敗 ({proc.returncode}): {stderr.read().decode('utf-8', 'ignore').strip()[-300:]}")
+        finished = True
+    finally:
+        stop.set()
+        if not finished:
+            proc.kill(); proc.wait()
+            try: os.remove(out_path)
+            except OSError: pass
+        for t in threads: t.join()
+        cap.release()
+        stderr.close()
+    elapsed = time.perf_counter() - t0
+    log(f"字幕燒錄完成: {done} 格, {elapsed:.1f} 秒 ({done / elapsed if elapsed else 0:.1f} fps) -> {out_path}")
+    return out_path
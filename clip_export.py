@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  學習卡匯出 (每句字幕的音訊片段 + 截圖)
+# ===================================================================================
+#
+#  說明：
+#  取代手動對每一句字幕各跑一次 ffmpeg 的作法，一次把整部影片的字幕匯出成學習卡素材。
+#  1. 音訊 (與選用的影片) 片段由固定數量的 ffmpeg 行程平行切出；影片片段的開頭
+#     若在關鍵影格附近 (snap_ms 內)，從該關鍵影格直接複製串流，否則重新編碼。
+#  2. 截圖取每句字幕的中間點，以單一 OpenCV 解碼器從頭依序讀過一次，只有目標影格
+#     才轉換並存檔，不對每一句各自跳轉；截圖與 ffmpeg 片段同時進行。
+#  3. 完成後寫出 manifest.json (每張卡的時間、文字與檔名) 以及可直接匯入 Anki 的
+#     cards.tsv。單一片段失敗只記錄在 manifest 中，不影響其他卡片。
+#
+# ===================================================================================
+
+import json, os, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from parallel_decode import keyframe_indices
+from log_util import log
+
+def run_ffmpeg(command):
+    '''預設的執行方式；在處理佇列中改用 JobQueue.run_process 以便取消。'''
+    subprocess.run(command, capture_output=True, text=True, errors='ignore', check=True, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+
+def plan_video_clip(start_ms, keyframes_ms, snap_ms=500):
+    '''回傳 (實際開始毫秒, 是否可直接複製串流)：開始點前 snap_ms 內有關鍵影格時從該影格複製。'''
+    for k in reversed(keyframes_ms or ()):
+        if k <= start_ms:
+            return (k, True) if start_ms - k <= snap_ms else (start_ms, False)
+    return start_ms, False
+
+def clip_commands(ffmpeg, video, start_ms, end_ms, base, with_video=False, keyframes_ms=None):
+    '''回傳切出一句字幕所需的 ffmpeg 命令 (音訊 mp3，選用的影片 mp4)。'''
+    commands = [[ffmpeg, "-v", "error", "-y", "-ss", f"{start_ms / 1000:.3f}", "-i", video, "-t", f"{(end_ms - start_ms) / 1000:.3f}",
+                 "-vn", "-c:a", "libmp3lame", "-q:a", "4", base + ".mp3"]]
+    if with_video:
+        clip_start, copy = plan_video_clip(start_ms, keyframes_ms)
+        codec = ["-c", "copy", "-avoid_negative_ts", "make_zero"] if copy else ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-c:a", "aac"]
+        seek = clip_start + 1 if copy else clip_start  # 關鍵影格時間已四捨五入到毫秒，多 1 ms 才不會退到前一個關鍵影格
+        commands.append([ffmpeg, "-v", "error", "-y", "-ss", f"{seek / 1000:.3f}", "-i", video, "-t", f"{(end_ms - clip_start) / 1000:.3f}",
+                         *codec, base + ".mp4"])
+    return commands
+
+def grab_screenshots(video, targets, max_width=960, cancelled=None, on_saved=None):
+    '''targets: [(毫秒, 輸出路徑), ...]；單一解碼器依序讀過影片，只轉換目標影格，回傳成功張數。'''
+    import cv2
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    pending = sorted((int(ms / 1000 * fps), path) for ms, path in targets)
+    saved, pos, i = 0, -1, 0
+    while i < len(pending):
+        if cancelled and cancelled(): break
+        if not cap.grab(): break  # grab() 只解碼不轉換，略過的影格成本最低
+        pos += 1
+        if pos < pending[i][0]: continue
+        ret, frame = cap.retrieve()
+        while i < len(pending) and pending[i][0] <= pos:
+            if ret:
+                h, w = frame.shape[:2]
+                image = cv2.resize(frame, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA) if w > max_width else frame
+                if cv2.imwrite(pending[i][1], image, [cv2.IMWRITE_JPEG_QUALITY, 85]):
+                    saved += 1
+                    if on_saved: on_saved()
+            i += 1
+    cap.release()
+    return saved
+
+def export_deck(video, cues, out_dir, ffmpeg="ffmpeg", workers=4, with_video=False, pad_ms=150,
+                run=run_ffmpeg, progress=None, cancelled=None):
+    '''把 cues 匯出到 out_dir，回傳 manifest.json 的路徑。
+    run(command): 執行一個 ffmpeg 命令 (失敗時丟出例外)；progress(完成數, 總數): 可在任何執行緒呼叫。'''
+    t0 = time.perf_counter()
+    media_dir = os.path.join(out_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(video))[0]
+    keyframes_ms = keyframe_indices(video, 1000) if with_video else None  # 以 1000 fps 換算即為毫秒
+    cards, tasks = [], []
+    for i, cue in enumerate(cues):
+        name = f"{stem}_{i + 1:05d}"
+        start, end = max(0, cue['start'] - pad_ms), cue['end'] + pad_ms
+        card = {'index': i + 1, 'start': cue['start'], 'end': cue['end'], 'text': cue['original'], 'translation': cue.get('translated', ''),
+                'audio': name + ".mp3", 'image': name + ".jpg", 'video': name + ".mp4" if with_video else None, 'errors': []}
+        cards.append(card)
+        tasks.extend((card, command) for command in clip_commands(ffmpeg, video, start, end, os.path.join(media_dir, name), with_video, keyframes_ms))
+
+    total = len(tasks) + len(cards)
+    done, lock = [0], threading.Lock()
+    def step():
+        with lock:
+            done[0] += 1
+            if progress: progress(done[0], total)
+    def cut(card, command):
+        try:
+            run(command)
+        except subprocess.CalledProcessError as e:
+            card['errors'].append(f"{os.path.basename(command[-1])}: {(e.stderr or '').strip()[-200:]}")
+        step()
+
+    # 截圖在另一個執行緒依序解碼，同時 ffmpeg 行程池切片段
+    targets = [((cue['start'] + cue['end']) // 2, os.path.join(media_dir, card['image'])) for cue, card in zip(cues, cards)]
+    shots, stop = {}, threading.Event()
+    def shoot():
+        # 切片段失敗 (例如找不到 ffmpeg) 時 stop 被設定，截圖隨之停止，不會繼續對已失敗的工作回報進度
+        stopped = lambda: stop.is_set() or bool(cancelled and cancelled())
+        try: shots['saved'] = grab_screenshots(video, targets, cancelled=stopped, on_saved=step)
+        except Exception as e: log(f"截圖中止: {e!r}")  # 例如 progress 回報時工作已被取消
+    shooter = threading.Thread(target=shoot, daemon=True)
+    shooter.start()
+    with ThreadPoolExecutor(workers, thread_name_prefix="clip") as pool:
+        futures = [pool.submit(cut, card, command) for card, command in tasks]
+        try:
+            for future in futures: future.result()
+        except BaseException:
+            for future in futures: future.cancel()
+            stop.set(); shooter.join()
+            raise
+    shooter.join()
+
+    for card in cards:
+        for key in ('audio', 'image', 'video'):
+            if card[key] and not os.path.exists(os.path.join(media_dir, card[key])): card[key] = None
+    manifest = os.path.join(out_dir, "manifest.json")
+    with open(manifest, 'w', encoding='utf-8') as f:
+        json.dump({'video': video, 'cards': cards}, f, ensure_ascii=False, indent=1)
+    field = lambda text: (text or '').replace('\t', ' ').replace('\n', '<br>')
+    with open(os.path.join(out_dir, "cards.tsv"), 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{field(card['text'])}\t{field(card['translation'])}\t" + (f"[sound:{card['audio']}]" if card['audio'] else '')
+                        + "\t" + (f'<img src="{card["image"]}">' if card['image'] else '') + "\n" for card in cards))
+    failed = sum(1 for card in cards if card['errors'])
+    log(f"學習卡匯出完成: {len(cards)} 張, 截圖 {shots.get('saved', 0)} 張, 失敗 {failed} 張 ({time.perf_counter() - t0:.1f} 秒) -> {out_dir}")
+    return manifest
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  字幕時間索引
+# ===================================================================================
+#
+#  說明：
+#  將字幕的開始/結束時間建成排序陣列，以二分搜尋取代每次更新畫面時的線性掃描。
+#  字幕的結束時間為包含 (start <= ms <= end)，與播放器原本的判斷方式相同，
+#  因此畫面上的字幕會在 end + 1 毫秒時才改變。
+#  next_cue() / prev_cue() 供「上一句 / 下一句」與單句循環精確跳到字幕開頭。
+#
+# ===================================================================================
+
+from bisect import bisect_left, bisect_right
+
+class CueIndex:
+    def __init__(self, spans):
+        '''spans: [(start_ms, end_ms), ...]，索引值即為字幕在原清單中的位置。'''
+        order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+        self.ids = order
+        self.starts = [spans[i][0] for i in order]
+        self.ends = [spans[i][1] for i in order]
+        self.boundaries = sorted(set(self.starts) | {end + 1 for end in self.ends})
+
+    @classmethod
+    def from_cues(cls, cues):
+        return cls([(c['start'], c['end']) for c in cues])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, ms):
+        '''回傳 ms 時應顯示的字幕編號，沒有字幕時回傳 -1。'''
+        pos = bisect_right(self.starts, ms) - 1
+        if pos >= 0 and ms <= self.ends[pos]:
+            return self.ids[pos]
+        return -1
+
+    def next_cue(self, ms):
+        '''回傳開始時間在 ms 之後的第一句字幕編號，沒有則回傳 -1。'''
+        pos = bisect_right(self.starts, ms)
+        return self.ids[pos] if pos < len(self.starts) else -1
+
+    def prev_cue(self, ms, grace_ms=500):
+        '''回傳「上一句」的字幕編號：若目前字幕才開始不到 grace_ms，跳到前一句，否則回到本句開頭。'''
+        pos = bisect_left(self.starts, ms - grace_ms) - 1
+        return self.ids[pos] if pos >= 0 else (self.ids[0] if self.starts else -1)
+
+    def next_boundary(self, ms):
+        '''回傳 ms 之後下一個字幕顯示會改變的時間點，沒有則回傳 None。'''
+        pos = bisect_right(self.boundaries, ms)
+        return self.boundaries[pos] if pos < len(self.boundaries) else None
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  事件驅動的字幕排程器
+# ===================================================================================
+#
+#  說明：
+#  取代固定週期輪詢 get_time() 的計時器。每次得知確切播放位置時 (使用者操作、
+#  VLC 事件、計時器觸發) 呼叫 sync()，排程器記下「位置 + 時刻 + 速率」作為錨點，
+#  並只為下一個字幕切換點 (或進度條下一格) 排一個單次計時器。
+#  VLC 的 MediaPlayerTimeChanged 事件在 VLC 執行緒觸發，頻率很高；先用 drifted()
+#  與錨點推算的位置比較，只有誤差超過容許值時才需要通知介面執行緒重新同步。
+#
+# ===================================================================================
+
+import time
+from ui_update import next_tick_interval
+
+class CueScheduler:
+    def __init__(self, arm, cancel, steps=100, tolerance_ms=80, max_wait_ms=5000):
+        '''arm(delay_ms): 排定單次計時器；cancel(): 取消尚未觸發的計時器。'''
+        self.arm, self.cancel = arm, cancel
+        self.steps, self.tolerance_ms, self.max_wait_ms = steps, tolerance_ms, max_wait_ms
+        self.cue_index, self.length_ms = None, 0
+        self.anchor = (0, time.perf_counter(), 1.0, False)
+
+    def set_track(self, cue_index=None, length_ms=0, steps=None):
+        '''steps: 進度條的格數 (例如進度條的像素寬度)，None 時維持原值。'''
+        self.cue_index, self.length_ms = cue_index, length_ms
+        if steps: self.steps = steps
+
+    def predict(self):
+        '''依錨點推算目前播放位置 (毫秒)。'''
+        pos, t, rate, playing = self.anchor
+        return pos + (time.perf_counter() - t) * 1000 * rate if playing else pos
+
+    def drifted(self, pos_ms):
+        return abs(pos_ms - self.predict()) > self.tolerance_ms
+
+    def sync(self, pos_ms, playing, rate=1.0):
+        '''以確切的播放位置重設錨點，並為下一個切換點排一個單次計時器。'''
+        self.anchor = (pos_ms, time.perf_counter(), rate, playing)
+        self.cancel()
+        if playing:
+            self.arm(next_tick_interval(pos_ms, self.length_ms, self.steps, self.cue_index, rate, max_ms=self.max_wait_ms))
+
+    def stop(self):
+        self.anchor = (self.predict(), time.perf_counter(), self.anchor[2], False)
+        self.cancel()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  已解碼影格 LRU 快取
+# ===================================================================================
+#
+#  說明：
+#  倒退 5 秒、重播或在附近來回拖曳時，畫面幾秒前才解碼過，不必再從關鍵影格重新解碼。
+#  1. 以 OrderedDict 依最近使用順序保存影格，總位元組超過預算時淘汰最久未用的影格；
+#     預算由 config.json 的 "frame_cache_mb" 設定。
+#  2. 預設在存入前先縮到畫布大小 (config.json 的 "frame_cache_prescale")，同樣的預算可以
+#     多存好幾倍的影格 (1080p 原尺寸每格約 6 MB)；快取鍵包含縮放尺寸，畫布改變大小後不會誤用。
+#     單句循環快取 (loop_cache.py) 以相同尺寸存放，兩者提供的影格大小一致。
+#  3. 每 log_every 次查詢在日誌輸出命中率與記憶體用量。
+#
+# ===================================================================================
+
+from collections import OrderedDict
+import cv2
+from log_util import log
+
+def prescale(frame, size):
+    '''將影格等比例縮小到 size (寬, 高) 以內；不會放大。'''
+    if not size: return frame
+    h, w = frame.shape[:2]
+    scale = min(size[0] / w, size[1] / h)
+    if scale >= 1: return frame
+    return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+class FrameCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, log_every=500):
+        self.max_bytes, self.log_every = max_bytes, log_every
+        self.frames, self.nbytes = OrderedDict(), 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is None:
+            self.misses += 1
+        else:
+            self.frames.move_to_end(key)
+            self.hits += 1
+        if self.log_every and (self.hits + self.misses) % self.log_every == 0: self.log_stats()
+        return frame
+
+    def put(self, key, frame):
+        if frame.nbytes > self.max_bytes: return
+        old = self.frames.pop(key, None)
+        if old is not None: self.nbytes -= old.nbytes
+        self.frames[key] = frame
+        self.nbytes += frame.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.frames.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self.frames.clear()
+        self.nbytes = 0
+        self.hits = self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'frames': len(self.frames), 'mb': self.nbytes / 1048576}
+
+    def log_stats(self):
+        s = self.stats()
+        log(f"影格快取: 命中率 {s['hit_ratio']:.1%} ({s['hits']}/{s['hits'] + s['misses']})，"
+            f"{s['frames']} 張影格，{s['mb']:.0f} / {self.max_bytes / 1048576:.0f} MB")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  硬體解碼能力偵測與自動退回
+# ===================================================================================
+#
+#  說明：
+#  取代「停用硬體解碼」勾選框需要使用者自己試、再重新處理影片的作法。
+#  1. 對目前的影片實測幾秒鐘的解碼速度：libVLC 依序嘗試各種 --avcodec-hw，
+#     OpenCV 則嘗試 CAP_PROP_HW_ACCELERATION；選擇可正常運作且最快的一種。
+#  2. 結果以「後端:編碼:解析度」為鍵存在 config.json 的 "hw_decode_cache"，
+#     同規格的影片之後直接沿用，不再重新測試。
+#  3. 播放中遇到解碼錯誤或畫面停滯時，mark_failed() 把目前的模式記為失敗並回傳
+#     下一個候選模式 (最後一定是 "none" 軟體解碼)，由播放器換模式後從原位置繼續。
+#
+#  vlc 與 cv2 只在用到時才匯入，OpenCV 版播放器不需安裝 python-vlc。
+#
+# ===================================================================================
+
+import sys, time, threading
+from log_util import log
+
+def vlc_hw_candidates():
+    '''libVLC 的 --avcodec-hw 候選值，依偏好排序；"any" 為 VLC 預設的自動選擇。'''
+    if sys.platform == 'win32': return ['any', 'd3d11va', 'dxva2', 'none']
+    if sys.platform == 'darwin': return ['any', 'videotoolbox', 'none']
+    return ['any', 'vaapi', 'vdpau', 'none']
+
+def opencv_hw_candidates():
+    import cv2
+    if not hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'): return ['none']  # OpenCV 4.5.2 之前沒有此屬性
+    return ['any', 'none']
+
+def media_key(path):
+    '''以 OpenCV 讀取編碼與解析度，作為快取鍵，例如 "h264:3840x2160"。'''
+    import cv2
+    cap = cv2.VideoCapture(path)
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    codec = "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip().lower() or "unknown"
+    return f"{codec}:{w}x{h}"
+
+def open_capture(path, mode='none'):
+    '''以指定的硬體解碼模式開啟 cv2.VideoCapture。'''
+    import cv2
+    if mode == 'none' or not hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+        return cv2.VideoCapture(path)
+    return cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+
+def bench_opencv(path, mode, seconds=2.0, max_frames=240):
+    '''回傳 OpenCV 在此模式下的解碼速度 (fps)；無法開啟或解碼時回傳 None。'''
+    cap = open_capture(path, mode)
+    try:
+        if not cap.isOpened(): return None
+        frames, t0 = 0, time.perf_counter()
+        while frames < max_frames and time.perf_counter() - t0 < seconds:
+            if not cap.grab(): break
+            frames += 1
+        elapsed = time.perf_counter() - t0
+        return frames / elapsed if frames else None
+    except Exception as e:
+        log(f"OpenCV 解碼測試失敗 ({mode}): {e}")
+        return None
+    finally:
+        cap.release()
+
+def bench_vlc(path, mode, base_args=(), seconds=2.0, rate=4.0):
+    '''以獨立的 libVLC 實例 (不輸出影像與聲音) 快轉播放，回傳每秒解碼的影格數；發生錯誤時回傳 None。'''
+    import vlc
+    args = list(base_args) + ["--vout=dummy", "--no-audio"] + ([] if mode == 'any' else [f"--avcodec-hw={mode}"])
+    instance = vlc.Instance(args)
+    if instance is None: return None
+    player = instance.media_player_new()
+    media = instance.media_new(path)
+    player.set_media(media)
+    failed = threading.Event()
+    player.event_manager().event_attach(vlc.EventType.MediaPlayerEncounteredError, lambda event: failed.set())
+    try:
+        player.play()
+        player.set_rate(rate)
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds and not failed.is_set() and player.get_state() != vlc.State.Ended:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - t0
+        stats = vlc.MediaStats()
+        media.get_stats(stats)
+        if failed.is_set() or stats.decoded_video == 0: return None
+        return max(0, stats.decoded_video - stats.lost_pictures) / elapsed
+    finally:
+        player.stop()
+        player.release()
+        media.release()
+        instance.release()
+
+def pick_decoder(cache, key, candidates, bench):
+    '''回傳 key 應使用的解碼模式：有快取就沿用，否則逐一以 bench(mode) 實測並寫入 cache。'''
+    entry = cache.get(key) or {}
+    failed = entry.get('failed', [])
+    if entry.get('choice') in candidates and entry['choice'] not in failed:
+        return entry['choice']
+    results = {mode: bench(mode) for mode in candidates if mode not in failed}
+    working = {mode: fps for mode, fps in results.items() if fps}
+    choice = max(working, key=working.get) if working else 'none'
+    cache[key] = {'choice': choice, 'fps': {mode: round(fps or 0, 1) for mode, fps in results.items()}, 'failed': failed}
+    log(f"解碼模式測試 {key}: {cache[key]['fps']} -> 使用 {choice}")
+    return choice
+
+def mark_failed(cache, key, mode, candidates):
+    '''將 mode 記為失敗，回傳下一個可用的候選模式 (最後為 "none")。'''
+    entry = cache.setdefault(key, {})
+    failed = entry.setdefault('failed', [])
+    if mode not in failed and mode != 'none': failed.append(mode)
+    remaining = [m for m in candidates if m not in failed]
+    entry['choice'] = remaining[0] if remaining else 'none'
+    log(f"解碼模式 {mode} 失敗，{key} 改用 {entry['choice']}")
+    return entry['choice']
+
+class DecodeWatchdog:
+    '''記錄最後一次播放時間前進的時刻，播放中超過 stall_ms 沒有前進即視為停滯。'''
+    def __init__(self, stall_ms=3000):
+        self.stall_s = stall_ms / 1000.0
+        self.last_progress = time.perf_counter()
+
+    def progress(self):
+        self.last_progress = time.perf_counter()
+
+    def stalled(self, playing):
+        return playing and time.perf_counter() - self.last_progress > self.stall_s
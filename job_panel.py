@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  Tk 處理佇列面板
+# ===================================================================================
+#
+#  說明：
+#  三個 Tk 版播放器共用的佇列列表，顯示每個工作的影片、階段、進度與狀態。
+#  1. update_job(job) 只在介面執行緒呼叫 (JobQueue.drain 的 on_update)，只改動該工作的那一列。
+#  2. 按鈕只負責呼叫播放器提供的回呼：加入影片、載入播放 (或在列上按兩下)、取消 / 移除。
+#
+# ===================================================================================
+
+import tkinter as tk
+from tkinter import ttk
+
+class JobPanel(ttk.LabelFrame):
+    COLUMNS = (('video', '影片', 260), ('stage', '階段', 160), ('progress', '進度', 60), ('state', '狀態', 80))
+
+    def __init__(self, parent, on_add, on_load, on_remove, height=4):
+        super().__init__(parent, text="處理佇列", padding=(10, 5))
+        self.tree = ttk.Treeview(self, columns=[c for c, _, _ in self.COLUMNS], show="headings", height=height)
+        for column, text, width in self.COLUMNS:
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor="w" if column == 'video' else "center", stretch=column == 'video')
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.bind("<Double-1>", lambda event: self._call(on_load))
+        buttons = tk.Frame(self); buttons.pack(side="left", padx=(5, 0))
+        ttk.Button(buttons, text="加入影片...", command=on_add).pack(fill="x", pady=1)
+        ttk.Button(buttons, text="載入播放", command=lambda: self._call(on_load)).pack(fill="x", pady=1)
+        ttk.Button(buttons, text="取消 / 移除", command=lambda: self._call(on_remove)).pack(fill="x", pady=1)
+
+    def _call(self, callback):
+        selection = self.tree.selection()
+        if selection: callback(int(selection[0]))
+
+    def update_job(self, job):
+        values = (job.name, job.error or job.stage, f"{job.progress:.0f}%", job.state_text)
+        iid = str(job.id)
+        if self.tree.exists(iid): self.tree.item(iid, values=values)
+        else: self.tree.insert("", "end", iid=iid, values=values)
+
+    def remove(self, job_id):
+        if self.tree.exists(str(job_id)): self.tree.delete(str(job_id))
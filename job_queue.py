@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  背景處理佇列
+# ===================================================================================
+#
+#  說明：
+#  取代「處理影片」期間停用按鈕、一次只能處理一部影片的作法。
+#  1. 使用者可一次加入多部影片，每部影片是一個 Job，由固定大小的執行緒池同時處理。
+#  2. 各階段另有各自的上限 (預設 whisper 1 個、翻譯 2 個)：whisper.cpp 本身已用滿 CPU，
+#     同時跑多個只會互搶；翻譯則多半在等網路，可以多開幾個。
+#  3. 工作執行緒不直接碰介面元件，所有 stage / progress / 結果都放進 thread-safe 的佇列，
+#     再呼叫 notify() 喚醒介面執行緒 (Tk 用 event_generate，Qt 用 signal)，
+#     介面執行緒呼叫 drain() 套用到 Job 並更新畫面。Job 的欄位只在介面執行緒修改。
+#  4. cancel() 為協作式取消：工作在下一次 report() 或等待階段上限時結束；
+#     以 run_process() 執行的外部程式 (whisper.cpp) 會被直接終止。
+#
+# ===================================================================================
+
+import itertools, os, queue, subprocess, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from log_util import log
+
+STATE_TEXT = {'queued': '排隊中', 'running': '處理中', 'done': '完成', 'failed': '失敗', 'cancelled': '已取消'}
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, job_id, video_path, options, kind='process'):
+        self.id, self.video_path, self.options, self.kind = job_id, video_path, options, kind
+        self.name = os.path.basename(video_path)
+        self.state, self.stage, self.progress = 'queued', '等待中', 0
+        self.result = self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    @property
+    def state_text(self):
+        return STATE_TEXT[self.state]
+
+class JobQueue:
+    def __init__(self, notify, max_jobs=3, limits=None):
+        '''notify(): 可在任何執行緒呼叫、用來喚醒介面執行緒的函式。'''
+        self.notify = notify
+        self.pool = None
+        self.updates = queue.Queue()
+        self.jobs = {}                 # 工作編號 -> Job (依加入順序)
+        self._ids = itertools.count(1)
+        self.set_limits(max_jobs, **(limits or {}))
+
+    def set_limits(self, max_jobs=3, whisper=1, translate=2):
+        '''設定同時處理的影片數與各階段上限；須在第一次 submit() 之前呼叫。'''
+        if self.pool: raise RuntimeError("處理佇列已啟動，無法變更上限")
+        self.max_jobs = max_jobs
+        self.slots = {'whisper': threading.BoundedSemaphore(whisper), 'translate': threading.BoundedSemaphore(translate)}
+
+    def submit(self, video_path, run, kind='process', **options):
+        '''加入一部影片；run(job) 在工作執行緒執行，回傳值成為 job.result。
+        kind 區分工作種類 (例如 'process' 處理影片、'export' 匯出)，介面依此決定完成後的動作。'''
+        if self.pool is None: self.pool = ThreadPoolExecutor(self.max_jobs, thread_name_prefix="job")
+        job = Job(next(self._ids), video_path, options, kind)
+        self.jobs[job.id] = job
+        self.pool.submit(self._run, job, run)
+        log(f"加入處理佇列 #{job.id}: {video_path}")
+        return job
+
+    def report(self, job, **fields):
+        '''在工作執行緒呼叫：回報 stage / progress；已取消時丟出 JobCancelled。'''
+        if job.cancel_event.is_set(): raise JobCancelled()
+        self._post(job, **fields)
+
+    @contextmanager
+    def slot(self, job, name, stage):
+        '''在 with 區塊內占用一個 name 階段的名額 (whisper / translate)，等待期間仍可取消。'''
+        sem = self.slots[name]
+        if not sem.acquire(blocking=False):
+            self.report(job, stage=f"等待{stage}")
+            while not sem.acquire(timeout=0.2):
+                if job.cancel_event.is_set(): raise JobCancelled()
+        try:
+            self.report(job, stage=stage)
+            yield
+        finally:
+            sem.release()
+
+    def run_process(self, job, command, **kwargs):
+        '''執行外部程式並擷取輸出；失敗時丟出 CalledProcessError，工作被取消時終止程式並丟出 JobCancelled。'''
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='ignore', **kwargs)
+        while True:
+            try:
+                out, err = proc.communicate(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                if job.cancel_event.is_set():
+                    proc.kill(); proc.communicate()
+                    raise JobCancelled()
+        if proc.returncode: raise subprocess.CalledProcessError(proc.returncode, command, out, err)
+        return subprocess.CompletedProcess(command, proc.returncode, out, err)
+
+    def _post(self, job, **fields):
+        self.updates.put((job, fields))
+        self.notify()
+
+    def _run(self, job, run):
+        if job.cancel_event.is_set():
+            self._post(job, state='cancelled', stage='')
+            return
+        t0 = time.perf_counter()
+        self._post(job, state='running')
+        try:
+            result = run(job)
+        except JobCancelled:
+            log(f"處理工作 #{job.id} 已取消")
+            self._post(job, state='cancelled', stage='')
+        except Exception as e:
+            log(f"處理工作 #{job.id} 失敗: {''.join(traceback.format_exception_only(type(e), e)).strip()}")
+            self._post(job, state='failed', stage='', error=str(e))
+        else:
+            log(f"處理工作 #{job.id} 完成 ({time.perf_counter() - t0:.1f} 秒)")
+            self._post(job, state='done', stage='', progress=100, result=result)
+
+    def drain(self, on_update):
+        '''在介面執行緒呼叫：套用所有待處理的變更，每次變更後呼叫 on_update(job)。'''
+        while True:
+            try: job, fields = self.updates.get_nowait()
+            except queue.Empty: return
+            for name, value in fields.items(): setattr(job, name, value)
+            on_update(job)
+
+    def cancel(self, job_id):
+        '''在介面執行緒呼叫；還在排隊的工作立即標為已取消。'''
+        job = self.jobs.get(job_id)
+        if job and not job.finished:
+            job.cancel_event.set()
+            if job.state == 'queued': job.state, job.stage = 'cancelled', ''
+        return job
+
+    def remove(self, job_id):
+        '''從佇列移除已結束的工作並回傳；尚未結束的工作改為取消，回傳 None。'''
+        job = self.jobs.get(job_id)
+        if job is None: return None
+        if not job.finished:
+            self.cancel(job_id)
+            return None
+        return self.jobs.pop(job_id)
+
+    def active(self):
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def shutdown(self):
+        for job in self.jobs.values(): job.cancel_event.set()
+        if self.pool: self.pool.shutdown(wait=False, cancel_futures=True)
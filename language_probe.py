@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  語言偵測 (短片段探測)
+# ===================================================================================
+#
+#  說明：
+#  辨識語言設為 auto 時，原本由 whisper.cpp 在整部辨識中自行偵測，翻譯時 Google 又對每一句
+#  重新偵測一次。改為在辨識前只偵測一次：
+#  1. 以每秒的音量 (RMS) 從音訊前、中、後段各挑一段最響亮的 window_s 秒 (多半是說話)，
+#     合併成一個不到 30 秒的探測檔。整個 WAV 以每秒一塊的方式串流讀取，不整個載入記憶體。
+#  2. 以 whisper.cpp --detect-language 只對探測檔偵測語言，完成後立即結束，不做辨識。
+#  3. 結果依影片路徑、大小與修改時間快取 (存在 config.json 的 "language_cache")，
+#     之後整部辨識以 -l 指定該語言，翻譯也以它作為來源語言。
+#
+# ===================================================================================
+
+import os, re, subprocess, time, wave
+import numpy as np
+from log_util import log
+
+_DETECTED_RE = re.compile(r"auto-detected language:\s*(\w+)\s*\(p\s*=\s*([\d.]+)\)")
+
+def video_key(path):
+    '''快取鍵：路徑 + 大小 + 修改時間，檔案被替換時自動失效。'''
+    st = os.stat(path)
+    return f"{os.path.normcase(os.path.abspath(path))}|{st.st_size}|{int(st.st_mtime)}"
+
+def second_energy(wav_path):
+    '''回傳每秒的 RMS 音量 (numpy 陣列) 與 WAV 參數。'''
+    with wave.open(wav_path, 'rb') as w:
+        params = w.getparams()
+        if params.sampwidth != 2: raise ValueError(f"只支援 16-bit PCM: {wav_path}")
+        energy = []
+        while True:
+            block = w.readframes(params.framerate)
+            if not block: break
+            samples = np.frombuffer(block, dtype=np.int16).astype(np.float32)
+            energy.append(np.sqrt(np.mean(samples * samples)) if samples.size else 0.0)
+    return np.array(energy), params
+
+def pick_windows(energy, count=3, window_s=8):
+    '''把音訊分成 count 段，每段取總音量最大的 window_s 秒，回傳 [(開始秒, 秒數), ...]。'''
+    n = len(energy)
+    if n <= count * window_s: return [(0, n)]
+    sums = np.convolve(energy, np.ones(window_s), mode='valid')  # sums[i] = 第 i 秒起 window_s 秒的總音量
+    windows = []
+    for k in range(count):
+        lo, hi = k * n // count, min((k + 1) * n // count - window_s, len(sums) - 1)
+        if hi < lo: continue
+        windows.append((lo + int(np.argmax(sums[lo:hi + 1])), window_s))
+    return windows
+
+def write_probe(wav_path, out_path, windows, params):
+    with wave.open(wav_path, 'rb') as src, wave.open(out_path, 'wb') as dst:
+        dst.setparams(params)
+        for start, seconds in windows:
+            src.setpos(start * params.framerate)
+            dst.writeframes(src.readframes(seconds * params.framerate))
+    return out_path
+
+def detect_language(whisper_exe, model, wav_path, probe_path, run, count=3, window_s=8, threads=4):
+    '''回傳 (語言代碼, 機率)；run(command) 執行 whisper.cpp 並回傳含 stdout/stderr 的結果。'''
+    t0 = time.perf_counter()
+    energy, params = second_energy(wav_path)
+    windows = pick_windows(energy, count, window_s)
+    write_probe(wav_path, probe_path, windows, params)
+    result = run([whisper_exe, "-m", model, "-f", probe_path, "-l", "auto", "--detect-language", "-t", str(threads)])
+    match = _DETECTED_RE.search(f"{result.stdout or ''}\n{result.stderr or ''}")
+    if not match: raise RuntimeError("whisper.cpp 未回報偵測到的語言")
+    language, prob = match.group(1), float(match.group(2))
+    log(f"語言探測: {language} (p = {prob:.2f}), 片段 {[start for start, _ in windows]} 秒, {time.perf_counter() - t0:.1f} 秒")
+    return language, prob
+
+def probe_language(cache, video_path, whisper_exe, model, wav_path, probe_path, run, min_prob=0.5):
+    '''有快取就直接回傳，否則探測並寫入 cache；信心不足或失敗時回傳 'auto' (交回 whisper.cpp 自行偵測)。'''
+    key = video_key(video_path)
+    if key in cache:
+        log(f"語言探測: 使用快取 {cache[key]}")
+        return cache[key]
+    try: language, prob = detect_language(whisper_exe, model, wav_path, probe_path, run)
+    except (OSError, ValueError, RuntimeError, subprocess.CalledProcessError) as e:
+        log(f"語言探測失敗，改由 whisper.cpp 偵測: {e}")
+        return 'auto'
+    if prob < min_prob: return 'auto'
+    cache[key] = language
+    return language
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  依播放位置優先的背景翻譯
+# ===================================================================================
+#
+#  說明：
+#  原本所有字幕翻譯完才能開始播放，等待時間隨字幕句數增加。改為辨識完成就可以播放，
+#  翻譯在背景進行：
+#  1. 工作執行緒每次取「目前播放位置之後最近、尚未翻譯」的一批字幕送給翻譯後端
+#     (translators.py)；播放位置之後都翻完了才回頭翻前面的句子。
+#  2. 播放器持續以 set_position() 告知播放位置，跳轉後下一批就改從新位置開始。
+#     第一批只有 2 句，之後逐批加倍到 batch_size，讓第一句翻譯儘快出現。
+#  3. 譯文由 notify() 通知介面執行緒，再由 drain() 取出 [(字幕編號, 譯文), ...] 套用，
+#     與 JobQueue 相同，工作執行緒不直接操作介面元件。
+#
+# ===================================================================================
+
+import threading, time
+from bisect import bisect_right
+from log_util import log
+
+class LazyTranslation:
+    def __init__(self, make_translator, spans, texts, pending, notify, batch_size=16, first_batch=2):
+        '''make_translator(): 在工作執行緒建立翻譯後端；spans: [(開始, 結束), ...]；
+        pending: 需要翻譯的字幕編號。'''
+        self.make_translator, self.texts, self.notify = make_translator, texts, notify
+        self.order = sorted(range(len(spans)), key=lambda i: spans[i][0])
+        self.starts = [spans[i][0] for i in self.order]
+        self.pending, self.total = set(pending), len(set(pending))
+        self.batch_size, self.next_size = batch_size, first_batch
+        self.position, self.results = 0, []
+        self.lock, self.stopped = threading.Lock(), False
+        self.thread = threading.Thread(target=self._run, name="lazy-translate", daemon=True)
+        self.thread.start()
+
+    @property
+    def remaining(self):
+        with self.lock: return len(self.pending)
+
+    def set_position(self, ms):
+        '''在介面執行緒呼叫 (每次更新畫面或跳轉後)，只記錄位置，成本很低。'''
+        self.position = ms
+
+    def stop(self):
+        self.stopped = True
+
+    def drain(self):
+        '''在介面執行緒呼叫：取出目前已完成的 [(字幕編號, 譯文), ...]。'''
+        with self.lock:
+            results, self.results = self.results, []
+        return results
+
+    def _next_batch(self):
+        with self.lock:
+            start = max(0, bisect_right(self.starts, self.position) - 1)  # 包含正在顯示的這一句
+            batch = [i for i in self.order[start:] if i in self.pending][:self.next_size]
+            if len(batch) < self.next_size:
+                batch += [i for i in self.order[:start] if i in self.pending][:self.next_size - len(batch)]
+        self.next_size = min(self.batch_size, self.next_size * 2)
+        return batch
+
+    def _run(self):
+        t0 = time.perf_counter()
+        try:
+            translator = self.make_translator()
+            while not self.stopped:
+                batch = self._next_batch()
+                if not batch: break
+                texts = translator.translate_batch([self.texts[i] for i in batch])
+                if self.stopped: break
+                with self.lock:
+                    self.pending.difference_update(batch)
+                    self.results.extend(zip(batch, texts))
+                self.notify()
+        except Exception as e:
+            log(f"背景翻譯中止: {e}")
+            return
+        if not self.stopped: log(f"背景翻譯完成: {self.total} 句 ({time.perf_counter() - t0:.1f} 秒)")
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  共用日誌輸出
+# ===================================================================================
+#
+#  說明：
+#  各輔助模組共用的 log()，格式與播放器腳本相同 ([LOG] 訊息)，不再各自重複定義。
+#
+# ===================================================================================
+
+def log(message): print(f"[LOG] {message}")
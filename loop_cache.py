@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  單句循環影格快取
+# ===================================================================================
+#
+#  說明：
+#  開啟單句循環時，背景執行緒用另一個 VideoCapture 先跳到該句開頭
+#  (OpenCV 會從前一個關鍵影格開始解碼) 並依序解碼整句的影格存入快取，
+#  之後每一次循環都直接由記憶體提供影格，不需再跳轉或解碼。
+#  快取只保存循環範圍內的影格，且以 max_bytes 限制記憶體用量。
+#  指定 size 時影格與 FrameCache 一樣先縮到畫布大小再存，兩個快取提供的影格大小一致。
+#
+# ===================================================================================
+
+import threading, time
+import cv2
+from frame_cache import prescale
+from log_util import log
+
+class LoopFrameCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.frames, self.nbytes = {}, 0
+        self.span, self.size = (0, -1), None
+        self._stop = threading.Event()
+
+    def set_span(self, video_path, first_frame, last_frame, size=None):
+        '''設定循環範圍 (影格編號，含頭尾)，並在背景預先解碼；size (寬, 高) 為預先縮放的大小。'''
+        self.clear()
+        self.span, self.size = (first_frame, last_frame), size
+        self._stop = threading.Event()
+        threading.Thread(target=self._predecode, args=(video_path, first_frame, last_frame, self._stop), daemon=True).start()
+
+    def clear(self):
+        self._stop.set()
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+            self.span = (0, -1)
+
+    def get(self, frame_idx):
+        with self.lock:
+            return self.frames.get(frame_idx)
+
+    def put(self, frame_idx, frame, stop=None):
+        with self.lock:
+            if stop is not None and stop.is_set(): return  # 已被新的範圍或影片取代
+            first, last = self.span
+            if first <= frame_idx <= last and frame_idx not in self.frames and self.nbytes + frame.nbytes <= self.max_bytes:
+                self.frames[frame_idx] = frame
+                self.nbytes += frame.nbytes
+
+    def _predecode(self, video_path, first_frame, last_frame, stop):
+        t0 = time.perf_counter()
+        cap = cv2.VideoCapture(video_path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+        decoded = 0
+        for frame_idx in range(first_frame, last_frame + 1):
+            if stop.is_set() or self.nbytes >= self.max_bytes: break
+            ret, frame = cap.read()
+            if not ret: break
+            self.put(frame_idx, prescale(frame, self.size), stop)
+            decoded += 1
+        cap.release()
+        log(f"單句循環預先解碼 {decoded} 張影格 ({self.nbytes / 1048576:.0f} MB)，耗時 {time.perf_counter() - t0:.2f}s")
@@ -13,19 +13,53 @@
 
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox, Frame, Label, Entry
-import threading, os, sys, json, subprocess, cv2, pysrt
-from deep_translator import GoogleTranslator
+import os, sys, json, subprocess, cv2
 from moviepy.editor import VideoFileClip
-from PIL import Image, ImageTk, ImageFont, ImageDraw
+from PIL import Image, ImageTk, ImageFont
 import pygame
-import numpy as np
 import time
+from subtitle_codec import load_srt, save_srt
+from audio_clock import AudioClock
+from pcm_audio import PcmAudioPlayer
+from cue_index import CueIndex
+from loop_cache import LoopFrameCache
+from frame_cache import FrameCache, prescale
+from parallel_decode import ParallelDecoder, keyframe_indices
+from async_select import AsyncSelector, read_poster
+from workspace import JobWorkspace, sweep_stale
+from job_queue import JobQueue
+from job_panel import JobPanel
+from transcript_index import TranscriptIndex
+from search_panel import SearchDialog
+from whisper_json import load_transcript
+from subtitle_render import SubtitleRenderer
+from clip_export import export_deck
+from burnin_export import export_burnin
+import translators
+from lazy_translate import LazyTranslation
+from language_probe import probe_language
+from model_calibration import whisper_command, find_models, reference_clip, calibrate, pick_model, summary
+from proxy_cache import ProxyCache, proxy_height
+from hw_probe import opencv_hw_candidates, media_key, open_capture, bench_opencv, pick_decoder, mark_failed
 
 # --- 1. 全域變數與初始化 ---
-CONFIG_FILE, video_path, audio_path = "config.json", None, "temp_audio.wav"
+CONFIG_FILE, video_path, audio_path = "config.json", None, None
+workspace = None  # 目前播放中影片的工作資料夾
+library_dirs, pending_seek, transcript_index = [], None, None  # 字幕庫搜尋
+lazy_translation = None  # 目前影片的背景翻譯
+language_cache = {}  # 影片 -> 探測到的語言
+WHISPER_DECODE_ARGS = ("-bs", "8", "-bo", "8", "-et", "2.2", "-nth", "0.65", "-nf", "-tdrz")  # whisper.cpp 的解碼參數 (辨識與模型校準共用)
+proxy_cache, active_proxy = None, None  # 低解析度代理檔 (config.json 的 "proxy_enabled")
 is_playing, subtitles, cap, fps = False, [], None, 30
 is_paused = False
+playback_rate = 1.0
+player_job = None  # 下一次 update_player 的 root.after 編號，同一時間只排一個
+cue_index, loop_cue, loop_cache = CueIndex([]), -1, LoopFrameCache()
+frame_cache, frame_cache_prescale = FrameCache(), True
+parallel_decoder, decode_workers = None, 0
+hw_cache, cv_hw_mode, cv_hw_key = {}, 'none', None
 pygame.mixer.init()
+audio_clock = AudioClock()
 
 # --- 2. 核心功能函式 ---
 def log(message):
@@ -69,107 +103,409 @@ def browse_file(entry_widget):
         entry_widget.insert(0, path)
 
 def select_video():
-    global video_path, cap, fps, is_playing, is_paused
     file_path = filedialog.askopenfilename(filetypes=[("MP4 files", "*.mp4")])
     if file_path:
         log(f"使用者選擇影片: {file_path}")
-        video_path = file_path
-        is_playing = False
-        is_paused = False
-        pygame.mixer.music.stop()
-        status_label.config(text=f"已選擇影片: {os.path.basename(video_path)}")
-        btn_process.config(state=tk.NORMAL)
-        btn_play_pause.config(state=tk.DISABLED)
-        if cap: cap.release()
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS) if cap.get(cv2.CAP_PROP_FPS) > 0 else 30
-        if cap.isOpened():
-            ret, frame = cap.read()
-            if ret: show_frame(frame)
+        open_video(file_path)
+
+def open_video(file_path):
+    global video_path, cap, is_playing, is_paused, active_proxy
+    video_path, active_proxy = file_path, None
+    if os.path.dirname(file_path) not in library_dirs: library_dirs.append(os.path.dirname(file_path))
+    is_playing = False
+    is_paused = False
+    stop_translation()
+    audio_clock.unload()  # 釋放音訊檔，上一部影片的工作資料夾才能刪除
+    old_workspace = use_workspace(None)
+    status_label.config(text=f"已選擇影片: {os.path.basename(video_path)}")
+    btn_process.config(state=tk.NORMAL)
+    btn_play_pause.config(state=tk.DISABLED)
+    set_cue_loop(-1)
+    frame_cache.clear()
+    close_parallel_decoder()
+    if cap: cap.release(); cap = None
+    for job in jobs.jobs.values():
+        if job.kind == 'proxy' and not job.finished:  # 只為目前的影片產生代理檔
+            jobs.cancel(job.id); job_panel.update_job(job)
+    # 影片資訊、預覽畫面、既有字幕與清除上一個工作資料夾在背景同時進行，介面不會卡住
+    canvas_size = (video_canvas.winfo_width(), video_canvas.winfo_height())
+    tasks = {'poster': lambda path: read_poster(path, canvas_size), 'subtitles': find_existing_subtitles}
+    if old_workspace and not queued_workspace(old_workspace): tasks['cleanup'] = lambda path: old_workspace.cleanup()
+    selector.select(video_path, tasks, on_select_result)
+
+def find_existing_subtitles(path):
+    srt_path = f"{os.path.splitext(path)[0]}.srt"
+    return load_srt(srt_path) if os.path.exists(srt_path) else None
+
+def on_select_result(name, result, error):
+    global fps
+    if name == 'poster' and result:
+        fps = result['fps']
+        if result['image']: show_image(result['image'])
+        request_proxy(result)
+        status_label.config(text=f"已選擇影片: {os.path.basename(video_path)} ({result['width']}x{result['height']}, {result['duration_ms'] / 1000:.0f} 秒)")
+    elif name == 'subtitles' and result:
+        load_existing_subtitles(result)
+
+def load_existing_subtitles(subs):
+    '''影片旁已有字幕 (上次辨識的結果)：沿用它排入處理佇列，只需提取音訊就能播放，不重新辨識；之後仍可按「處理影片」重新產生。'''
+    known = [job for job in jobs.jobs.values() if job.kind == 'process' and job.video_path == video_path and job.state not in ('failed', 'cancelled')]
+    if known:  # 已在佇列中 (例如從字幕庫開啟)，或已處理完成：直接載入那次的結果
+        if known[-1].state == 'done': load_job(known[-1].id)
+        return
+    log(f"找到既有字幕 {len(subs)} 句，沿用並準備播放")
+    enqueue(video_path, reuse_transcript=True, transcript=subs)
+    status_label.config(text=f"找到既有字幕 {len(subs)} 句，正在準備播放 (不重新辨識)...")
+
+def request_proxy(info):
+    '''選擇影片後：已有代理檔就直接使用，否則在處理佇列中背景產生。'''
+    if not proxy_cache: return
+    height = proxy_height(info['width'], info['height'], video_canvas.winfo_width(), video_canvas.winfo_height())
+    if not height: return
+    path = proxy_cache.lookup(video_path, height)
+    if path: return use_proxy(path)
+    job = jobs.submit(video_path, lambda job: proxy_job(job, height, info['fps']), kind='proxy')
+    job.name = f"[代理檔] {job.name}"
+    job_panel.update_job(job)
+
+def proxy_job(job, height, fps):
+    jobs.report(job, stage=f"產生 {height}p 代理檔")
+    return {'proxy': proxy_cache.build(job.video_path, height, fps, lambda command: jobs.run_process(job, command),
+                                      ffmpeg=config.get("ffmpeg_path", "ffmpeg"))}
+
+def on_proxy_update(job):
+    if job.state == 'done' and job.video_path == video_path: use_proxy(job.result['proxy'])
+    elif job.state == 'failed': log(f"代理檔產生失敗，繼續使用原始影片: {job.error}")
+
+def use_proxy(path):
+    '''之後的播放與拖曳改從代理檔解碼；處理結果還沒載入時只記錄下來，由 load_job 直接開啟代理檔。'''
+    global active_proxy, cap
+    active_proxy = path
+    if not cap: return
+    frame_cache.clear()
+    close_parallel_decoder()  # 代理檔解碼很快，不需要多行程預先解碼
+    cap.release()
+    cap = open_capture(path)
+    if loop_cue >= 0: set_cue_loop(loop_cue)  # 循環快取改由代理檔重新解碼
+    log(f"改用代理檔播放: {os.path.basename(path)}")
+    if not is_playing: update_player(force_update=True)
+
+def fit_canvas(frame):
+    '''縮到畫布大小；字幕畫在縮放後的影格上，原始影片、代理檔與快取影格的字幕大小都相同。'''
+    canvas_size = (video_canvas.winfo_width(), video_canvas.winfo_height())
+    return prescale(frame, canvas_size if min(canvas_size) > 1 else None)
 
 def show_frame(frame):
     img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
     canvas_w, canvas_h = video_canvas.winfo_width(), video_canvas.winfo_height()
     if canvas_w > 1 and canvas_h > 1: img.thumbnail((canvas_w, canvas_h), Image.Resampling.LANCZOS)
+    show_image(img)
+
+def show_image(img):
     imgtk = ImageTk.PhotoImage(image=img)
     video_canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
     video_canvas.image = imgtk
 
-def run_whisper_cpp(whisper_exe, model, audio, lang, srt_output_path):
-    output_dir, output_base = os.path.dirname(srt_output_path), os.path.splitext(os.path.basename(srt_output_path))[0]
-    command = [
-        whisper_exe, "-m", model, "-f", audio, "-osrt", "-of", os.path.join(output_dir, output_base),
-        "-l", lang, "-t", "8", "-bs", "8", "-bo", "8", "-et", "2.2", "-nth", "0.65", "-nf", "-tdrz"
-    ]
-    status_label.config(text="步驟 2/4: 正在執行 whisper.cpp 辨識...")
+def run_whisper_cpp(job, whisper_exe, model, audio, lang, json_output_path, threads=8):
+    '''執行 whisper.cpp，只輸出含 token 時間與機率的 JSON (-ojf)。'''
+    output_base = os.path.splitext(json_output_path)[0]
+    command = whisper_command(whisper_exe, model, audio, lang, threads, WHISPER_DECODE_ARGS) + ["-ojf", "-of", output_base]
     log(f"執行 Whisper.cpp 命令: {' '.join(command)}")
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore', creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
-        return os.path.exists(srt_output_path)
+        jobs.run_process(job, command, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+        return os.path.exists(json_output_path)
     except (FileNotFoundError, subprocess.CalledProcessError) as e:
-        messagebox.showerror("Whisper 錯誤", f"whisper.cpp 執行失敗: {e}"); return False
+        log(f"whisper.cpp 執行失敗: {e} {getattr(e, 'stderr', '') or ''}"); return False
 
-def process_video_thread():
-    global subtitles, cap, fps
-    if not video_path: return
-    btn_process.config(state=tk.DISABLED)
+def detect_source_language(job, audio_path, ws):
+    '''辨識語言為 auto 時，只對幾個短片段偵測一次語言 (依影片快取)，整部辨識與翻譯都使用這個結果。'''
+    return probe_language(language_cache, job.video_path, job.options['whisper'], job.options['model'], audio_path, ws.path('probe', 'probe.wav'),
+                          lambda command: jobs.run_process(job, command, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0))
+
+def process_job(job):
+    '''在處理佇列的工作執行緒執行：提取音訊、辨識、翻譯；進度只透過 jobs.report() 回報，不直接操作介面元件。'''
+    path, options = job.video_path, job.options
+    ws = JobWorkspace(path)
     try:
-        status_label.config(text="步驟 1/4: 正在提取音訊..."); progress_var.set(10)
-        with VideoFileClip(video_path) as video_clip:
-            video_clip.audio.write_audiofile(audio_path, logger=None)
-        progress_var.set(25)
-
-        srt_original_path = f"{os.path.splitext(video_path)[0]}.srt"
-        if not run_whisper_cpp(entry_whisper_path.get(), entry_model_path.get(), audio_path, lang_combobox.get(), srt_original_path):
-            raise Exception("whisper.cpp 執行失敗")
-        progress_var.set(60)
-
-        status_label.config(text="步驟 3/4: 正在使用 Google Translate 生成雙語字幕..."); progress_var.set(75)
-        subs_raw = pysrt.open(srt_original_path, encoding='utf-8')
-        subtitles.clear()
-        for sub in subs_raw:
-            translated_text = ""
-            if lang_combobox.get() != target_lang_combobox.get() and target_lang_combobox.get() != 'none':
-                source_lang = lang_combobox.get() if lang_combobox.get() != 'auto' else 'auto'
-                target_lang = target_lang_combobox.get()
-                translated_text = GoogleTranslator(source=source_lang, target=target_lang).translate(sub.text)
-            subtitles.append({'start': sub.start.ordinal, 'end': sub.end.ordinal, 'original': sub.text, 'translated': translated_text})
-
-        status_label.config(text="步驟 4/4: 準備播放器..."); progress_var.set(100)
-        pygame.mixer.music.load(audio_path)
-        if cap: cap.release()
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        status_label.config(text="處理完成！可以播放影片。")
-        controls_frame.pack(pady=10)
-        btn_play_pause.config(state=tk.NORMAL)
-    except Exception as e:
-        messagebox.showerror("處理錯誤", f"發生錯誤: {e}")
+        jobs.report(job, stage="步驟 1/4: 正在提取音訊", progress=10)
+        job_audio = ws.path('audio', 'audio.wav')
+        with VideoFileClip(path) as video_clip:
+            video_clip.audio.write_audiofile(job_audio, logger=None)
+        jobs.report(job, progress=25)
+
+        srt_path, language = f"{os.path.splitext(path)[0]}.srt", options['lang']
+        if options.get('transcript'):  # 選擇影片時已在背景讀取的既有字幕
+            subs = options['transcript']
+        elif options.get('reuse_transcript') and os.path.exists(srt_path):  # 從字幕庫開啟時沿用既有字幕
+            subs = load_srt(srt_path)
+        else:
+            transcript = ws.path('transcript', 'transcript.json')
+            with jobs.slot(job, 'whisper', "步驟 2/4: 正在執行 whisper.cpp 辨識"):
+                if language == 'auto': language = detect_source_language(job, job_audio, ws)
+                if not run_whisper_cpp(job, options['whisper'], options['model'], job_audio, language, transcript, options.get('threads', 8)):
+                    raise Exception("whisper.cpp 執行失敗")
+            # 直接由 JSON 建立字幕 (含逐字時間與信心值)，SRT 只是最後輸出到影片旁的檔案
+            subs, detected = load_transcript(transcript)
+            if language == 'auto' and detected: language = detected
+            save_srt(srt_path, subs)
+        jobs.report(job, progress=60)
+
+        options['source'] = language  # 實際辨識出的語言，背景翻譯時作為來源語言
+        if language != options['target'] and options['target'] != 'none' and not options.get('lazy'):
+            with jobs.slot(job, 'translate', "步驟 3/4: 生成雙語字幕"):
+                # 依語言對使用 config.json 設定的翻譯後端 (Google 或離線模型)，整批送出
+                translator = translators.get_translator(config, language, options['target'])
+                texts = translator.translate_batch([sub['original'] for sub in subs], progress=lambda done, total: jobs.report(job, progress=60 + done / total * 35))
+                for sub, text in zip(subs, texts): sub['translated'] = text
+
+        jobs.report(job, stage="準備播放器")
+        result = {'subtitles': subs, 'workspace': ws, 'decoder': probe_capture(path)}
+        if decode_workers > 0:
+            probe = cv2.VideoCapture(path)
+            result['keyframes'] = keyframe_indices(path, probe.get(cv2.CAP_PROP_FPS) or 30)
+            probe.release()
+        if transcript_index: transcript_index.add(path)  # 新產生的字幕立即可供搜尋
+        return result
+    except BaseException:
+        ws.cleanup()
+        raise
+
+def enqueue(path, **extra):
+    if any(job.kind == 'process' and job.video_path == path and not job.finished for job in jobs.jobs.values()):
+        log(f"已在處理佇列中: {path}"); return
+    options = {'whisper': entry_whisper_path.get(), 'model': entry_model_path.get(),
+               'lang': lang_combobox.get(), 'target': target_lang_combobox.get(),
+               'lazy': config.get("lazy_translation", True), **extra}  # 預設辨識完就能播放，翻譯在播放時於背景進行
+    choose_model(options)
+    job_panel.update_job(jobs.submit(path, process_job, **options))
+
+def choose_model(options):
+    '''設定了 whisper_rtf_target 時，依這台電腦的校準結果自動選擇模型與執行緒數 (見 model_calibration.py)。'''
+    target = config.get("whisper_rtf_target")
+    choice = pick_model(config.get("model_calibration"), target) if target else None
+    if choice:
+        options['model'], options['threads'] = choice[0], choice[1]
+        log(f"依 RTF 目標 {target} 選擇模型: {os.path.basename(choice[0])} x {choice[1]} 執行緒 (RTF {choice[2]:.3f})")
+
+def calibrate_models():
+    '''以目前影片的一段音訊，實測模型資料夾中每個模型與執行緒數的即時倍率，在處理佇列中執行。'''
+    whisper, model = entry_whisper_path.get(), entry_model_path.get()
+    if not video_path:
+        messagebox.showinfo("校準模型", "請先選擇一部有對白的影片作為參考音訊。"); return
+    if not os.path.exists(whisper) or not find_models(model):
+        messagebox.showerror("設定錯誤", "請檢查 whisper.cpp 執行檔與模型之路徑。"); return
+    lang = lang_combobox.get()
+    job = jobs.submit(video_path, lambda job: calibrate_job(job, whisper, model, lang), kind='calibrate')
+    job.name = f"[校準] {job.name}"
+    job_panel.update_job(job)
+
+def calibrate_job(job, whisper, model, lang):
+    with JobWorkspace(job.video_path) as ws:
+        jobs.report(job, stage="準備參考音訊")
+        clip = ws.path('audio', 'reference.wav')
+        duration = reference_clip(job.video_path, clip)
+        with jobs.slot(job, 'whisper', "校準模型"):
+            return calibrate(whisper, model, clip, duration, lambda command: jobs.run_process(job, command, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0),
+                             lang=lang, progress=lambda done, total: jobs.report(job, progress=done * 100 / total), decode_args=WHISPER_DECODE_ARGS)
+
+def on_calibration_update(job):
+    if job.state == 'done':
+        config.setdefault("model_calibration", {}).update(job.result)
+        status_label.config(text="模型校準完成")
+        messagebox.showinfo("校準模型", f"{summary(job.result)}\n\n在 config.json 設定 \"whisper_rtf_target\" 後，加入佇列時會自動選擇符合目標的模型。")
+    elif job.state == 'failed': messagebox.showerror("校準模型", f"校準失敗: {job.error}")
+
+def add_videos():
+    for path in filedialog.askopenfilenames(filetypes=[("MP4 files", "*.mp4")]): enqueue(path)
+
+def on_job_update(job):
+    if job.id not in jobs.jobs: return  # 已從佇列移除
+    job_panel.update_job(job)
+    if job.kind == 'export': return on_export_update(job)
+    if job.kind == 'calibrate': return on_calibration_update(job)
+    if job.kind == 'proxy': return on_proxy_update(job)
+    if job.video_path != video_path: return
+    if job.state == 'running':
+        status_label.config(text=f"{job.name}: {job.stage}..."); progress_var.set(job.progress)
+    elif job.state == 'done':
+        load_job(job.id)
+    elif job.state == 'failed':
+        messagebox.showerror("處理錯誤", f"發生錯誤: {job.error}")
         status_label.config(text="處理失敗，請重試。")
-    finally:
-        btn_process.config(state=tk.NORMAL)
+
+def load_job(job_id):
+    '''把完成的處理工作載入播放器；不是目前的影片時先切換過去。'''
+    global subtitles, cap, fps, cue_index, parallel_decoder, cv_hw_key, cv_hw_mode, is_playing, is_paused
+    job = jobs.jobs.get(job_id)
+    if not job or job.state != 'done' or job.kind != 'process': return
+    result = job.result
+    if job.video_path == video_path and workspace is result['workspace']: return apply_pending_seek()  # 已經載入
+    if job.video_path != video_path: open_video(job.video_path)
+    is_playing = is_paused = False
+    btn_play_pause.config(text="▶")
+    set_cue_loop(-1)
+    subtitles, cue_index = result['subtitles'], CueIndex.from_cues(result['subtitles'])
+    audio_clock.unload()
+    old_workspace = use_workspace(result['workspace'])
+    if old_workspace and not queued_workspace(old_workspace): old_workspace.cleanup()
+    audio_clock.load(audio_path)
+    cv_hw_key, cv_hw_mode = result['decoder']
+    if cap: cap.release()
+    cap = open_capture(active_proxy, 'none') if active_proxy else open_capture(video_path, cv_hw_mode)
+    if decode_workers > 0 and not active_proxy:
+        close_parallel_decoder()
+        try: parallel_decoder = ParallelDecoder(video_path, decode_workers, keyframes=result.get('keyframes'))
+        except Exception as e: log(f"多行程解碼啟動失敗，改用單一解碼器: {e}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    status_label.config(text="處理完成！可以播放影片。"); progress_var.set(100)
+    controls_frame.pack(pady=10)
+    btn_play_pause.config(state=tk.NORMAL)
+    start_translation(job)
+    apply_pending_seek()
+
+def start_translation(job):
+    '''處理時略過的翻譯改在背景進行，優先翻譯播放位置之後的字幕 (見 lazy_translate.py)。'''
+    global lazy_translation
+    stop_translation()
+    source, target = job.options.get('source', job.options['lang']), job.options['target']
+    pending = [i for i, sub in enumerate(subtitles) if not sub.get('translated')]
+    if not job.options.get('lazy') or not pending or target == 'none' or source == target: return
+    lazy_translation = LazyTranslation(lambda: translators.get_translator(config, source, target),
+                                       [(sub['start'], sub['end']) for sub in subtitles], [sub['original'] for sub in subtitles], pending,
+                                       lambda: root.event_generate("<<TranslationReady>>", when="tail"))
+    status_label.config(text=f"可以播放影片，背景翻譯 {len(pending)} 句中...")
+
+def stop_translation():
+    global lazy_translation
+    if lazy_translation: lazy_translation.stop(); lazy_translation = None
+
+def on_translation_ready():
+    if not lazy_translation: return
+    done = lazy_translation.drain()
+    for i, text in done: subtitles[i]['translated'] = text
+    remaining = lazy_translation.remaining
+    status_label.config(text=f"背景翻譯中，剩餘 {remaining} 句..." if remaining else "翻譯完成！")
+    # 暫停中畫面不會自動更新，正在顯示的這一句有了譯文就重畫一次
+    if not is_playing and cap and cue_index.find(audio_clock.position_ms()) in {i for i, _ in done}: update_player(force_update=True)
+
+def remove_job(job_id):
+    '''取消尚未結束的工作；已結束的工作移出佇列並清除它的工作資料夾 (播放中的除外)。'''
+    job = jobs.remove(job_id)
+    if job is None:
+        if job_id in jobs.jobs: job_panel.update_job(jobs.jobs[job_id])
+        return
+    job_panel.remove(job_id)
+    ws = job.result and job.result.get('workspace')
+    if ws and ws is not workspace: ws.cleanup()
+
+def queued_workspace(ws):
+    '''ws 是否屬於仍列在處理佇列中的工作 (這種工作資料夾要等工作移出佇列才清除)。'''
+    return any(job.result and job.result.get('workspace') is ws for job in jobs.jobs.values())
+
+def use_workspace(ws):
+    '''切換播放中使用的工作資料夾 (音訊檔所在處)，回傳上一個工作資料夾由呼叫端清除。'''
+    global workspace, audio_path
+    old, workspace = workspace, ws
+    audio_path = ws.artifacts.get('audio') if ws else None
+    return old
+
+def open_search():
+    global transcript_index
+    if transcript_index is None: transcript_index = TranscriptIndex()
+    SearchDialog(root, transcript_index, library_dirs, open_from_library)
+
+def open_from_library(video, start_ms):
+    '''從字幕庫搜尋結果開啟影片並跳到該句；影片尚未載入時沿用既有字幕排入處理佇列 (不重新辨識)。'''
+    global pending_seek
+    log(f"字幕庫: 開啟 {video} @ {start_ms / 1000:.1f}s")
+    pending_seek = (video, start_ms)
+    if workspace and video_path and os.path.normpath(video_path) == os.path.normpath(video): return apply_pending_seek()
+    done = [job for job in jobs.jobs.values() if job.kind == 'process' and job.state == 'done' and os.path.normpath(job.video_path) == os.path.normpath(video)]
+    if done: return load_job(done[-1].id)
+    open_video(video)
+    enqueue(video, reuse_transcript=True)
+
+def apply_pending_seek():
+    global pending_seek
+    if not pending_seek or not cap or os.path.normpath(pending_seek[0]) != os.path.normpath(video_path): return
+    seek_to(pending_seek[1])
+    pending_seek = None
+
+def seek_to(ms):
+    audio_clock.seek(ms, paused=not is_playing)
+    update_player(force_update=True)
+
+def export_cards():
+    '''把目前影片的字幕匯出成學習卡 (每句的音訊片段、截圖與 manifest)，在處理佇列中執行。'''
+    if not video_path or not subtitles:
+        messagebox.showinfo("匯出學習卡", "請先處理或載入有字幕的影片。"); return
+    folder = filedialog.askdirectory(title="選擇學習卡的輸出資料夾")
+    if not folder: return
+    out_dir = os.path.join(folder, f"{os.path.splitext(os.path.basename(video_path))[0]}_cards")
+    cues = [dict(sub) for sub in subtitles]
+    job = jobs.submit(video_path, lambda job: export_cards_job(job, cues, out_dir), kind='export', output=out_dir)
+    job.name = f"[學習卡] {job.name}"
+    job_panel.update_job(job)
+
+def export_cards_job(job, cues, out_dir):
+    jobs.report(job, stage="匯出學習卡")
+    def progress(done, total):
+        if done * 100 // total != (done - 1) * 100 // total: jobs.report(job, progress=done * 100 // total)
+    manifest = export_deck(job.video_path, cues, out_dir, ffmpeg=config.get("ffmpeg_path", "ffmpeg"), workers=config.get("export_workers", 4),
+                           with_video=config.get("export_video_clips", False), run=lambda command: jobs.run_process(job, command),
+                           progress=progress, cancelled=job.cancel_event.is_set)
+    return {'manifest': manifest}
+
+def export_burnin_video():
+    '''把雙語字幕燒錄進畫面，另存成 mp4 (給不支援外掛字幕的裝置)，在處理佇列中執行。'''
+    if not video_path or not subtitles:
+        messagebox.showinfo("燒錄字幕", "請先處理或載入有字幕的影片。"); return
+    out_path = filedialog.asksaveasfilename(title="燒錄字幕的影片另存為", defaultextension=".mp4", filetypes=[("MP4 files", "*.mp4")],
+                                            initialfile=f"{os.path.splitext(os.path.basename(video_path))[0]}_subbed.mp4")
+    if not out_path: return
+    if os.path.normpath(out_path) == os.path.normpath(video_path):
+        messagebox.showerror("燒錄字幕", "不能覆蓋原始影片。"); return
+    cues = [dict(sub) for sub in subtitles]
+    job = jobs.submit(video_path, lambda job: export_burnin_job(job, cues, out_path), kind='export', output=out_path)
+    job.name = f"[燒錄] {job.name}"
+    job_panel.update_job(job)
+
+def export_burnin_job(job, cues, out_path):
+    jobs.report(job, stage="燒錄字幕")
+    def progress(done, total, fps):
+        jobs.report(job, stage=f"燒錄字幕 ({fps:.0f} fps)", progress=done * 100 / total if total else 0)
+    export_burnin(job.video_path, cues, out_path, FONTS, ffmpeg=config.get("ffmpeg_path", "ffmpeg"),
+                  progress=progress, cancelled=job.cancel_event.is_set)
+    jobs.report(job)  # 被取消時丟出 JobCancelled
+    return {'output': out_path}
+
+def on_export_update(job):
+    if job.state == 'done': status_label.config(text=f"已匯出: {job.options['output']}")
+    elif job.state == 'failed': messagebox.showerror("匯出錯誤", f"匯出失敗: {job.error}")
 
 def start_processing():
-    threading.Thread(target=process_video_thread, daemon=True).start()
+    if not video_path: return
+    enqueue(video_path)
+    status_label.config(text=f"已加入處理佇列: {os.path.basename(video_path)}")
 
 def play_pause():
     global is_playing, is_paused
     if is_playing:
         is_playing = False
         is_paused = True
-        pygame.mixer.music.pause()
+        audio_clock.pause()
         btn_play_pause.config(text="▶")
         log("動作: 暫停")
     else:
         is_playing = True
         if is_paused:
             is_paused = False
-            pygame.mixer.music.unpause()
+            audio_clock.resume()
             log("動作: 恢復播放")
         else:
             log("動作: 從頭播放")
             if cap: cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            pygame.mixer.music.play()
+            audio_clock.play()
         btn_play_pause.config(text="❚❚")
         update_player()
 
@@ -181,19 +517,16 @@ def replay():
         is_playing = True
         btn_play_pause.config(text="❚❚")
     if cap: cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-    pygame.mixer.music.rewind()
-    pygame.mixer.music.play()
+    audio_clock.play()
     update_player()
 
 def seek(delta_ms):
     if not cap or not pygame.mixer.get_init(): return
     duration_ms = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps * 1000
-    current_time_ms = pygame.mixer.music.get_pos()
-    if current_time_ms == -1: current_time_ms = duration_ms
+    current_time_ms = duration_ms if audio_clock.is_finished() else audio_clock.position_ms()
     new_time_ms = current_time_ms + delta_ms
     new_time_ms = max(0, min(new_time_ms, duration_ms))
-    pygame.mixer.music.play(start=new_time_ms / 1000.0)
-    if not is_playing: pygame.mixer.music.pause()
+    audio_clock.seek(new_time_ms, paused=not is_playing)
     log(f"動作: 跳轉至 {new_time_ms/1000.0:.2f}s")
     # 強制立即更新一次畫面以反映跳轉
     update_player(force_update=True)
@@ -204,17 +537,110 @@ def set_position_from_scale(event):
         duration_ms = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps * 1000
         if duration_ms > 0:
             seek_time_ms = duration_ms * (float(value) / 100)
-            pygame.mixer.music.play(start=seek_time_ms / 1000.0)
-            if not is_playing: pygame.mixer.music.pause()
+            audio_clock.seek(seek_time_ms, paused=not is_playing)
             # 強制立即更新一次畫面以反映跳轉
             update_player(force_update=True)
 
+def set_playback_rate(rate):
+    global playback_rate
+    if not hasattr(audio_clock, 'set_rate'):
+        messagebox.showwarning("播放速度", "pygame.mixer.music 後端不支援變速，請在 config.json 設定 \"audio_backend\": \"pcm\"。")
+        rate_combobox.set('1.0'); return
+    playback_rate = rate
+    audio_clock.set_rate(rate)  # PCM 後端以 WSOLA 保持音高變速，影像與字幕跟隨音訊時鐘
+    log(f"動作: 播放速度 {rate}x")
+
+def read_frame(frame_idx, use_workers=True):
+    '''取得指定影格：先查單句循環快取與 LRU 快取，都沒有才解碼；連續播放時不重新跳轉。
+    use_workers=False (跳轉後立即重繪) 時不經過多行程解碼器，直接以單一解碼器讀取。'''
+    frame = loop_cache.get(frame_idx)
+    if frame is not None: return True, frame
+    canvas_size = (video_canvas.winfo_width(), video_canvas.winfo_height())
+    key = (frame_idx, canvas_size if frame_cache_prescale and min(canvas_size) > 1 else None)
+    frame = frame_cache.get(key)
+    if frame is not None: return True, frame
+    frame = parallel_decoder.get(frame_idx) if parallel_decoder and use_workers else None
+    if frame is not None:
+        ret, frame = True, frame.copy()  # 共享記憶體槽位之後會被重複使用，快取需保留自己的副本
+    elif parallel_decoder and use_workers and parallel_decoder.pending(frame_idx):
+        return False, None  # 工作行程正在解碼這一格：保留上一格畫面等下一次更新，不重複解碼
+    else:
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_idx: cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        ret, frame = cap.read()
+        if not ret and cv_hw_mode != 'none' and not active_proxy and frame_idx < cap.get(cv2.CAP_PROP_FRAME_COUNT) - 1:
+            fallback_hw_decode()  # 還沒到結尾卻讀不到影格：換下一個解碼模式重試
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            ret, frame = cap.read()
+    if ret:
+        frame = prescale(frame, key[1])
+        loop_cache.put(frame_idx, frame)  # 兩個快取存同樣大小的影格
+        frame_cache.put(key, frame)
+    return ret, frame
+
+def probe_capture(path):
+    '''依快取或實測結果選擇 OpenCV 的硬體解碼模式 (在處理工作的執行緒呼叫)，回傳 (快取鍵, 模式)。'''
+    key = "opencv:" + media_key(path)
+    return key, pick_decoder(hw_cache, key, opencv_hw_candidates(), lambda mode: bench_opencv(path, mode))
+
+def fallback_hw_decode():
+    global cap, cv_hw_mode
+    cv_hw_mode = mark_failed(hw_cache, cv_hw_key, cv_hw_mode, opencv_hw_candidates())
+    cap.release()
+    cap = open_capture(video_path, cv_hw_mode)
+
+def close_parallel_decoder():
+    global parallel_decoder
+    if parallel_decoder:
+        parallel_decoder.close()
+        parallel_decoder = None
+
+def set_cue_loop(cue_id):
+    global loop_cue
+    loop_cue = cue_id
+    if cue_id < 0:
+        loop_cache.clear()
+        btn_loop.config(text="單句循環")
+        return
+    sub = subtitles[cue_id]
+    canvas_size = (video_canvas.winfo_width(), video_canvas.winfo_height())
+    loop_cache.set_span(active_proxy or video_path, int(sub['start'] / 1000 * fps), int(sub['end'] / 1000 * fps) + 1, canvas_size if frame_cache_prescale and min(canvas_size) > 1 else None)
+    btn_loop.config(text="循環中 ✓")
+    log(f"動作: 單句循環 #{cue_id + 1} ({sub['start']}-{sub['end']} ms)")
+
+def toggle_cue_loop():
+    if not cap or not len(cue_index): return
+    if loop_cue >= 0:
+        set_cue_loop(-1); log("動作: 取消單句循環"); return
+    now = audio_clock.position_ms()
+    cue_id = cue_index.find(now)
+    if cue_id < 0: cue_id = cue_index.prev_cue(now)
+    if cue_id >= 0: set_cue_loop(cue_id)
+
+def jump_to_cue(direction):
+    '''上一句 / 下一句：精確跳到字幕開頭；循環中則改為循環新的一句。'''
+    if not cap or not pygame.mixer.get_init() or not len(cue_index): return
+    now = audio_clock.position_ms()
+    cue_id = cue_index.next_cue(now) if direction > 0 else cue_index.prev_cue(now)
+    if cue_id < 0: return
+    if loop_cue >= 0: set_cue_loop(cue_id)
+    start_ms = subtitles[cue_id]['start']
+    audio_clock.seek(start_ms, paused=not is_playing)
+    log(f"動作: {'下一句' if direction > 0 else '上一句'} #{cue_id + 1} ({start_ms/1000.0:.2f}s)")
+    update_player(force_update=True)
+
 def update_player(force_update=False):
+    global is_playing, is_paused, player_job
+    # 跳轉時在播放中強制重繪：先取消已排定的下一次更新，避免同時跑兩個更新迴圈
+    if player_job: root.after_cancel(player_job); player_job = None
     if (not is_playing and not force_update) or not cap:
         return
 
-    current_time_ms = pygame.mixer.music.get_pos()
-    if current_time_ms == -1 and is_playing:
+    current_time_ms = audio_clock.position_ms()
+    if loop_cue >= 0 and current_time_ms > subtitles[loop_cue]['end']:
+        # 單句循環：超過本句結尾就跳回開頭，影格由循環快取提供
+        current_time_ms = subtitles[loop_cue]['start']
+        audio_clock.seek(current_time_ms, paused=not is_playing)
+    elif audio_clock.is_finished() and is_playing:
         is_playing = False
         is_paused = False
         btn_play_pause.config(text="▶")
@@ -223,55 +649,37 @@ def update_player(force_update=False):
 
     # --- 【核心修復】強制影音同步 ---
     target_frame_num = int((current_time_ms / 1000.0) * fps)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_num)
-    ret, frame = cap.read()
+    ret, frame = read_frame(target_frame_num, use_workers=not force_update)
     
     if ret:
-        subtitle_layer_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(subtitle_layer_img)
-        for sub in subtitles:
-            if sub['start'] <= current_time_ms <= sub['end']:
-                # 【新】增加日誌，用於除錯字幕是否觸發
-                log(f"顯示字幕: {sub['original']}")
-                draw_subtitle_on_image(draw, sub['original'], sub['translated'], (frame.shape[1], frame.shape[0]))
-                break
-        
-        show_frame(cv2.cvtColor(np.array(subtitle_layer_img), cv2.COLOR_RGB2BGR))
+        cue_id = cue_index.find(current_time_ms)
+        if lazy_translation: lazy_translation.set_position(current_time_ms)
+        if cue_id >= 0:
+            scaled = fit_canvas(frame)
+            frame = scaled if scaled is not frame else frame.copy()  # 快取中的影格不可直接修改
+            subtitle_renderer.draw(frame, subtitles[cue_id], current_time_ms)
+        show_frame(frame)
+        audio_clock.frame_presented()
         
         duration_ms = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps * 1000
         if duration_ms > 0:
             timeline_scale.set(current_time_ms / duration_ms * 100)
     
     if is_playing:
-        delay = max(1, int(1000 / fps))
-        root.after(delay, update_player)
-
-def draw_subtitle_on_image(draw, original, translated, frame_size):
-    frame_w, frame_h = frame_size
-    padding = 20
-    bg_color = (0, 0, 0, 150) # 半透明黑色背景
-
-    original_bbox = draw.textbbox((0, 0), original, font=FONTS['original'])
-    original_h = original_bbox[3] - original_bbox[1]
-    
-    translated_h = 0
-    if translated:
-        translated_bbox = draw.textbbox((0, 0), translated, font=FONTS['translated'])
-        translated_h = translated_bbox[3] - translated_bbox[1]
-
-    total_h = original_h + translated_h + 30
-    
-    draw.rectangle(((0, frame_h - total_h), (frame_w, frame_h)), fill=bg_color)
-    
-    current_y = frame_h - total_h + 15
-    draw.text((padding, current_y), original, font=FONTS['original'], fill=(255, 255, 255))
-    if translated:
-        draw.text((padding, current_y + original_h + 5), translated, font=FONTS['translated'], fill=(220, 220, 150)) # 翻譯使用淡黃色以區分
+        delay = max(1, int(1000 / (fps * playback_rate)))
+        player_job = root.after(delay, update_player)
 
 # --- GUI ---
 root = tk.Tk()
 root.title("字幕學習播放器 (v16.Fix)")
 root.geometry("950x900")
+# 選擇影片時的背景工作完成後，由 Tk 主執行緒套用結果
+selector = AsyncSelector(lambda: root.event_generate("<<SelectReady>>", when="tail"))
+root.bind("<<SelectReady>>", lambda event: selector.drain())
+# 處理佇列的工作執行緒只把進度放進佇列，由 Tk 主執行緒套用到佇列面板與狀態列
+jobs = JobQueue(lambda: root.event_generate("<<JobUpdate>>", when="tail"))
+root.bind("<<JobUpdate>>", lambda event: jobs.drain(on_job_update))
+root.bind("<<TranslationReady>>", lambda event: on_translation_ready())
 
 settings_frame = ttk.LabelFrame(root, text="路徑設定", padding=(10, 5)); settings_frame.pack(padx=10, pady=10, fill="x")
 entries = {}
@@ -290,6 +698,8 @@ Label(lang_options_frame, text="翻譯成:").pack(side="left", padx=(10, 5))
 target_lang_combobox = ttk.Combobox(lang_options_frame, values=['zh-TW', 'en', 'ja', 'ko', 'none'], width=10, state="readonly"); target_lang_combobox.set('zh-TW')
 target_lang_combobox.pack(side="left", padx=5)
 
+job_panel = JobPanel(root, on_add=add_videos, on_load=load_job, on_remove=remove_job); job_panel.pack(padx=10, pady=5, fill="x")
+
 main_frame = Frame(root); main_frame.pack(pady=10, padx=10, fill="both", expand=True)
 video_canvas = tk.Canvas(main_frame, bg="black"); video_canvas.pack(fill="both", expand=True)
 status_label = tk.Label(main_frame, text="請設定路徑並選擇影片檔案", font=("Arial", 12)); status_label.pack(pady=5)
@@ -305,9 +715,20 @@ btn_replay = ttk.Button(buttons_frame, text="|◀", command=replay, width=5); bt
 btn_rewind = ttk.Button(buttons_frame, text="◀◀ 5s", command=lambda: seek(-5000), width=8); btn_rewind.pack(side="left", padx=5)
 btn_play_pause = ttk.Button(buttons_frame, text="▶", command=play_pause, width=5, state=tk.DISABLED); btn_play_pause.pack(side="left", padx=5)
 btn_forward = ttk.Button(buttons_frame, text="5s ▶▶", command=lambda: seek(5000), width=8); btn_forward.pack(side="left", padx=5)
+btn_prev_cue = ttk.Button(buttons_frame, text="⏮ 上一句", command=lambda: jump_to_cue(-1), width=8); btn_prev_cue.pack(side="left", padx=5)
+btn_loop = ttk.Button(buttons_frame, text="單句循環", command=toggle_cue_loop, width=9); btn_loop.pack(side="left", padx=5)
+btn_next_cue = ttk.Button(buttons_frame, text="下一句 ⏭", command=lambda: jump_to_cue(1), width=8); btn_next_cue.pack(side="left", padx=5)
+Label(buttons_frame, text="速度:").pack(side="left", padx=(15, 2))
+rate_combobox = ttk.Combobox(buttons_frame, values=['0.5', '0.75', '1.0', '1.25', '1.5'], width=5, state="readonly"); rate_combobox.set('1.0')
+rate_combobox.bind("<<ComboboxSelected>>", lambda event: set_playback_rate(float(rate_combobox.get())))
+rate_combobox.pack(side="left", padx=5)
 
 top_buttons_frame = tk.Frame(root); top_buttons_frame.pack(pady=(5,10))
 btn_select = ttk.Button(top_buttons_frame, text="選擇影片", command=select_video); btn_select.pack(side="left", padx=5)
+btn_search = ttk.Button(top_buttons_frame, text="搜尋字幕庫", command=open_search); btn_search.pack(side="left", padx=5)
+btn_calibrate = ttk.Button(top_buttons_frame, text="校準模型", command=calibrate_models); btn_calibrate.pack(side="left", padx=5)
+btn_export = ttk.Button(top_buttons_frame, text="匯出學習卡...", command=export_cards); btn_export.pack(side="left", padx=5)
+btn_burnin = ttk.Button(top_buttons_frame, text="燒錄字幕...", command=export_burnin_video); btn_burnin.pack(side="left", padx=5)
 btn_process = ttk.Button(top_buttons_frame, text="處理影片", command=start_processing, state=tk.DISABLED); btn_process.pack(side="left", padx=5)
 
 if __name__ == "__main__":
@@ -315,35 +736,61 @@ if __name__ == "__main__":
     if config:
         entry_whisper_path.insert(0, config.get("whisper_path", ""))
         entry_model_path.insert(0, config.get("model_path", ""))
+    # 預設以 PCM 串流 (Channel) 作為影音同步的主時鐘；設為 "music" 可退回 pygame.mixer.music
+    if config.get("audio_backend", "pcm") == "pcm":
+        audio_clock = PcmAudioPlayer()
+    # 已解碼影格的 LRU 快取預算 (MB)；預設先縮到畫布大小再存 (約 1.5 MB/格，512 MB 可存 60 fps 約 5 秒)，
+    # frame_cache_prescale 設為 false 則保存原始解析度 (1080p 約 6 MB/格)
+    frame_cache.max_bytes = config.get("frame_cache_mb", 512) * 1024 * 1024
+    frame_cache_prescale = config.get("frame_cache_prescale", True)
+    # 高解析度 (4K60) 影片可設定 "decode_workers": 3 改由多個行程預先解碼，0 為關閉
+    decode_workers = config.get("decode_workers", 0)
+    hw_cache.update(config.get("hw_decode_cache", {}))
+    sweep_stale()  # 清除上次異常結束留下的工作資料夾
+    # 同時處理的影片數與各階段上限，例如 {"max_jobs": 3, "whisper": 1, "translate": 2}
+    jobs.set_limits(**config.get("job_limits", {}))
+    library_dirs.extend(config.get("library_dirs", []))  # 字幕庫搜尋的資料夾 (開啟過的影片所在資料夾會自動加入)
+    language_cache.update(config.get("language_cache", {}))
+    # 高位元率影片可設定 "proxy_enabled": true，在背景產生縮到畫布大小的代理檔供播放與拖曳使用；
+    # "proxy_budget_mb" 為代理檔資料夾的磁碟預算，"proxy_gop": 1 為 all-intra (檔案較大、跳轉最快)
+    if config.get("proxy_enabled", False):
+        proxy_cache = ProxyCache(config.get("proxy_dir"), config.get("proxy_budget_mb", 4096), config.get("proxy_gop", 12))
     
     final_font_path = find_system_font()
     FONTS = {
         'original': ImageFont.truetype(final_font_path, 36) if final_font_path else ImageFont.load_default(size=36),
         'translated': ImageFont.truetype(final_font_path, 32) if final_font_path else ImageFont.load_default(size=32)
     }
+    subtitle_renderer = SubtitleRenderer(FONTS)  # 每句字幕只繪製一次，逐字高亮只重疊目前的詞
 
     def on_closing():
         global is_playing
         log("正在關閉程式...")
+        selector.shutdown()
+        stop_translation()
+        jobs.shutdown()
+        translators.shutdown()
         is_playing = False
         if cap: cap.release()
+        close_parallel_decoder()
         
         # --- 【核心修復】確保音訊檔被釋放和刪除 ---
         if pygame.mixer.get_init():
-            pygame.mixer.music.stop() # 1. 先停止音樂
+            audio_clock.unload()      # 1. 先停止音樂並釋放音訊檔
             pygame.mixer.quit()       # 2. 再退出 mixer
         
         # 等待一小段時間確保檔案控制碼被釋放
         time.sleep(0.1)
 
-        if os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-                log(f"成功移除暫存音訊檔: {audio_path}")
-            except Exception as e:
-                log(f"關閉時刪除音訊檔失敗: {e}")
+        for job in jobs.jobs.values():
+            if job.result and job.result.get('workspace'): job.result['workspace'].cleanup()
+        if workspace: workspace.cleanup()
+        if transcript_index: transcript_index.close()
 
-        save_config({"whisper_path": entry_whisper_path.get(), "model_path": entry_model_path.get()})
+        frame_cache.log_stats()
+        save_config({**config, "whisper_path": entry_whisper_path.get(), "model_path": entry_model_path.get(),
+                     "audio_backend": config.get("audio_backend", "pcm"), "frame_cache_mb": frame_cache.max_bytes // 1048576, "hw_decode_cache": hw_cache, "library_dirs": library_dirs,
+                     "language_cache": language_cache})
         root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -8,23 +8,52 @@
 #
 #  如何使用：
 #  1. 安裝 VLC 播放器主程式 (https://www.videolan.org/vlc/)
-#  2. pip install Pillow tkinter opencv-python moviepy pysrt deep_translator python-vlc
+#  2. pip install Pillow tkinter opencv-python moviepy deep_translator python-vlc
 #  3. 從命令提示字元 (cmd) 執行 `python your_script_name.py` 以查看後台日誌。
-#  4. 若播放時暫停或拖曳後卡頓，請勾選「停用硬體解碼」後再重新處理影片。
+#  4. 選擇影片後會自動測試並選擇最快的硬體解碼模式，播放中出錯或停滯時自動退回；
+#     若仍然卡頓，可勾選「停用硬體解碼」強制使用軟體解碼。
+#  5. (選用) pip install ctranslate2 sentencepiece 並在 config.json 設定 "translators"，
+#     即可使用離線翻譯模型 (見 translators.py)。
 #
 # ===================================================================================
 
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox, Frame, Label, Entry, Checkbutton, BooleanVar
-import threading, os, sys, json, subprocess, cv2, pysrt, vlc
-from deep_translator import GoogleTranslator
+import os, sys, json, subprocess, vlc
 from moviepy.editor import VideoFileClip
-from PIL import Image, ImageTk
+from PIL import ImageTk
+from subtitle_codec import load_srt, save_srt, format_srt, format_ass
+from whisper_json import load_transcript
+from ui_update import UiUpdater, slider_step
+from cue_scheduler import CueScheduler
+from vlc_manager import VlcPlayerManager
+from cue_index import CueIndex
+from async_select import AsyncSelector, read_poster
+from workspace import JobWorkspace, sweep_stale
+from job_queue import JobQueue
+from job_panel import JobPanel
+from transcript_index import TranscriptIndex
+from search_panel import SearchDialog
+from clip_export import export_deck
+import translators
+from lazy_translate import LazyTranslation
+from language_probe import probe_language
+from model_calibration import whisper_command, find_models, reference_clip, calibrate, pick_model, summary
+from hw_probe import vlc_hw_candidates, media_key, bench_vlc, pick_decoder, mark_failed, DecodeWatchdog
 
 # --- 1. 全域變數與初始化 ---
-CONFIG_FILE, video_path, audio_path = "config.json", None, "temp_audio.wav"
-srt_original_path_global, srt_backup_path_global = None, None
-vlc_instance, vlc_player = None, None
+CONFIG_FILE, video_path = "config.json", None
+vlc_manager, vlc_player = None, None
+timeline_steps = 100  # 進度條的格數，依進度條的像素寬度更新 (一格一像素)
+timeline_job, timeline_rendering = None, False
+subtitles, cue_index, loop_cue = [], CueIndex([]), -1
+hw_cache, hw_mode, hw_media_key = {}, None, None
+decode_watchdog = DecodeWatchdog()
+library_dirs, transcript_index = [], None  # 字幕庫搜尋
+language_cache = {}  # 影片 -> 探測到的語言
+WHISPER_DECODE_ARGS = ()  # whisper.cpp 的解碼參數 (辨識與模型校準共用)
+lazy_translation, subtitle_refresh_job, subtitle_refresh_delay = None, None, 1000  # 背景翻譯與字幕軌更新
+select_pending, existing_subtitles = set(), None  # 選擇影片的背景工作；找到的既有字幕在硬體解碼測試後才掛上
 
 # --- 2. 核心功能函式 ---
 def log(message): print(f"[LOG] {message}")
@@ -53,124 +82,369 @@ def auto_detect_vlc_path():
     return None
 
 def select_video():
-    global video_path
     file_path = filedialog.askopenfilename(filetypes=[("MP4 files", "*.mp4")])
     if file_path:
         log(f"使用者選擇影片: {file_path}")
-        video_path = file_path
-        status_label.config(text=f"已選擇影片: {os.path.basename(video_path)}")
-        progress_var.set(0)
-        btn_process.config(state=tk.NORMAL)
-        if vlc_player and vlc_player.is_playing(): vlc_player.stop()
-        cap = cv2.VideoCapture(video_path)
-        if cap.isOpened():
-            ret, frame = cap.read()
-            if ret: show_preview_frame(frame)
-            cap.release()
-
-def show_preview_frame(frame):
-    img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    canvas_w, canvas_h = video_canvas.winfo_width(), video_canvas.winfo_height()
-    if canvas_w > 1 and canvas_h > 1: img.thumbnail((canvas_w, canvas_h), Image.Resampling.LANCZOS)
+        open_video(file_path)
+
+def open_video(file_path):
+    global video_path, select_pending, existing_subtitles
+    video_path, existing_subtitles = file_path, None
+    if os.path.dirname(file_path) not in library_dirs: library_dirs.append(os.path.dirname(file_path))
+    stop_translation()
+    status_label.config(text=f"已選擇影片: {os.path.basename(video_path)}")
+    progress_var.set(0)
+    btn_process.config(state=tk.NORMAL)
+    set_cue_loop(-1)
+    if vlc_player and vlc_player.is_playing(): vlc_player.stop()
+    # 預覽畫面、既有字幕與硬體解碼測試在背景同時進行，介面不會卡住
+    canvas_size = (video_canvas.winfo_width(), video_canvas.winfo_height())
+    tasks = {'poster': lambda path: read_poster(path, canvas_size), 'subtitles': find_existing_subtitles}
+    if not hw_decode_disabled.get(): tasks['hw_probe'] = probe_hw_decode
+    else: preparse_video()  # 不測試硬體解碼時實例參數已確定，直接預先解析
+    select_pending = set(tasks)
+    selector.select(video_path, tasks, on_select_result)
+
+def preparse_video():
+    '''處理影片期間由 libVLC 在背景預先解析媒體；先以此影片的硬體解碼模式建立實例，開啟時不會因重建而丟掉解析結果。'''
+    if ensure_vlc_player(show_errors=False): vlc_manager.preparse(video_path)
+
+def find_existing_subtitles(path):
+    srt_path = f"{os.path.splitext(path)[0]}.srt"
+    return load_srt(srt_path) if os.path.exists(srt_path) else None
+
+def on_select_result(name, result, error):
+    global existing_subtitles
+    select_pending.discard(name)
+    if name == 'poster' and result:
+        if result['image']: show_preview_image(result['image'])
+        status_label.config(text=f"已選擇影片: {os.path.basename(video_path)} ({result['width']}x{result['height']}, {result['duration_ms'] / 1000:.0f} 秒)")
+    elif name == 'subtitles' and result:
+        log(f"找到既有字幕 {len(result)} 句")
+        existing_subtitles = result
+    elif name == 'hw_probe' and not player_in_use():  # 已從字幕庫開始播放時不重建實例
+        preparse_video()  # 測試失敗時使用 VLC 預設模式
+    # 硬體解碼模式確定後才設定媒體，之後不會因為重建實例而被清掉
+    if existing_subtitles and 'hw_probe' not in select_pending: load_existing_subtitles()
+
+def player_in_use():
+    return vlc_player is not None and vlc_player.get_state() not in (vlc.State.NothingSpecial, vlc.State.Stopped, vlc.State.Ended)
+
+def load_existing_subtitles():
+    '''影片旁已有字幕 (之前處理過)：直接掛到播放器就能播放，不必重新辨識；仍可按「處理影片」重新產生。'''
+    global subtitles, cue_index, existing_subtitles
+    subs, existing_subtitles = existing_subtitles, None
+    if player_in_use() or not ensure_vlc_player(show_errors=False): return  # 例如已從字幕庫開啟並播放
+    set_cue_loop(-1)
+    subtitles, cue_index = subs, CueIndex.from_cues(subs)
+    setup_vlc_player(subtitles)
+    status_label.config(text=f"已載入既有字幕 {len(subs)} 句，可以播放影片。")
+    controls_frame.pack(pady=10)
+
+def show_preview_image(img):
     imgtk = ImageTk.PhotoImage(image=img)
     video_canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
     video_canvas.image = imgtk
 
-def run_whisper_cpp(whisper_exe, model, audio, lang, srt_output_path):
-    output_dir, output_base = os.path.dirname(srt_output_path), os.path.splitext(os.path.basename(srt_output_path))[0]
-    command = [whisper_exe, "-m", model, "-f", audio, "-osrt", "-of", os.path.join(output_dir, output_base), "-l", lang, "-t", "8"]
-    status_label.config(text="步驟 2/4: 正在執行 whisper.cpp 辨識...")
+def run_whisper_cpp(job, whisper_exe, model, audio, lang, json_output_path, threads=8):
+    '''執行 whisper.cpp，只輸出含 token 時間與機率的 JSON (-ojf)。'''
+    command = whisper_command(whisper_exe, model, audio, lang, threads, WHISPER_DECODE_ARGS) + ["-ojf", "-of", os.path.splitext(json_output_path)[0]]
     log(f"執行 Whisper.cpp 命令: {' '.join(command)}")
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore', creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
-        return os.path.exists(srt_output_path)
+        jobs.run_process(job, command, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+        return os.path.exists(json_output_path)
     except (FileNotFoundError, subprocess.CalledProcessError) as e:
-        messagebox.showerror("Whisper 錯誤", f"whisper.cpp 執行失敗: {e}")
+        log(f"whisper.cpp 執行失敗: {e} {getattr(e, 'stderr', '') or ''}")
         return False
 
-def process_video_thread():
-    global srt_original_path_global, srt_backup_path_global
-    if not video_path: return
-    whisper_exe_path, model_path = entry_whisper_path.get(), entry_model_path.get()
-    source_lang, target_lang = lang_combobox.get(), target_lang_combobox.get()
-    if not all(os.path.exists(p) for p in [whisper_exe_path, model_path]):
+def detect_source_language(job, audio_path, ws):
+    '''辨識語言為 auto 時，只對幾個短片段偵測一次語言 (依影片快取)，整部辨識與翻譯都使用這個結果。'''
+    return probe_language(language_cache, job.video_path, job.options['whisper'], job.options['model'], audio_path, ws.path('probe', 'probe.wav'),
+                          lambda command: jobs.run_process(job, command, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0))
+
+def process_job(job):
+    '''在處理佇列的工作執行緒執行：提取音訊、辨識、翻譯；進度只透過 jobs.report() 回報，不直接操作介面元件。'''
+    path, options = job.video_path, job.options
+    source_lang, target_lang = options['lang'], options['target']
+    # 音訊與 whisper.cpp 的輸出都放在這個工作專屬的暫存資料夾，離開 with 區塊即刪除
+    with JobWorkspace(path) as ws:
+        jobs.report(job, stage="步驟 1/4: 正在提取音訊", progress=10)
+        audio_path = ws.path('audio', 'audio.wav')
+        with VideoFileClip(path) as video_clip:
+            video_clip.audio.write_audiofile(audio_path, logger=None)
+        jobs.report(job, progress=25)
+
+        transcript = ws.path('transcript', 'transcript.json')
+        with jobs.slot(job, 'whisper', "步驟 2/4: 正在執行 whisper.cpp 辨識"):
+            if source_lang == 'auto': source_lang = detect_source_language(job, audio_path, ws)
+            if not run_whisper_cpp(job, options['whisper'], options['model'], audio_path, source_lang, transcript, options.get('threads', 8)):
+                raise Exception("whisper.cpp 執行失敗")
+        # 直接由 JSON 建立字幕 (含逐字時間與信心值)，SRT 只是最後輸出到影片旁的檔案
+        subs, detected = load_transcript(transcript)
+        if source_lang == 'auto' and detected: source_lang = detected
+    options['source'] = source_lang  # 實際辨識出的語言，背景翻譯時作為來源語言
+    save_srt(f"{os.path.splitext(path)[0]}.srt", subs)
+    jobs.report(job, progress=60)
+    if transcript_index: transcript_index.add(path)  # 新產生的字幕立即可供搜尋
+
+    if source_lang != target_lang and target_lang != 'none' and not options.get('lazy'):
+        with jobs.slot(job, 'translate', "步驟 3/4: 正在生成雙語字幕"):
+            # 依語言對使用 config.json 設定的翻譯後端 (Google 或離線模型)，整批送出
+            translator = translators.get_translator(config, source_lang, target_lang)
+            texts = translator.translate_batch([sub['original'] for sub in subs], progress=lambda done, total: jobs.report(job, progress=60 + done / total * 35))
+            for sub, text in zip(subs, texts): sub['translated'] = text
+    return subs
+
+def enqueue(path):
+    if any(job.kind == 'process' and job.video_path == path and not job.finished for job in jobs.jobs.values()):
+        log(f"已在處理佇列中: {path}"); return
+    options = {'whisper': entry_whisper_path.get(), 'model': entry_model_path.get(),
+               'lang': lang_combobox.get(), 'target': target_lang_combobox.get(),
+               'lazy': config.get("lazy_translation", True)}  # 預設辨識完就能播放，翻譯在播放時於背景進行
+    choose_model(options)
+    if not all(os.path.exists(p) for p in [options['whisper'], options['model']]):
         messagebox.showerror("設定錯誤", "請檢查 whisper.cpp 執行檔與模型之路徑。")
         return
+    job_panel.update_job(jobs.submit(path, process_job, **options))
+
+def choose_model(options):
+    '''設定了 whisper_rtf_target 時，依這台電腦的校準結果自動選擇模型與執行緒數 (見 model_calibration.py)。'''
+    target = config.get("whisper_rtf_target")
+    choice = pick_model(config.get("model_calibration"), target) if target else None
+    if choice:
+        options['model'], options['threads'] = choice[0], choice[1]
+        log(f"依 RTF 目標 {target} 選擇模型: {os.path.basename(choice[0])} x {choice[1]} 執行緒 (RTF {choice[2]:.3f})")
+
+def calibrate_models():
+    '''以目前影片的一段音訊，實測模型資料夾中每個模型與執行緒數的即時倍率，在處理佇列中執行。'''
+    whisper, model = entry_whisper_path.get(), entry_model_path.get()
+    if not video_path:
+        messagebox.showinfo("校準模型", "請先選擇一部有對白的影片作為參考音訊。"); return
+    if not os.path.exists(whisper) or not find_models(model):
+        messagebox.showerror("設定錯誤", "請檢查 whisper.cpp 執行檔與模型之路徑。"); return
+    lang = lang_combobox.get()
+    job = jobs.submit(video_path, lambda job: calibrate_job(job, whisper, model, lang), kind='calibrate')
+    job.name = f"[校準] {job.name}"
+    job_panel.update_job(job)
+
+def calibrate_job(job, whisper, model, lang):
+    with JobWorkspace(job.video_path) as ws:
+        jobs.report(job, stage="準備參考音訊")
+        clip = ws.path('audio', 'reference.wav')
+        duration = reference_clip(job.video_path, clip)
+        with jobs.slot(job, 'whisper', "校準模型"):
+            return calibrate(whisper, model, clip, duration, lambda command: jobs.run_process(job, command, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0),
+                             lang=lang, progress=lambda done, total: jobs.report(job, progress=done * 100 / total), decode_args=WHISPER_DECODE_ARGS)
+
+def on_calibration_update(job):
+    if job.state == 'done':
+        config.setdefault("model_calibration", {}).update(job.result)
+        status_label.config(text="模型校準完成")
+        messagebox.showinfo("校準模型", f"{summary(job.result)}\n\n在 config.json 設定 \"whisper_rtf_target\" 後，加入佇列時會自動選擇符合目標的模型。")
+    elif job.state == 'failed': messagebox.showerror("校準模型", f"校準失敗: {job.error}")
+
+def add_videos():
+    for path in filedialog.askopenfilenames(filetypes=[("MP4 files", "*.mp4")]): enqueue(path)
+
+def on_job_update(job):
+    if job.id not in jobs.jobs: return  # 已從佇列移除
+    job_panel.update_job(job)
+    if job.kind == 'export': return on_export_update(job)
+    if job.kind == 'calibrate': return on_calibration_update(job)
+    if job.video_path != video_path: return
+    if job.state == 'running':
+        status_label.config(text=f"{job.name}: {job.stage}..."); progress_var.set(job.progress)
+    elif job.state == 'done':
+        load_job(job.id)
+    elif job.state == 'failed':
+        messagebox.showerror("處理錯誤", f"發生錯誤: {job.error}")
+        status_label.config(text="處理失敗，請重試。")
 
-    btn_process.config(state=tk.DISABLED)
-    try:
-        status_label.config(text="步驟 1/4: 正在提取音訊..."); progress_var.set(10)
-        VideoFileClip(video_path).audio.write_audiofile(audio_path, logger=None)
-        progress_var.set(25)
-
-        srt_original_path_global = f"{os.path.splitext(video_path)[0]}.srt"
-        if not run_whisper_cpp(whisper_exe_path, model_path, audio_path, source_lang, srt_original_path_global):
-            raise Exception("whisper.cpp 執行失敗")
-        progress_var.set(60)
-
-        status_label.config(text="步驟 3/4: 正在生成雙語字幕檔...")
-        subs = pysrt.open(srt_original_path_global, encoding='utf-8')
-        combined_srt_path = f"{os.path.splitext(video_path)[0]}_combined.srt"
-        with open(combined_srt_path, 'w', encoding='utf-8') as f:
-            for i, sub in enumerate(subs):
-                translated_text = GoogleTranslator(source=source_lang if source_lang != 'auto' else 'auto', target=target_lang).translate(sub.text) if source_lang != target_lang and target_lang != 'none' else ""
-                f.write(f"{i+1}\n{sub.start} --> {sub.end}\n{sub.text}\n")
-                if translated_text: f.write(f"{translated_text}\n")
-                f.write("\n")
-                progress_var.set(60 + ((i + 1) / len(subs) * 35))
-        
-        srt_backup_path_global = f"{srt_original_path_global}.bak"
-        if os.path.exists(srt_backup_path_global): os.remove(srt_backup_path_global)
-        os.rename(srt_original_path_global, srt_backup_path_global)
-        log(f"已將 '{os.path.basename(srt_original_path_global)}' 更名為 '{os.path.basename(srt_backup_path_global)}'")
-
-        status_label.config(text="步驟 4/4: 準備播放器..."); progress_var.set(100)
-        setup_vlc_player(combined_srt_path)
-        status_label.config(text="處理完成！可以播放影片。")
-        controls_frame.pack(pady=10)
+def load_job(job_id):
+    '''把完成的處理工作載入播放器；不是目前的影片時先切換過去。'''
+    global subtitles, cue_index
+    job = jobs.jobs.get(job_id)
+    if not job or job.state != 'done' or job.kind != 'process': return
+    if job.video_path != video_path: open_video(job.video_path)
+    set_cue_loop(-1)
+    subtitles, cue_index = job.result, CueIndex.from_cues(job.result)
+    status_label.config(text="步驟 4/4: 準備播放器..."); progress_var.set(100)
+    setup_vlc_player(subtitles)
+    status_label.config(text="處理完成！可以播放影片。")
+    controls_frame.pack(pady=10)
+    start_translation(job)
+
+def remove_job(job_id):
+    '''取消尚未結束的工作；已結束的工作移出佇列。'''
+    if jobs.remove(job_id): job_panel.remove(job_id)
+    elif job_id in jobs.jobs: job_panel.update_job(jobs.jobs[job_id])
+
+def start_translation(job):
+    '''處理時略過的翻譯改在背景進行，優先翻譯播放位置之後的字幕 (見 lazy_translate.py)。'''
+    global lazy_translation, subtitle_refresh_delay
+    stop_translation()
+    source, target = job.options.get('source', job.options['lang']), job.options['target']
+    pending = [i for i, sub in enumerate(subtitles) if not sub.get('translated')]
+    if not job.options.get('lazy') or not pending or target == 'none' or source == target: return
+    lazy_translation = LazyTranslation(lambda: translators.get_translator(config, source, target),
+                                       [(sub['start'], sub['end']) for sub in subtitles], [sub['original'] for sub in subtitles], pending,
+                                       lambda: root.event_generate("<<TranslationReady>>", when="tail"))
+    subtitle_refresh_delay = 1000
+    status_label.config(text=f"可以播放影片，背景翻譯 {len(pending)} 句中...")
+
+def stop_translation():
+    global lazy_translation, subtitle_refresh_job
+    if lazy_translation: lazy_translation.stop(); lazy_translation = None
+    if subtitle_refresh_job: root.after_cancel(subtitle_refresh_job); subtitle_refresh_job = None
+
+def on_translation_ready():
+    global subtitle_refresh_job
+    if not lazy_translation: return
+    done = lazy_translation.drain()
+    for i, text in done: subtitles[i]['translated'] = text
+    remaining = lazy_translation.remaining
+    status_label.config(text=f"背景翻譯中，剩餘 {remaining} 句..." if remaining else "翻譯完成！")
+    # VLC 的字幕軌是整個檔案，每次更新都會多一條字幕軌：接下來 30 秒內的句子有新譯文 (或全部完成) 時
+    # 半秒後更新，其餘的更新間隔逐次加倍 (最多 30 秒)
+    pos = max(0, vlc_player.get_time()) if vlc_player else 0
+    urgent = not remaining or any(subtitles[i]['end'] >= pos and subtitles[i]['start'] < pos + 30000 for i, _ in done)
+    if subtitle_refresh_job:
+        if not urgent: return
+        root.after_cancel(subtitle_refresh_job)
+    subtitle_refresh_job = root.after(500 if urgent else subtitle_refresh_delay, refresh_subtitle_track)
+
+def refresh_subtitle_track():
+    global subtitle_refresh_job, subtitle_refresh_delay
+    subtitle_refresh_job = None
+    if not vlc_player or not subtitles: return
+    vlc_manager.replace_subtitles(*subtitle_track(subtitles))
+    subtitle_refresh_delay = min(30000, subtitle_refresh_delay * 2)
+
+def open_search():
+    global transcript_index
+    if transcript_index is None: transcript_index = TranscriptIndex()
+    SearchDialog(root, transcript_index, library_dirs, open_from_library)
+
+def open_from_library(video, start_ms):
+    '''從字幕庫搜尋結果開啟影片並從該句開始播放；已在播放同一部影片時直接跳轉。'''
+    global subtitles, cue_index
+    log(f"字幕庫: 開啟 {video} @ {start_ms / 1000:.1f}s")
+    same = video_path and os.path.normpath(video_path) == os.path.normpath(video)
+    if same and vlc_player and vlc_player.get_state() not in (vlc.State.NothingSpecial, vlc.State.Stopped, vlc.State.Ended):
+        vlc_player.set_time(int(start_ms)); update_timeline(); return
+    # 處理佇列中已完成的工作含有翻譯，否則直接讀取影片旁的字幕 (不重新辨識)
+    done = [job for job in jobs.jobs.values() if job.kind == 'process' and job.state == 'done' and os.path.normpath(job.video_path) == os.path.normpath(video)]
+    if not same: open_video(video)
+    set_cue_loop(-1)
+    subtitles = done[-1].result if done else (find_existing_subtitles(video) or [])
+    cue_index = CueIndex.from_cues(subtitles)
+    setup_vlc_player(subtitles, start_ms=start_ms)
+    if not vlc_player: return
+    if done: start_translation(done[-1])
+    controls_frame.pack(pady=10)
+    vlc_player.play()
+    timeline_ui.render(playing=True)
+    update_timeline()
+
+def export_cards():
+    '''把目前影片的字幕匯出成學習卡 (每句的音訊片段、截圖與 manifest)，在處理佇列中執行。'''
+    if not video_path or not subtitles:
+        messagebox.showinfo("匯出學習卡", "請先處理或載入有字幕的影片。"); return
+    folder = filedialog.askdirectory(title="選擇學習卡的輸出資料夾")
+    if not folder: return
+    out_dir = os.path.join(folder, f"{os.path.splitext(os.path.basename(video_path))[0]}_cards")
+    cues = [dict(sub) for sub in subtitles]
+    job = jobs.submit(video_path, lambda job: export_cards_job(job, cues, out_dir), kind='export', output=out_dir)
+    job.name = f"[學習卡] {job.name}"
+    job_panel.update_job(job)
+
+def export_cards_job(job, cues, out_dir):
+    jobs.report(job, stage="匯出學習卡")
+    def progress(done, total):
+        if done * 100 // total != (done - 1) * 100 // total: jobs.report(job, progress=done * 100 // total)
+    manifest = export_deck(job.video_path, cues, out_dir, ffmpeg=config.get("ffmpeg_path", "ffmpeg"), workers=config.get("export_workers", 4),
+                           with_video=config.get("export_video_clips", False), run=lambda command: jobs.run_process(job, command),
+                           progress=progress, cancelled=job.cancel_event.is_set)
+    return {'manifest': manifest}
+
+def on_export_update(job):
+    if job.state == 'done': status_label.config(text=f"已匯出: {job.options['output']}")
+    elif job.state == 'failed': messagebox.showerror("匯出錯誤", f"匯出失敗: {job.error}")
+
+def start_processing():
+    if not video_path: return
+    enqueue(video_path)
 
+def probe_hw_decode(path):
+    '''背景執行緒：實測 (或由快取取得) 此影片編碼與解析度最快的 --avcodec-hw 模式。'''
+    global hw_mode, hw_media_key
+    try:
+        key = "vlc:" + media_key(path)
+        mode = pick_decoder(hw_cache, key, vlc_hw_candidates(), lambda m: bench_vlc(path, m, vlc_manager.base_args))
     except Exception as e:
-        messagebox.showerror("處理錯誤", f"發生錯誤: {e}")
-        status_label.config(text="處理失敗，請重試。")
-    finally:
-        if os.path.exists(audio_path):
-            try: os.remove(audio_path); log(f"已刪除暫存檔: {audio_path}")
-            except OSError as e: log(f"刪除暫存檔失敗: {e}")
-        btn_process.config(state=tk.NORMAL)
+        log(f"硬體解碼測試失敗，使用 VLC 預設: {e}")
+        return
+    if path == video_path: hw_mode, hw_media_key = mode, key
+
+def fallback_hw_decode(reason):
+    '''目前的硬體解碼模式出錯時換下一個候選模式，重建播放器並從原位置繼續播放。'''
+    global hw_mode, hw_media_key
+    current = "none" if hw_decode_disabled.get() else (hw_mode or "any")
+    if current == "none" or not vlc_player or not video_path: return
+    pos = max(0, vlc_player.get_time())
+    hw_media_key = hw_media_key or "vlc:" + media_key(video_path)
+    hw_mode = mark_failed(hw_cache, hw_media_key, current, vlc_hw_candidates())
+    log(f"偵測到解碼問題 ({reason})，改用 --avcodec-hw={hw_mode} 從 {pos} ms 繼續播放")
+    decode_watchdog.progress()
+    setup_vlc_player(subtitles, start_ms=pos)
+    if vlc_player and vlc_player.get_media():
+        vlc_player.play()
+        timeline_ui.render(playing=True)
+        update_timeline()
 
-def start_processing():
-    threading.Thread(target=process_video_thread, daemon=True).start()
+def check_decode_health():
+    # 每秒檢查一次：播放中卻超過 3 秒沒有任何時間更新，視為解碼停滯
+    if vlc_player and decode_watchdog.stalled(vlc_player.get_state() == vlc.State.Playing): fallback_hw_decode("畫面停滯")
+    root.after(1000, check_decode_health)
 
-def setup_vlc_player(subtitle_path=None):
-    global vlc_instance, vlc_player
+def ensure_vlc_player(show_errors=True):
+    '''取得共用的 VLC player；只有第一次或硬體解碼模式改變時才會重建 libVLC 實例。'''
+    global vlc_player
     vlc_install_path = entry_vlc_path.get()
     if not vlc_install_path or not os.path.isdir(vlc_install_path):
-        messagebox.showerror("VLC 錯誤", "請先在上方設定有效的 VLC 安裝資料夾！"); return
-    
-    if vlc_player: vlc_player.stop()
+        if show_errors: messagebox.showerror("VLC 錯誤", "請先在上方設定有效的 VLC 安裝資料夾！")
+        return None
     
     if sys.platform.startswith('win'):
         try: os.add_dll_directory(vlc_install_path)
         except (AttributeError, FileNotFoundError): os.environ['VLC_PLUGIN_PATH'] = vlc_install_path
     
-    vlc_instance_args = ["--no-sub-autodetect-file"]
-    if hw_decode_disabled.get():
-        vlc_instance_args.append("--avcodec-hw=none")
-        log("硬體解碼已停用。")
-
+    mode = "none" if hw_decode_disabled.get() else hw_mode  # 勾選框為手動覆寫
+    if vlc_manager.args != vlc_manager.instance_args(mode):
+        log(f"硬體解碼模式: {mode or 'VLC 預設'}")
     try:
-        vlc_instance = vlc.Instance(vlc_instance_args)
-        log(f"VLC 實例已建立，參數: {vlc_instance_args}")
+        vlc_player = vlc_manager.ensure(mode)
     except Exception as e:
-        messagebox.showerror("VLC 錯誤", f"無法初始化 VLC 實例。\n錯誤訊息: {e}"); return
+        if show_errors: messagebox.showerror("VLC 錯誤", f"無法初始化 VLC 實例。\n錯誤訊息: {e}")
+        else: log(f"無法初始化 VLC 實例: {e}")
+        return None
+    return vlc_player
+
+def subtitle_track(subs):
+    '''回傳 (字幕文字, 副檔名)：有逐字時間時為逐字高亮的 ASS 字幕，否則為 SRT。'''
+    return (format_ass(subs), ".ass") if any(sub.get('words') for sub in subs) else (format_srt(subs), ".srt")
+
+def setup_vlc_player(subs=None, start_ms=0):
+    if vlc_player: vlc_player.stop()
+    if not ensure_vlc_player(): return
     
-    vlc_player = vlc_instance.media_player_new()
-    media = vlc_instance.media_new(video_path)
-    vlc_player.set_media(media)
+    media = vlc_manager.open(video_path)
+    if start_ms: media.add_option(f"start-time={start_ms / 1000:.3f}")
+    timeline_ui.render(slider=0, playing=False)
     
-    if subtitle_path and os.path.exists(subtitle_path):
-        vlc_player.video_set_subtitle_file(subtitle_path)
-        log(f"已強制設定字幕檔: {subtitle_path}")
+    # 雙語字幕直接由記憶體掛到 Media 上，不再寫 _combined.srt 或更名原始字幕檔
+    # 有逐字時間時改掛 ASS 字幕，由 libass 逐字變色，播放迴圈不需額外工作
+    if subs: vlc_manager.attach_subtitles(media, *subtitle_track(subs))
     
     if sys.platform == "win32": vlc_player.set_hwnd(video_canvas.winfo_id())
     else: vlc_player.set_xwindow(video_canvas.winfo_id())
@@ -180,7 +454,8 @@ def play_pause():
     # 【修正】使用 set_pause() 來精確控制播放與暫停，避免卡頓
     if vlc_player.is_playing():
         vlc_player.set_pause(1)
-        btn_play_pause.config(text="▶")
+        timeline_ui.render(playing=False)
+        timeline_scheduler.stop()
         log("動作: 暫停")
     else:
         # 如果是停止或結束狀態，則從頭播放
@@ -188,7 +463,7 @@ def play_pause():
              vlc_player.play()
         else: # 如果是暫停狀態，則恢復播放
              vlc_player.set_pause(0)
-        btn_play_pause.config(text="❚❚")
+        timeline_ui.render(playing=True)
         update_timeline()
         log("動作: 播放 / 恢復")
 
@@ -197,7 +472,7 @@ def replay():
         log("動作: 重新播放")
         vlc_player.stop()
         vlc_player.play()
-        btn_play_pause.config(text="❚❚")
+        timeline_ui.render(playing=True)
         update_timeline()
 
 def seek(delta):
@@ -205,16 +480,103 @@ def seek(delta):
         new_time = vlc_player.get_time() + delta * 1000
         vlc_player.set_time(new_time)
         log(f"動作: 跳轉 {delta}s 至 {new_time}ms")
+        update_timeline()
+
+def set_cue_loop(cue_id):
+    global loop_cue
+    loop_cue = cue_id
+    btn_loop.config(text="循環中 ✓" if cue_id >= 0 else "單句循環")
+    if cue_id >= 0: log(f"動作: 單句循環 #{cue_id + 1} ({subtitles[cue_id]['start']}-{subtitles[cue_id]['end']} ms)")
+    if vlc_player: update_timeline()
+
+def toggle_cue_loop():
+    if not vlc_player or not len(cue_index): return
+    if loop_cue >= 0:
+        set_cue_loop(-1); log("動作: 取消單句循環"); return
+    now = vlc_player.get_time()
+    cue_id = cue_index.find(now)
+    if cue_id < 0: cue_id = cue_index.prev_cue(now)
+    if cue_id >= 0: set_cue_loop(cue_id)
+
+def jump_to_cue(direction):
+    '''上一句 / 下一句：精確跳到字幕開頭；循環中則改為循環新的一句。'''
+    if not vlc_player or not len(cue_index): return
+    now = vlc_player.get_time()
+    cue_id = cue_index.next_cue(now) if direction > 0 else cue_index.prev_cue(now)
+    if cue_id < 0: return
+    start_ms = subtitles[cue_id]['start']
+    vlc_player.set_time(start_ms)
+    log(f"動作: {'下一句' if direction > 0 else '上一句'} #{cue_id + 1} ({start_ms/1000.0:.2f}s)")
+    if loop_cue >= 0: set_cue_loop(cue_id)
+    else: update_timeline()
 
 def set_position(value):
+    # ttk.Scale 在程式呼叫 set() 時也會觸發 command，這裡只處理使用者拖曳
+    if timeline_rendering: return
     if vlc_player and vlc_player.get_media():
         vlc_player.set_position(float(value) / 100)
         log(f"動作: 拖曳進度條至 {float(value):.1f}%")
 
+def render_timeline(step):
+    global timeline_rendering
+    timeline_rendering = True
+    try: timeline_scale.set(step * 100 / timeline_steps)
+    finally: timeline_rendering = False
+
+def arm_timeline(delay_ms):
+    global timeline_job
+    timeline_job = root.after(delay_ms, update_timeline)
+
+def cancel_timeline():
+    global timeline_job
+    if timeline_job: root.after_cancel(timeline_job); timeline_job = None
+
 def update_timeline():
-    if vlc_player and vlc_player.is_playing():
-        timeline_scale.set(vlc_player.get_position() * 100)
-        root.after(500, update_timeline)
+    # 只為下一格進度條排一次計時器；跳轉、暫停等狀態改變由 VLC 事件觸發重新同步
+    global timeline_steps
+    if not vlc_player: return
+    state = vlc_player.get_state()
+    playing = state in (vlc.State.Opening, vlc.State.Buffering, vlc.State.Playing)
+    pos, length = max(0, vlc_player.get_time()), vlc_player.get_length()
+    if lazy_translation: lazy_translation.set_position(pos)
+    if loop_cue >= 0 and pos > subtitles[loop_cue]['end']:
+        # 單句循環：超過本句結尾就跳回開頭 (VLC 自行管理解碼，無法預先快取影格)
+        pos = subtitles[loop_cue]['start']
+        vlc_player.set_time(pos)
+    if state not in (vlc.State.NothingSpecial, vlc.State.Stopped): # play() 為非同步，過渡狀態交給之後的 VLC 事件
+        timeline_ui.render(playing=playing)
+    # 一格一像素：進度條上看不出來的位置變化不排計時器
+    timeline_steps = max(1, timeline_scale.winfo_width())
+    timeline_ui.render(slider=slider_step(pos, length, timeline_steps))
+    # 循環中把字幕索引交給排程器，計時器會剛好在本句結尾觸發
+    timeline_scheduler.set_track(cue_index if loop_cue >= 0 else None, length, timeline_steps)
+    timeline_scheduler.sync(pos, playing, vlc_player.get_rate() or 1.0)
+
+def on_vlc_time_changed(event):
+    # VLC 執行緒：只有與推算位置偏差過大時才通知 Tk 主執行緒
+    decode_watchdog.progress()
+    if timeline_scheduler.drifted(event.u.new_time): root.event_generate("<<VlcResync>>", when="tail")
+
+def on_vlc_state_changed(event):
+    decode_watchdog.progress()
+    root.event_generate("<<VlcResync>>", when="tail")
+
+def on_vlc_error(event):
+    root.event_generate("<<VlcDecodeError>>", when="tail")
+
+def attach_vlc_events(player):
+    events = player.event_manager()
+    events.event_attach(vlc.EventType.MediaPlayerTimeChanged, on_vlc_time_changed)
+    for event_type in (vlc.EventType.MediaPlayerPlaying, vlc.EventType.MediaPlayerPaused, vlc.EventType.MediaPlayerStopped,
+                       vlc.EventType.MediaPlayerEndReached, vlc.EventType.MediaPlayerSeekableChanged, vlc.EventType.MediaPlayerLengthChanged):
+        events.event_attach(event_type, on_vlc_state_changed)
+    events.event_attach(vlc.EventType.MediaPlayerEncounteredError, on_vlc_error)
+
+def set_playback_rate(rate):
+    if not vlc_player: return
+    vlc_player.set_rate(rate)  # VLC 預設的 scaletempo 濾鏡會保持音高
+    log(f"動作: 播放速度 {rate}x")
+    update_timeline()
 
 def browse_directory(entry_widget):
     path = filedialog.askdirectory()
@@ -228,6 +590,13 @@ def browse_file(entry_widget):
 root = tk.Tk()
 root.title("字幕學習播放器 (VLC 穩定版 - v8.Final)")
 root.geometry("950x900")
+# 選擇影片時的背景工作完成後，由 Tk 主執行緒套用結果
+selector = AsyncSelector(lambda: root.event_generate("<<SelectReady>>", when="tail"))
+root.bind("<<SelectReady>>", lambda event: selector.drain())
+# 處理佇列的工作執行緒只把進度放進佇列，由 Tk 主執行緒套用到佇列面板與狀態列
+jobs = JobQueue(lambda: root.event_generate("<<JobUpdate>>", when="tail"))
+root.bind("<<JobUpdate>>", lambda event: jobs.drain(on_job_update))
+root.bind("<<TranslationReady>>", lambda event: on_translation_ready())
 
 settings_frame = ttk.LabelFrame(root, text="路徑設定", padding=(10, 5))
 settings_frame.pack(padx=10, pady=10, fill="x")
@@ -256,6 +625,9 @@ Label(lang_options_frame, text="翻譯成:").pack(side="left", padx=(10, 5))
 target_lang_combobox = ttk.Combobox(lang_options_frame, values=['zh-TW', 'en', 'ja', 'ko', 'none'], width=10, state="readonly"); target_lang_combobox.set('zh-TW')
 target_lang_combobox.pack(side="left", padx=5)
 
+job_panel = JobPanel(root, on_add=add_videos, on_load=load_job, on_remove=remove_job)
+job_panel.pack(padx=10, pady=5, fill="x")
+
 main_frame = Frame(root)
 main_frame.pack(pady=10, padx=10, fill="both", expand=True)
 video_canvas = tk.Canvas(main_frame, bg="black"); video_canvas.pack(fill="both", expand=True)
@@ -271,19 +643,40 @@ btn_replay = ttk.Button(buttons_frame, text="|◀", command=replay, width=5); bt
 btn_rewind = ttk.Button(buttons_frame, text="◀◀ 5s", command=lambda: seek(-5), width=8); btn_rewind.pack(side="left", padx=5)
 btn_play_pause = ttk.Button(buttons_frame, text="▶", command=play_pause, width=5); btn_play_pause.pack(side="left", padx=5)
 btn_forward = ttk.Button(buttons_frame, text="5s ▶▶", command=lambda: seek(5), width=8); btn_forward.pack(side="left", padx=5)
+btn_prev_cue = ttk.Button(buttons_frame, text="⏮ 上一句", command=lambda: jump_to_cue(-1), width=8); btn_prev_cue.pack(side="left", padx=5)
+btn_loop = ttk.Button(buttons_frame, text="單句循環", command=toggle_cue_loop, width=9); btn_loop.pack(side="left", padx=5)
+btn_next_cue = ttk.Button(buttons_frame, text="下一句 ⏭", command=lambda: jump_to_cue(1), width=8); btn_next_cue.pack(side="left", padx=5)
+Label(buttons_frame, text="速度:").pack(side="left", padx=(15, 2))
+rate_combobox = ttk.Combobox(buttons_frame, values=['0.5', '0.75', '1.0', '1.25', '1.5'], width=5, state="readonly"); rate_combobox.set('1.0')
+rate_combobox.bind("<<ComboboxSelected>>", lambda event: set_playback_rate(float(rate_combobox.get())))
+rate_combobox.pack(side="left", padx=5)
+timeline_ui = UiUpdater(slider=render_timeline, playing=lambda playing: btn_play_pause.config(text="❚❚" if playing else "▶"))
+timeline_scheduler = CueScheduler(arm=arm_timeline, cancel=cancel_timeline, steps=timeline_steps)
+root.bind("<<VlcResync>>", lambda event: update_timeline())
+root.bind("<<VlcDecodeError>>", lambda event: fallback_hw_decode("VLC 播放錯誤"))
+vlc_manager = VlcPlayerManager(on_player_created=attach_vlc_events)
 
 top_buttons_frame = tk.Frame(root)
 top_buttons_frame.pack(pady=(5,10))
 btn_select = ttk.Button(top_buttons_frame, text="選擇影片", command=select_video); btn_select.pack(side="left", padx=5)
+btn_search = ttk.Button(top_buttons_frame, text="搜尋字幕庫", command=open_search); btn_search.pack(side="left", padx=5)
+btn_calibrate = ttk.Button(top_buttons_frame, text="校準模型", command=calibrate_models); btn_calibrate.pack(side="left", padx=5)
+btn_export = ttk.Button(top_buttons_frame, text="匯出學習卡...", command=export_cards); btn_export.pack(side="left", padx=5)
 btn_process = ttk.Button(top_buttons_frame, text="處理影片", command=start_processing, state=tk.DISABLED); btn_process.pack(side="left", padx=5)
 
 if __name__ == "__main__":
+    sweep_stale()  # 清除上次異常結束留下的工作資料夾
     config = load_config()
+    # 同時處理的影片數與各階段上限，例如 {"max_jobs": 3, "whisper": 1, "translate": 2}
+    jobs.set_limits(**config.get("job_limits", {}))
+    library_dirs.extend(config.get("library_dirs", []))  # 字幕庫搜尋的資料夾 (開啟過的影片所在資料夾會自動加入)
+    language_cache.update(config.get("language_cache", {}))
     if config:
         entry_vlc_path.insert(0, config.get("vlc_path", ""))
         entry_whisper_path.insert(0, config.get("whisper_path", ""))
         entry_model_path.insert(0, config.get("model_path", ""))
         hw_decode_disabled.set(config.get("hw_decode_disabled", False))
+        hw_cache.update(config.get("hw_decode_cache", {}))
         if not config.get("vlc_path") or not os.path.isdir(config.get("vlc_path")):
             detected_vlc_path = auto_detect_vlc_path()
             if detected_vlc_path: entry_vlc_path.delete(0, tk.END); entry_vlc_path.insert(0, detected_vlc_path)
@@ -293,19 +686,25 @@ if __name__ == "__main__":
 
     def on_closing():
         log("正在關閉程式...")
+        selector.shutdown()
+        stop_translation()
+        jobs.shutdown()
+        translators.shutdown()
         config_to_save = {
+            **config,  # 保留 job_limits 等只在設定檔中調整的項目
             "vlc_path": entry_vlc_path.get(), 
             "whisper_path": entry_whisper_path.get(), 
             "model_path": entry_model_path.get(),
-            "hw_decode_disabled": hw_decode_disabled.get()
+            "hw_decode_disabled": hw_decode_disabled.get(),
+            "hw_decode_cache": hw_cache,
+            "library_dirs": library_dirs,
+            "language_cache": language_cache
         }
         save_config(config_to_save)
-        if vlc_player: vlc_player.stop()
-        if srt_backup_path_global and os.path.exists(srt_backup_path_global):
-            if os.path.exists(srt_original_path_global): os.remove(srt_original_path_global)
-            os.rename(srt_backup_path_global, srt_original_path_global)
-            log(f"已將字幕檔還原為: {os.path.basename(srt_original_path_global)}")
+        vlc_manager.release()
+        if transcript_index: transcript_index.close()
         root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_closing)
+    check_decode_health()
     root.mainloop()
@@ -1,18 +1,35 @@
-import sys, os, time
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QSlider, QComboBox, QMessageBox, QInputDialog)
-from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
+import sys, os, time, threading, html
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QSlider, QComboBox, QMessageBox, QInputDialog,
+                             QGroupBox, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QDialog, QLineEdit)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont
-import pysrt
-from deep_translator import GoogleTranslator
 from moviepy.editor import VideoFileClip
 import vlc
 import subprocess
 import shlex
 import traceback
+from subtitle_codec import load_srt, save_srt
+from cue_index import CueIndex
+from ui_update import UiUpdater, slider_step
+from cue_scheduler import CueScheduler
+from vlc_manager import VlcPlayerManager
+from async_select import AsyncSelector
+from workspace import JobWorkspace, sweep_stale
+from job_queue import JobQueue
+from transcript_index import TranscriptIndex, find_subtitle
+from whisper_json import load_transcript
+from word_timing import word_at
+from clip_export import export_deck
+import translators
+from lazy_translate import LazyTranslation
+from language_probe import probe_language
+from model_calibration import whisper_command, find_models, reference_clip, calibrate, pick_model, summary
 
 # 使用腳本所在目錄作為基準目錄
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
+language_cache = {}  # 影片 -> 探測到的語言 (存在 config.json)
+WHISPER_DECODE_ARGS = ()  # whisper.cpp 的解碼參數 (辨識與模型校準共用)
 
 class SubtitleWidget(QLabel):
     def __init__(self, parent=None):
@@ -20,98 +37,194 @@ class SubtitleWidget(QLabel):
         self.setStyleSheet("background: rgba(0,0,0,0);")
         self.setAlignment(Qt.AlignBottom | Qt.AlignLeft)
         self.setFont(QFont("Arial", 24))
+        self.setTextFormat(Qt.RichText)
         self.subs = []
+        self.cue_index = CueIndex([])
+        self.tick_index = self.cue_index
+        self.plain_text = ''
+        self.word_html = {}
     def set_subtitles(self, subs, _):
         self.subs = subs
+        self.cue_index = CueIndex([(sub[3], sub[4]) for sub in subs])
+        # 排程器除了字幕切換點，也要在每個詞的開始/結束時更新高亮 (只用到 next_boundary)
+        words = [(w[0], w[1]) for sub in subs for w in sub[2] or ()]
+        self.tick_index = CueIndex([(sub[3], sub[4]) for sub in subs] + words) if words else self.cue_index
+        self.word_html = {}
     def update_subtitle(self, ms):
+        self.show_cue(self.cue_index.find(ms))
+    def word_at(self, cue_id, ms):
+        return word_at(self.subs[cue_id][2], ms) if cue_id >= 0 else -1
+    def show_cue(self, cue_id):
         # 只顯示一行字幕，且不重複呼叫 setText
-        text = ""
-        for sub in self.subs:
-            start = sub[3] if len(sub) > 3 else 0
-            end = sub[4] if len(sub) > 4 else 0
-            if start <= ms <= end:
-                text = sub[0] if len(sub) > 0 else ''
-                break
-        # 僅當內容不同時才 setText，避免重複渲染
-        if self.text() != text:
-            self.setText(text)
+        text = self.subs[cue_id][0] if cue_id >= 0 else ''
+        if self.plain_text != text:
+            self.plain_text = text
+            self.setText(html.escape(text))
+    def show_word(self, state):
+        # 逐字高亮：每句的各個高亮版本只產生一次，之後只在詞改變時 setText
+        cue_id, word = state
+        if cue_id < 0 or not self.subs[cue_id][2]: return
+        if cue_id not in self.word_html:
+            text = self.subs[cue_id][0]
+            self.word_html = {cue_id: [html.escape(text[:s]) + '<span style="color:#ffc828">' + html.escape(text[s:e]) + '</span>' + html.escape(text[e:])
+                                       for _, _, s, e in self.subs[cue_id][2]]}
+        self.setText(self.word_html[cue_id][word] if word >= 0 else html.escape(self.subs[cue_id][0]))
 
-class VideoProcessThread(QThread):
-    finished = pyqtSignal(list, list, str)
-    error = pyqtSignal(str)
-    def __init__(self, video_path, lang, target_lang, whisper_path, model_path):
-        super().__init__()
-        self.video_path = video_path
-        self.lang = lang
-        self.target_lang = target_lang
-        self.whisper_path = whisper_path
-        self.model_path = model_path
-    def run(self):
-        import pysrt
-        from deep_translator import GoogleTranslator
-        from moviepy.editor import VideoFileClip
-        import subprocess, os, traceback
-        try:
-            audio_path = os.path.abspath("temp_audio.wav")
-            if os.path.exists(audio_path):
-                try: os.remove(audio_path)
-                except Exception: pass
-            with VideoFileClip(self.video_path) as video_clip:
-                video_clip.audio.write_audiofile(audio_path, logger=None)
-            srt_base = os.path.splitext(self.video_path)[0]
-            srt_path_orig = srt_base + "_orig.srt"
-            # 只產生原文字幕
-            command_transcribe = [
-                os.path.abspath(self.whisper_path),
-                "-m", os.path.abspath(self.model_path),
-                "-f", audio_path,
-                "-osrt",
-                "-of", srt_base + "_orig",
-                "-l", self.lang,
-                "-t", "8"
-            ]
-            result1 = subprocess.run(command_transcribe, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            if result1.returncode != 0:
-                raise RuntimeError(f"whisper-cli transcribe 失敗\n命令: {command_transcribe}\nstdout: {result1.stdout}\nstderr: {result1.stderr}")
-            subs_raw = []
-            if os.path.exists(srt_path_orig):
-                with open(srt_path_orig, 'r', encoding='utf-8') as f:
-                    subs_raw = list(pysrt.from_string(f.read()))
-            else:
-                raise RuntimeError(f"找不到原文字幕檔案: {srt_path_orig}")
-            # Google 翻譯原文
-            translated = []
-            if subs_raw and self.lang != self.target_lang and self.target_lang != 'none':
-                for sub in subs_raw:
-                    try:
-                        translated.append(GoogleTranslator(source=self.lang, target=self.target_lang).translate(sub.text))
-                    except Exception as e:
-                        translated.append("")
-            # 對齊原文與翻譯
-            max_len = max(len(subs_raw), len(translated))
-            combined = []
-            for i in range(max_len):
-                orig = subs_raw[i].text if i < len(subs_raw) else ''
-                trans = translated[i] if i < len(translated) else ''
-                if i < len(subs_raw):
-                    start = subs_raw[i].start.ordinal
-                    end = subs_raw[i].end.ordinal
-                else:
-                    start = 0
-                    end = 0
-                combined.append((orig, trans, '', start, end))
-            self.finished.emit(combined, [], "處理完成！可以播放影片。")
-        except Exception as e:
-            tb = traceback.format_exc()
-            self.error.emit(f"{str(e)}\n{tb}")
+def export_cards_job(jobs, job, cues, out_dir, config):
+    '''在處理佇列的工作執行緒把字幕匯出成學習卡 (音訊片段、截圖與 manifest)。'''
+    jobs.report(job, stage="匯出學習卡")
+    def progress(done, total):
+        if done * 100 // total != (done - 1) * 100 // total: jobs.report(job, progress=done * 100 // total)
+    manifest = export_deck(job.video_path, cues, out_dir, ffmpeg=config.get("ffmpeg_path", "ffmpeg"), workers=config.get("export_workers", 4),
+                           with_video=config.get("export_video_clips", False), run=lambda command: jobs.run_process(job, command),
+                           progress=progress, cancelled=job.cancel_event.is_set)
+    return {'manifest': manifest}
+
+def calibrate_job(jobs, job, whisper, model, lang):
+    '''在處理佇列的工作執行緒實測各模型的即時倍率，回傳 {模型路徑: {執行緒數: 結果}}。'''
+    with JobWorkspace(job.video_path) as ws:
+        jobs.report(job, stage="準備參考音訊")
+        clip = ws.path('audio', 'reference.wav')
+        duration = reference_clip(job.video_path, clip)
+        with jobs.slot(job, 'whisper', "校準模型"):
+            return calibrate(whisper, model, clip, duration, lambda command: jobs.run_process(job, command), lang=lang,
+                             progress=lambda done, total: jobs.report(job, progress=done * 100 / total), decode_args=WHISPER_DECODE_ARGS)
+
+def process_video_job(jobs, job):
+    '''在處理佇列的工作執行緒執行，回傳 (原文, 翻譯, 逐字時間, 開始, 結束) 列表；進度只透過 jobs.report() 回報。'''
+    from moviepy.editor import VideoFileClip
+    video_path, options = job.video_path, job.options
+    lang, target_lang = options['lang'], options['target']
+    # 每個工作使用自己的暫存資料夾，多部影片同時處理時不會互相覆蓋音訊檔
+    with JobWorkspace(video_path) as ws:
+        jobs.report(job, stage="提取音訊", progress=10)
+        audio_path = ws.path('audio', 'audio.wav')
+        with VideoFileClip(video_path) as video_clip:
+            video_clip.audio.write_audiofile(audio_path, logger=None)
+        transcript = ws.path('transcript', 'transcript.json')
+        if lang == 'auto':
+            # 只對幾個短片段偵測一次語言 (依影片快取)，整部辨識與翻譯都使用這個結果
+            with jobs.slot(job, 'whisper', "偵測語言"):
+                lang = probe_language(language_cache, video_path, os.path.abspath(options['whisper']), os.path.abspath(options['model']), audio_path,
+                                      ws.path('probe', 'probe.wav'), lambda command: jobs.run_process(job, command))
+        # 只產生原文字幕；-ojf 的 JSON 含逐字時間、token 機率與辨識出的語言
+        command_transcribe = whisper_command(os.path.abspath(options['whisper']), os.path.abspath(options['model']), audio_path, lang,
+                                             options.get('threads', 8), WHISPER_DECODE_ARGS) + ["-ojf", "-of", os.path.splitext(transcript)[0]]
+        with jobs.slot(job, 'whisper', "語音辨識"):
+            try:
+                jobs.run_process(job, command_transcribe)
+            except subprocess.CalledProcessError as e:
+                raise RuntimeError(f"whisper-cli transcribe 失敗\n命令: {command_transcribe}\nstdout: {e.stdout}\nstderr: {e.stderr}")
+        if not os.path.exists(transcript):
+            raise RuntimeError(f"找不到 whisper.cpp 輸出檔案: {transcript}")
+        subs_raw, detected = load_transcript(transcript)
+        if lang == 'auto' and detected: lang = detected
+    options['source'] = lang  # 實際辨識出的語言，背景翻譯時作為來源語言
+    save_srt(os.path.splitext(video_path)[0] + "_orig.srt", subs_raw)  # SRT 只作為最後輸出
+    jobs.report(job, progress=60)
+    # 翻譯原文
+    translated = []
+    if subs_raw and lang != target_lang and target_lang != 'none' and not options.get('lazy'):
+        with jobs.slot(job, 'translate', "翻譯"):
+            # 依語言對使用 config.json 設定的翻譯後端 (Google 或離線模型)，整批送出；失敗的句子為空字串
+            translator = translators.get_translator(load_config(), lang, target_lang)
+            translated = translator.translate_batch([sub['original'] for sub in subs_raw], progress=lambda done, total: jobs.report(job, progress=60 + done / total * 35))
+    # 對齊原文與翻譯
+    max_len = max(len(subs_raw), len(translated))
+    combined = []
+    for i in range(max_len):
+        orig = subs_raw[i]['original'] if i < len(subs_raw) else ''
+        words = subs_raw[i].get('words', ()) if i < len(subs_raw) else ()
+        trans = translated[i] if i < len(translated) else ''
+        if i < len(subs_raw):
+            start = subs_raw[i]['start']
+            end = subs_raw[i]['end']
+        else:
+            start = 0
+            end = 0
+        combined.append((orig, trans, words, start, end))
+    return combined
+
+class LibrarySearchDialog(QDialog):
+    # 背景更新索引完成後，透過 signal 回到 Qt 主執行緒重新查詢
+    index_updated = pyqtSignal()
+    def __init__(self, parent, index, library_dirs, on_open):
+        super().__init__(parent)
+        self.setWindowTitle("搜尋字幕庫")
+        self.resize(820, 460)
+        self.index, self.library_dirs, self.on_open = index, library_dirs, on_open
+        self.hits = []
+        self.queryEdit = QLineEdit()
+        self.addDirButton = QPushButton("加入資料夾...")
+        self.resultTable = QTableWidget(0, 3)
+        self.resultTable.setHorizontalHeaderLabels(["影片", "時間", "字幕"])
+        self.resultTable.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.resultTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.resultTable.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.statusLabel = QLabel()
+        top = QHBoxLayout()
+        top.addWidget(self.queryEdit)
+        top.addWidget(self.addDirButton)
+        vbox = QVBoxLayout(self)
+        vbox.addLayout(top)
+        vbox.addWidget(self.resultTable)
+        vbox.addWidget(self.statusLabel)
+        # 輸入時延遲 250 ms 再查詢，避免每個按鍵都查一次
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.timeout.connect(self.search)
+        self.queryEdit.textChanged.connect(lambda: self.searchTimer.start(250))
+        self.queryEdit.returnPressed.connect(self.search)
+        self.addDirButton.clicked.connect(self.add_directory)
+        self.resultTable.cellDoubleClicked.connect(lambda row, col: self.open_hit(row))
+        self.index_updated.connect(self.on_index_updated)
+        self.refresh()
+    def refresh(self):
+        # 在背景執行緒增量更新索引，更新期間仍可用既有的索引查詢
+        self.statusLabel.setText("正在更新字幕索引...")
+        dirs = list(self.library_dirs)
+        def work():
+            try: self.index.update(dirs)
+            finally: self.index_updated.emit()
+        threading.Thread(target=work, daemon=True).start()
+    def on_index_updated(self):
+        videos, cues = self.index.stats()
+        self.statusLabel.setText(f"已索引 {videos} 部影片、{cues} 句字幕")
+        if self.queryEdit.text().strip(): self.search()
+    def add_directory(self):
+        path = QFileDialog.getExistingDirectory(self, "加入資料夾")
+        if path and path not in self.library_dirs:
+            self.library_dirs.append(path)
+            self.refresh()
+    def search(self):
+        self.searchTimer.stop()
+        self.hits = self.index.search(self.queryEdit.text(), limit=200)
+        self.resultTable.setRowCount(len(self.hits))
+        for row, hit in enumerate(self.hits):
+            s = hit['start'] // 1000
+            for col, text in enumerate((os.path.basename(hit['video']), f"{s // 3600:d}:{s // 60 % 60:02d}:{s % 60:02d}", hit['text'].replace("\n", " / "))):
+                self.resultTable.setItem(row, col, QTableWidgetItem(text))
+        self.statusLabel.setText(f"找到 {len(self.hits)} 句")
+    def open_hit(self, row):
+        if 0 <= row < len(self.hits):
+            self.on_open(self.hits[row]['video'], self.hits[row]['start'])
 
 class VideoPlayer(QWidget):
+    # VLC 事件在 VLC 執行緒觸發，透過 signal 轉回 Qt 主執行緒
+    vlc_resync = pyqtSignal()
+    # 選擇影片的背景工作完成後，透過 signal 回到 Qt 主執行緒套用結果
+    select_ready = pyqtSignal()
+    # 處理佇列的工作執行緒只把進度放進佇列，透過 signal 回到 Qt 主執行緒更新列表
+    job_ready = pyqtSignal()
+    # 背景翻譯有新的譯文時，透過 signal 回到 Qt 主執行緒套用
+    translation_ready = pyqtSignal()
     def __init__(self):
         super().__init__()
         self.setWindowTitle("字幕學習播放器 (VLC+PyQt5)")
         self.resize(1200, 900)
-        self.vlc_instance = vlc.Instance()
-        self.media_player = self.vlc_instance.media_player_new()
+        # 整個視窗共用一個 libVLC 實例與 player，換影片時只更換 Media
+        self.vlc_manager = VlcPlayerManager(base_args=[])
+        self.media_player = self.vlc_manager.ensure()
         self.videoWidget = QLabel()
         self.videoWidget.setStyleSheet("background: black;")
         self.videoWidget.setMinimumHeight(600)
@@ -124,26 +237,63 @@ class VideoPlayer(QWidget):
         self.replayButton = QPushButton("|◀")
         self.rewindButton = QPushButton("◀◀ 5s")
         self.forwardButton = QPushButton("5s ▶▶")
+        self.prevCueButton = QPushButton("⏮ 上一句")
+        self.loopButton = QPushButton("單句循環"); self.loopButton.setCheckable(True)
+        self.nextCueButton = QPushButton("下一句 ⏭")
+        self.loop_cue = -1
+        self.rateCombo = QComboBox(); self.rateCombo.addItems(['0.5x', '0.75x', '1.0x', '1.25x', '1.5x'])
+        self.rateCombo.setCurrentText('1.0x')
         self.selectButton = QPushButton("選擇影片")
+        self.searchButton = QPushButton("搜尋字幕庫")
         self.processButton = QPushButton("處理影片")
+        self.exportButton = QPushButton("匯出學習卡")
+        self.calibrateButton = QPushButton("校準模型")
         self.processButton.setEnabled(False)
         self.langCombo = QComboBox(); self.langCombo.addItems(['auto', 'ja', 'en', 'zh'])
         self.targetLangCombo = QComboBox(); self.targetLangCombo.addItems(['zh-TW', 'en', 'ja', 'ko', 'none'])
         self.targetLangCombo.setCurrentText('zh-TW')
         self.timer = QTimer(self)
-        self.timer.setInterval(30)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.update_ui)
+        self.ui = UiUpdater(cue=self.render_cue, word=self.subtitleWidget.show_word, slider=self.progressSlider.setValue,
+                            playing=lambda playing: self.playButton.setText("❚❚" if playing else "▶"))
+        self.scheduler = CueScheduler(arm=self.timer.start, cancel=self.timer.stop)
+        self.vlc_resync.connect(self.update_ui)
+        self.selector = AsyncSelector(self.select_ready.emit)
+        self.select_ready.connect(self.selector.drain)
+        self.jobs = JobQueue(self.job_ready.emit)
+        self.job_ready.connect(lambda: self.jobs.drain(self.on_job_update))
+        self.translation_ready.connect(self.on_translation_ready)
+        self.lazy_translation = None
         self.vlc_events = self.media_player.event_manager()
-        self.vlc_events.event_attach(vlc.EventType.MediaPlayerPlaying, self.on_vlc_playing)
+        self.vlc_events.event_attach(vlc.EventType.MediaPlayerTimeChanged, self.on_vlc_time_changed)
+        for event_type in (vlc.EventType.MediaPlayerPlaying, vlc.EventType.MediaPlayerPaused, vlc.EventType.MediaPlayerStopped,
+                           vlc.EventType.MediaPlayerEndReached, vlc.EventType.MediaPlayerSeekableChanged, vlc.EventType.MediaPlayerLengthChanged):
+            self.vlc_events.event_attach(event_type, self.on_vlc_state_changed)
         self.subs = []
         self.translated = []
         self.srt_path = None
         self.video_path = None
         self.duration = 0
         config = load_config()
-        # 預設直接使用 v3 版本模型
+        # 預設使用 v3 版本模型；設定 "whisper_rtf_target" 後依校準結果自動選擇 (見 model_calibration.py)
         self.whisper_path = config.get("whisper_path", "C:/Users/H/Desktop/whisper.cpp_v1/whisper.cpp/whisper-cli.exe")
-        self.model_path = "C:/Users/H/Desktop/whisper.cpp_v1/whisper.cpp/models/ggml-large-v3.bin"
+        self.model_path = config.get("model_path", "C:/Users/H/Desktop/whisper.cpp_v1/whisper.cpp/models/ggml-large-v3.bin")
+        # 同時處理的影片數與各階段上限，例如 {"max_jobs": 3, "whisper": 1, "translate": 2}
+        self.jobs.set_limits(**config.get("job_limits", {}))
+        # 字幕庫搜尋的資料夾 (開啟過的影片所在資料夾會自動加入)，索引在第一次搜尋時才開啟
+        self.library_dirs = config.get("library_dirs", [])
+        language_cache.update(config.get("language_cache", {}))
+        self.transcript_index = None
+        self.jobTable = QTableWidget(0, 4)
+        self.jobTable.setHorizontalHeaderLabels(["影片", "階段", "進度", "狀態"])
+        self.jobTable.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.jobTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.jobTable.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.jobTable.setMaximumHeight(130)
+        self.addJobButton = QPushButton("加入影片...")
+        self.loadJobButton = QPushButton("載入播放")
+        self.removeJobButton = QPushButton("取消 / 移除")
         self.volumeSlider = QSlider(Qt.Horizontal)
         self.volumeSlider.setRange(0, 100)
         self.volumeSlider.setValue(70)
@@ -173,6 +323,12 @@ class VideoPlayer(QWidget):
         btn_group.addWidget(QLabel("播放/暫停"))
         btn_group.addWidget(self.forwardButton)
         btn_group.addWidget(QLabel("快轉"))
+        self.loopButton.setToolTip("重複播放目前這一句")
+        btn_group.addWidget(self.prevCueButton)
+        btn_group.addWidget(self.loopButton)
+        btn_group.addWidget(self.nextCueButton)
+        btn_group.addWidget(self.rateCombo)
+        btn_group.addWidget(QLabel("速度"))
         hbox.addLayout(btn_group)
         # 音量文字移到音量條右側
         volume_layout = QHBoxLayout()
@@ -189,7 +345,13 @@ class VideoPlayer(QWidget):
         self.selectButton.setToolTip("選擇要播放的影片檔案")
         self.processButton.setToolTip("進行語音辨識與字幕生成")
         hbox2.addWidget(self.selectButton)
+        self.searchButton.setToolTip("在所有處理過的影片字幕中搜尋，並跳到該句播放")
+        hbox2.addWidget(self.searchButton)
         hbox2.addWidget(self.processButton)
+        self.exportButton.setToolTip("把每句字幕的音訊片段與截圖匯出成學習卡 (manifest.json 與 Anki 用的 cards.tsv)")
+        hbox2.addWidget(self.exportButton)
+        self.calibrateButton.setToolTip("實測模型資料夾中各 whisper.cpp 模型在這台電腦的即時倍率 (RTF)")
+        hbox2.addWidget(self.calibrateButton)
         # 新增複製字幕按鈕
         self.copyButton = QPushButton("複製字幕")
         self.copyButton.setToolTip("複製當前字幕和翻譯文字到剪貼板")
@@ -204,60 +366,106 @@ class VideoPlayer(QWidget):
         lang_layout.addWidget(self.targetLangCombo)
         hbox2.addLayout(lang_layout)
         vbox.addLayout(hbox2)
+        # 處理佇列
+        queue_box = QGroupBox("處理佇列")
+        queue_layout = QHBoxLayout(queue_box)
+        queue_layout.addWidget(self.jobTable)
+        queue_buttons = QVBoxLayout()
+        queue_buttons.addWidget(self.addJobButton)
+        queue_buttons.addWidget(self.loadJobButton)
+        queue_buttons.addWidget(self.removeJobButton)
+        queue_layout.addLayout(queue_buttons)
+        vbox.addWidget(queue_box)
         self.setLayout(vbox)
     def connect_signals(self):
         self.selectButton.clicked.connect(self.select_video)
+        self.searchButton.clicked.connect(self.open_search)
         self.processButton.clicked.connect(self.process_video)
+        self.exportButton.clicked.connect(self.export_cards)
+        self.calibrateButton.clicked.connect(self.calibrate_models)
         self.playButton.clicked.connect(self.play_pause)
         self.replayButton.clicked.connect(self.replay)
         self.rewindButton.clicked.connect(lambda: self.seek(-5000))
         self.forwardButton.clicked.connect(lambda: self.seek(5000))
+        self.rateCombo.currentTextChanged.connect(self.set_playback_rate)
+        self.prevCueButton.clicked.connect(lambda: self.jump_to_cue(-1))
+        self.nextCueButton.clicked.connect(lambda: self.jump_to_cue(1))
+        self.loopButton.toggled.connect(self.toggle_cue_loop)
         self.progressSlider.sliderReleased.connect(self.on_seek_slider_released)
         self.progressSlider.sliderPressed.connect(self.on_seek_slider_pressed)
-        self.timer.timeout.connect(self.update_ui)
         self.volumeSlider.valueChanged.connect(self.on_volume_changed)
         # 連接複製字幕按鈕
         self.copyButton.clicked.connect(self.copy_subtitles)
+        self.addJobButton.clicked.connect(self.add_videos)
+        self.loadJobButton.clicked.connect(lambda: self.load_job(self.selected_job()))
+        self.removeJobButton.clicked.connect(lambda: self.remove_job(self.selected_job()))
+        self.jobTable.cellDoubleClicked.connect(lambda row, col: self.load_job(self.selected_job()))
     def select_video(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "選擇影片", "", "MP4 files (*.mp4)")
         if file_path:
-            abs_path = os.path.abspath(file_path)
-            print(f"[LOG] 正在播放: {os.path.basename(abs_path)}")
-            self.statusLabel.setText(f"已選擇: {os.path.basename(abs_path)}")
-            self.video_path = abs_path
-            self.media_player.stop()
-            self.set_vlc_video_output()
-            self.processButton.setEnabled(True)
-            self.srt_path = os.path.splitext(abs_path)[0] + "_orig.srt"
-            self.progressSlider.setValue(0)
-            self.subtitleWidget.setText("")
-            self.subs = []
-            self.translated = []
-            self.playButton.setEnabled(False)
-            self.replayButton.setEnabled(False)
-            self.rewindButton.setEnabled(False)
-            self.forwardButton.setEnabled(False)
-            # 清空字幕顯示區域與快取
-            self.subtitleWidget.setText("")
-            self.statusLabel.setText("")
-            if self.timer.isActive():
-                self.timer.stop()
-            self.timer = QTimer(self)
-            self.timer.setInterval(30)
-            self.timer.timeout.connect(self.update_ui)
-            # 只載入該影片對應字幕
-            if os.path.exists(self.srt_path):
-                import pysrt
-                with open(self.srt_path, 'r', encoding='utf-8') as f:
-                    subs_raw = list(pysrt.from_string(f.read()))
-                print(f"[LOG] 載入字幕: {self.srt_path}")
-                print(f"[LOG] 字幕條數: {len(subs_raw)}")
-                self.subs = [(sub.text, '', '', sub.start.ordinal, sub.end.ordinal) for sub in subs_raw]
-                self.subtitleWidget.set_subtitles(self.subs, [])
-            else:
-                print(f"[LOG] 找不到字幕檔: {self.srt_path}")
-                self.subs = []
-                self.subtitleWidget.set_subtitles([], [])
+            self.open_video(os.path.abspath(file_path))
+    def open_video(self, abs_path):
+        print(f"[LOG] 正在播放: {os.path.basename(abs_path)}")
+        self.statusLabel.setText(f"已選擇: {os.path.basename(abs_path)}")
+        self.video_path = abs_path
+        if os.path.dirname(abs_path) not in self.library_dirs: self.library_dirs.append(os.path.dirname(abs_path))
+        self.media_player.stop()
+        self.vlc_manager.preparse(abs_path)
+        self.set_vlc_video_output()
+        self.processButton.setEnabled(True)
+        self.srt_path = os.path.splitext(abs_path)[0] + "_orig.srt"
+        self.stop_translation()
+        self.progressSlider.setValue(0)
+        self.subtitleWidget.show_cue(-1)
+        self.loopButton.setChecked(False)
+        self.subs = []
+        self.translated = []
+        self.playButton.setEnabled(False)
+        self.replayButton.setEnabled(False)
+        self.rewindButton.setEnabled(False)
+        self.forwardButton.setEnabled(False)
+        # 清空字幕顯示區域與快取
+        self.subtitleWidget.show_cue(-1)
+        self.statusLabel.setText("")
+        self.scheduler.stop()
+        self.duration = 0
+        self.ui.invalidate()
+        self.subtitleWidget.set_subtitles([], [])
+        # 只載入該影片對應字幕；在背景解析，換了影片時舊的結果會被丟棄
+        self.selector.select(self.srt_path, {'subtitles': self.load_existing_subtitles}, self.on_select_result)
+    def open_search(self):
+        if self.transcript_index is None: self.transcript_index = TranscriptIndex(os.path.join(BASE_DIR, "subtitle_index.db"))
+        LibrarySearchDialog(self, self.transcript_index, self.library_dirs, self.open_from_library).show()
+    def open_from_library(self, video, start_ms):
+        # 從字幕庫搜尋結果開啟影片並從該句開始播放；已在播放同一部影片時直接跳轉
+        print(f"[LOG] 字幕庫: 開啟 {video} @ {start_ms / 1000:.1f}s")
+        same = self.video_path and os.path.normpath(self.video_path) == os.path.normpath(video)
+        if same and self.media_player.get_state() in (vlc.State.Playing, vlc.State.Paused):
+            self.media_player.set_time(int(start_ms))
+            self.update_ui()
+            return
+        # 處理佇列中已完成的工作含有翻譯，否則直接讀取影片旁的字幕 (不重新辨識)
+        done = [job for job in self.jobs.jobs.values() if job.kind == 'process' and job.state == 'done' and os.path.normpath(job.video_path) == os.path.normpath(video)]
+        subtitle = find_subtitle(video)
+        subs = done[-1].result if done else (self.load_existing_subtitles(subtitle) if subtitle else []) or []
+        self.open_video(os.path.abspath(video))
+        self.on_process_finished(subs, [], f"已開啟: {os.path.basename(video)}", start_ms=start_ms)
+        if done: self.start_translation(done[-1])
+        self.media_player.play()
+        self.ui.render(playing=True)
+    def load_existing_subtitles(self, srt_path):
+        if not os.path.exists(srt_path):
+            print(f"[LOG] 找不到字幕檔: {srt_path}")
+            return None
+        subs_raw = load_srt(srt_path)
+        print(f"[LOG] 載入字幕: {srt_path}")
+        print(f"[LOG] 字幕條數: {len(subs_raw)}")
+        return [(sub['original'], '', '', sub['start'], sub['end']) for sub in subs_raw]
+    def on_select_result(self, name, result, error):
+        if name == 'subtitles' and result:
+            self.subs = result
+            self.subtitleWidget.set_subtitles(self.subs, [])
+            self.ui.invalidate()
     def set_vlc_video_output(self):
         if sys.platform.startswith('win'):
             self.media_player.set_hwnd(int(self.videoWidget.winId()))
@@ -268,8 +476,14 @@ class VideoPlayer(QWidget):
     def process_video(self):
         if not self.video_path: 
             return
-        self.statusLabel.setText("準備處理影片...")
-        QApplication.processEvents()
+        self.enqueue(self.video_path)
+    def add_videos(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, "加入影片", "", "MP4 files (*.mp4)")
+        for path in paths: self.enqueue(os.path.abspath(path))
+    def enqueue(self, video_path):
+        if any(job.kind == 'process' and job.video_path == video_path and not job.finished for job in self.jobs.jobs.values()):
+            print(f"[LOG] 已在處理佇列中: {video_path}")
+            return
         config_changed = False
         if not os.path.exists(self.whisper_path):
             self.whisper_path, _ = QFileDialog.getOpenFileName(self, "選擇 whisper.cpp 執行檔", "", "執行檔 (*.exe)")
@@ -279,111 +493,249 @@ class VideoPlayer(QWidget):
             self.statusLabel.setText("Whisper.cpp 執行失敗")
             return
         if config_changed:
-            save_config({"whisper_path": self.whisper_path, "model_path": self.model_path})
-        lang = self.langCombo.currentText()
-        target_lang = self.targetLangCombo.currentText()
-        self.statusLabel.setText("影片處理中，請稍候...")
-        QApplication.processEvents()
-        self.processThread = VideoProcessThread(self.video_path, lang, target_lang, self.whisper_path, self.model_path)
-        self.processThread.finished.connect(self.on_process_finished)
-        self.processThread.error.connect(self.on_process_error)
-        self.processButton.setEnabled(False)
-        self.processThread.start()
+            save_config({**load_config(), "whisper_path": self.whisper_path, "model_path": self.model_path})
+        options = {'whisper': self.whisper_path, 'model': self.model_path,
+                   'lang': self.langCombo.currentText(), 'target': self.targetLangCombo.currentText(),
+                   'lazy': load_config().get("lazy_translation", True)}  # 預設辨識完就能播放，翻譯在播放時於背景進行
+        config = load_config()
+        target = config.get("whisper_rtf_target")
+        choice = pick_model(config.get("model_calibration"), target) if target else None
+        if choice:
+            options['model'], options['threads'] = choice[0], choice[1]
+            print(f"[LOG] 依 RTF 目標 {target} 選擇模型: {os.path.basename(choice[0])} x {choice[1]} 執行緒 (RTF {choice[2]:.3f})")
+        job = self.jobs.submit(video_path, lambda job: process_video_job(self.jobs, job), **options)
+        self.update_job_row(job)
+        if video_path == self.video_path: self.statusLabel.setText("影片已加入處理佇列，請稍候...")
+    def on_job_update(self, job):
+        if job.id not in self.jobs.jobs: return  # 已從佇列移除
+        self.update_job_row(job)
+        if job.kind == 'export':
+            if job.state == 'done': self.statusLabel.setText(f"已匯出: {job.options['output']}")
+            elif job.state == 'failed': QMessageBox.critical(self, "匯出錯誤", f"匯出學習卡失敗: {job.error}")
+            return
+        if job.kind == 'calibrate':
+            if job.state == 'done':
+                config = load_config()
+                save_config({**config, "model_calibration": {**config.get("model_calibration", {}), **job.result}})
+                self.statusLabel.setText("模型校準完成")
+                QMessageBox.information(self, "校準模型", f"{summary(job.result)}\n\n在 config.json 設定 \"whisper_rtf_target\" 後，加入佇列時會自動選擇符合目標的模型。")
+            elif job.state == 'failed': QMessageBox.critical(self, "校準模型", f"校準失敗: {job.error}")
+            return
+        if job.video_path != self.video_path: return
+        if job.state == 'running':
+            self.statusLabel.setText(f"{job.stage}... {job.progress:.0f}%")
+        elif job.state == 'done':
+            self.load_job(job.id)
+        elif job.state == 'failed':
+            self.on_process_error(job.error)
+    def load_job(self, job_id):
+        # 把完成的處理工作載入播放器；不是目前的影片時先切換過去
+        job = self.jobs.jobs.get(job_id)
+        if not job or job.state != 'done' or job.kind != 'process': return
+        if job.video_path != self.video_path: self.open_video(job.video_path)
+        self.on_process_finished(job.result, [], "處理完成！可以播放影片。")
+        self.start_translation(job)
+    def export_cards(self):
+        # 把目前影片的字幕匯出成學習卡，在處理佇列中執行 (可取消)
+        if not self.video_path or not self.subs:
+            QMessageBox.information(self, "匯出學習卡", "請先處理或載入有字幕的影片。")
+            return
+        folder = QFileDialog.getExistingDirectory(self, "選擇學習卡的輸出資料夾")
+        if not folder: return
+        out_dir = os.path.join(folder, os.path.splitext(os.path.basename(self.video_path))[0] + "_cards")
+        cues = [{'start': start, 'end': end, 'original': orig, 'translated': trans} for orig, trans, _, start, end in self.subs]
+        config = load_config()
+        job = self.jobs.submit(self.video_path, lambda job: export_cards_job(self.jobs, job, cues, out_dir, config), kind='export', output=out_dir)
+        job.name = f"[學習卡] {job.name}"
+        self.update_job_row(job)
+    def start_translation(self, job):
+        # 處理時略過的翻譯改在背景進行，優先翻譯播放位置之後的字幕 (見 lazy_translate.py)
+        self.stop_translation()
+        source, target = job.options.get('source', job.options['lang']), job.options['target']
+        pending = [i for i, sub in enumerate(self.subs) if not sub[1]]
+        if not job.options.get('lazy') or not pending or target == 'none' or source == target: return
+        config = load_config()
+        self.lazy_translation = LazyTranslation(lambda: translators.get_translator(config, source, target),
+                                                [(sub[3], sub[4]) for sub in self.subs], [sub[0] for sub in self.subs], pending, self.translation_ready.emit)
+        self.statusLabel.setText(f"可以播放影片，背景翻譯 {len(pending)} 句中...")
+    def stop_translation(self):
+        if self.lazy_translation: self.lazy_translation.stop(); self.lazy_translation = None
+    def on_translation_ready(self):
+        if not self.lazy_translation: return
+        done = self.lazy_translation.drain()
+        for i, text in done:
+            orig, _, words, start, end = self.subs[i]
+            self.subs[i] = (orig, text, words, start, end)  # 與處理工作的結果是同一個列表，重新載入時不必再翻譯
+        remaining = self.lazy_translation.remaining
+        self.statusLabel.setText(f"背景翻譯中，剩餘 {remaining} 句..." if remaining else "翻譯完成！")
+        # 字幕編號沒變時 UiUpdater 不會重畫 (暫停中也不會)，正在顯示的這一句有了譯文就強制重畫一次
+        if self.ui.last.get('cue') in {i for i, _ in done}:
+            self.ui.invalidate('cue')
+            self.update_ui()
+    def calibrate_models(self):
+        # 以目前影片的一段音訊，實測模型資料夾中每個模型與執行緒數的即時倍率，在處理佇列中執行
+        if not self.video_path:
+            QMessageBox.information(self, "校準模型", "請先選擇一部有對白的影片作為參考音訊。")
+            return
+        if not os.path.exists(self.whisper_path) or not find_models(self.model_path):
+            QMessageBox.critical(self, "Whisper 錯誤", "找不到 whisper.cpp 執行檔或模型檔，請手動設定！")
+            return
+        whisper, model, lang = self.whisper_path, self.model_path, self.langCombo.currentText()
+        job = self.jobs.submit(self.video_path, lambda job: calibrate_job(self.jobs, job, whisper, model, lang), kind='calibrate')
+        job.name = f"[校準] {job.name}"
+        self.update_job_row(job)
+    def remove_job(self, job_id):
+        # 尚未結束的工作改為取消；已結束的工作移出佇列
+        if self.jobs.remove(job_id):
+            self.jobTable.removeRow(self.job_row(job_id))
+        elif job_id in self.jobs.jobs:
+            self.update_job_row(self.jobs.jobs[job_id])
+    def job_row(self, job_id):
+        for row in range(self.jobTable.rowCount()):
+            if self.jobTable.item(row, 0).data(Qt.UserRole) == job_id: return row
+        return -1
+    def selected_job(self):
+        row = self.jobTable.currentRow()
+        return self.jobTable.item(row, 0).data(Qt.UserRole) if row >= 0 else None
+    def update_job_row(self, job):
+        row = self.job_row(job.id)
+        if row < 0:
+            row = self.jobTable.rowCount()
+            self.jobTable.insertRow(row)
+        for col, text in enumerate((job.name, job.error or job.stage, f"{job.progress:.0f}%", job.state_text)):
+            item = QTableWidgetItem(text)
+            item.setData(Qt.UserRole, job.id)
+            self.jobTable.setItem(row, col, item)
     def on_process_error(self, err):
         QMessageBox.critical(self, "處理錯誤", f"發生錯誤: {err}")
         self.statusLabel.setText("處理失敗，請重試。")
-        self.processButton.setEnabled(True)
-        self.selectButton.setEnabled(True)
         
-    def on_process_finished(self, subs, translated, msg):
+    def on_process_finished(self, subs, translated, msg, start_ms=0):
         print(f"[LOG] 處理完成，字幕條數: {len(subs)}")
+        self.selector.cancel()  # 尚未載入完成的舊字幕不可覆蓋剛處理好的字幕
         self.subs = subs
         self.translated = translated
         self.subtitleWidget.set_subtitles(self.subs, self.translated)
+        self.loopButton.setChecked(False)
+        self.ui.invalidate()
         self.statusLabel.setText(msg)
         self.set_vlc_video_output()
-        self.media_player.set_media(self.vlc_instance.media_new(self.video_path))
+        media = self.vlc_manager.open(self.video_path)
+        if start_ms: media.add_option(f"start-time={start_ms / 1000:.3f}")
         self.progressSlider.setValue(0)
         self.playButton.setEnabled(True)
         self.replayButton.setEnabled(True)
         self.rewindButton.setEnabled(True)
         self.forwardButton.setEnabled(True)
-        self.processButton.setEnabled(True)
-        # 處理完成後 Timer 重新啟動
-        if not self.timer.isActive():
-            self.timer.start()
+        self.update_ui()
     def play_pause(self):
         if self.media_player.is_playing():
             self.media_player.pause()
-            self.playButton.setText("▶")
-            self.timer.stop()
+            self.ui.render(playing=False)
+            self.scheduler.stop()
         else:
             self.media_player.play()
-            self.playButton.setText("❚❚")
-            self.timer.start()
+            self.ui.render(playing=True)
             self.update_ui()  # 確保字幕立即更新
     def replay(self):
         self.media_player.set_time(0)
         self.media_player.play()
-        self.playButton.setText("❚❚")
-        self.timer.start()
+        self.ui.render(playing=True)
+        self.update_ui()
     def seek(self, delta_ms):
         pos = self.media_player.get_time() + delta_ms
         pos = max(0, min(pos, self.media_player.get_length()))
         self.media_player.set_time(pos)
-        self.timer.start()
+        self.update_ui()
+    def set_playback_rate(self, text):
+        # VLC 預設的 scaletempo 濾鏡會保持音高；排程器依 get_rate() 計算下一個切換點
+        self.media_player.set_rate(float(text.rstrip('x')))
+        self.update_ui()
+    def toggle_cue_loop(self, checked):
+        self.loop_cue = -1
+        if checked:
+            now = self.media_player.get_time()
+            cue_index = self.subtitleWidget.cue_index
+            self.loop_cue = cue_index.find(now)
+            if self.loop_cue < 0: self.loop_cue = cue_index.prev_cue(now)
+            if self.loop_cue < 0:
+                self.loopButton.setChecked(False); return
+            print(f"[LOG] 單句循環 #{self.loop_cue + 1} ({self.subs[self.loop_cue][3]}-{self.subs[self.loop_cue][4]} ms)")
+        self.loopButton.setText("循環中 ✓" if self.loop_cue >= 0 else "單句循環")
+        self.update_ui()
+    def jump_to_cue(self, direction):
+        # 上一句 / 下一句：精確跳到字幕開頭；循環中則改為循環新的一句
+        cue_index = self.subtitleWidget.cue_index
+        now = self.media_player.get_time()
+        cue_id = cue_index.next_cue(now) if direction > 0 else cue_index.prev_cue(now)
+        if cue_id < 0: return
+        self.media_player.set_time(self.subs[cue_id][3])
+        if self.loop_cue >= 0: self.loop_cue = cue_id
+        self.update_ui()
     def on_seek_slider_pressed(self):
-        # 拖曳時暫停timer，避免跳動
-        if self.timer.isActive():
-            self.timer.stop()
+        # 拖曳時暫停排程，避免跳動
+        self.scheduler.stop()
     def on_seek_slider_released(self):
         length = self.media_player.get_length()
         if length > 0:
             pos = int(self.progressSlider.value() / 100 * length)
             self.media_player.set_time(pos)
             self.update_ui()  # 確保字幕立即更新
-            self.timer.start()
-    def update_ui(self):
-        pos = self.media_player.get_time()
-        self.subtitleWidget.update_subtitle(pos)
+    def render_cue(self, cue_id):
+        self.subtitleWidget.show_cue(cue_id)
         # 狀態欄顯示一行字幕（原文+翻譯，若有）
         gui_text = ""
-        for sub in self.subs:
-            start = sub[3] if len(sub) > 3 else 0
-            end = sub[4] if len(sub) > 4 else 0
-            if start <= pos <= end:
-                orig = sub[0] if len(sub) > 0 else ''
-                trans = sub[1] if len(sub) > 1 else ''
-                if orig and trans and orig.strip() != trans.strip():
-                    gui_text = orig + "\n" + trans
-                else:
-                    gui_text = orig
-                break
-        # 僅當內容不同時才 setText
-        if self.statusLabel.text() != gui_text:
-            self.statusLabel.setFont(QFont("Arial", 24))
-            self.statusLabel.setText(gui_text if gui_text else "")
-        if self.media_player.get_length() > 0:
-            self.progressSlider.setValue(int(pos / self.media_player.get_length() * 100))
-        if not self.media_player.is_playing():
-            self.timer.stop()
-        else:
-            self.timer.start()  # 確保計時器持續運行
+        if cue_id >= 0:
+            orig, trans = self.subs[cue_id][0], self.subs[cue_id][1]
+            if orig and trans and orig.strip() != trans.strip():
+                gui_text = orig + "\n" + trans
+            else:
+                gui_text = orig
+        self.statusLabel.setText(gui_text)
+    def update_ui(self):
+        # 只在字幕編號、進度條位置或播放狀態改變時才更新元件，並只為下一個切換點排一次計時器
+        if self.progressSlider.isSliderDown():
+            return
+        pos = max(0, self.media_player.get_time())
+        if self.lazy_translation: self.lazy_translation.set_position(pos)
+        if self.loop_cue >= 0 and pos > self.subs[self.loop_cue][4]:
+            # 單句循環：超過本句結尾就跳回開頭，排程器的計時器會剛好在結尾觸發
+            pos = self.subs[self.loop_cue][3]
+            self.media_player.set_time(pos)
+        if self.duration <= 0:
+            self.duration = self.media_player.get_length()
+        state = self.media_player.get_state()
+        playing = state in (vlc.State.Opening, vlc.State.Buffering, vlc.State.Playing)
+        if state not in (vlc.State.NothingSpecial, vlc.State.Stopped):  # play() 為非同步，過渡狀態交給之後的 VLC 事件
+            self.ui.render(playing=playing)
+        cue_id = self.subtitleWidget.cue_index.find(pos)
+        self.ui.render(cue=cue_id, word=(cue_id, self.subtitleWidget.word_at(cue_id, pos)), slider=slider_step(pos, self.duration, 100))
+        self.scheduler.set_track(self.subtitleWidget.tick_index, self.duration)
+        self.scheduler.sync(pos, playing, self.media_player.get_rate() or 1.0)
     def get_video_fps(self):
         try:
             with VideoFileClip(self.video_path) as clip:
                 return clip.fps
         except Exception:
             return 30
-    def on_vlc_playing(self, event):
-        if not self.timer.isActive():
-            self.timer.start()
-            self.update_ui()  # 確保字幕立即更新
+    def on_vlc_time_changed(self, event):
+        # 此事件頻率很高，只有與排程器推算的位置偏差過大 (例如跳轉) 時才重新同步
+        if self.scheduler.drifted(event.u.new_time):
+            self.vlc_resync.emit()
+    def on_vlc_state_changed(self, event):
+        self.vlc_resync.emit()
     def on_volume_changed(self, value):
         self.media_player.audio_set_volume(value)
+    def closeEvent(self, event):
+        self.jobs.shutdown()  # 取消排隊中的工作並終止執行中的 whisper.cpp
+        self.stop_translation()
+        translators.shutdown()
+        save_config({**load_config(), "library_dirs": self.library_dirs, "language_cache": language_cache})
+        if self.transcript_index: self.transcript_index.close()
+        super().closeEvent(event)
     def copy_subtitles(self):
         # 複製當前字幕和翻譯文字到剪貼板
-        current_text = self.subtitleWidget.text()
+        current_text = self.subtitleWidget.plain_text
         clipboard = QApplication.clipboard()
         clipboard.setText(current_text)
 
@@ -402,6 +754,7 @@ def load_config():
     return {}
 
 if __name__ == "__main__":
+    sweep_stale()  # 清除上次異常結束留下的工作資料夾
     app = QApplication(sys.argv)
     player = VideoPlayer()
     player.show()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  whisper.cpp 模型校準 (即時倍率)
+# ===================================================================================
+#
+#  說明：
+#  模型原本固定 (PyQt 版) 或由使用者自行選擇，不考慮這台電腦的速度。
+#  1. 在設定的模型所在資料夾找出所有 ggml-*.bin (不同大小與量化版本)，以一段約 30 秒的
+#     參考音訊，對每個模型與執行緒數實測即時倍率 RTF = 辨識時間 / 音訊長度 (不含載入模型的時間)。
+#  2. 結果存在 config.json 的 "model_calibration"：{模型路徑: {執行緒數: {"rtf", "load_s"}}}，
+#     只對這台電腦有效。
+#  3. 設定 "whisper_rtf_target" (例如 0.5 表示 1 小時的影片 30 分鐘內辨識完) 後，加入處理佇列時
+#     自動選擇「符合目標的模型中最大 (通常最準確) 的一個」及其最快的執行緒數；
+#     都達不到時改用最快的組合。
+#  4. 校準與實際辨識都以 whisper_command() 組出命令，並傳入播放器相同的解碼參數 (beam size 等)，
+#     量到的 RTF 才等於實際的成本。
+#
+# ===================================================================================
+
+import glob, os, re, time
+from log_util import log
+
+_LOAD_TIME_RE = re.compile(r"load time\s*=\s*([\d.]+)\s*ms")
+
+def whisper_command(whisper_exe, model, audio, lang, threads, decode_args=()):
+    '''whisper.cpp 的基本命令；decode_args 為播放器使用的解碼參數，例如 ["-bs", "8", "-bo", "8"]。'''
+    return [whisper_exe, "-m", model, "-f", audio, "-l", lang, "-t", str(threads), *decode_args]
+
+def find_models(model_path):
+    '''回傳與 model_path 同資料夾的 ggml 模型，依檔案大小排序 (小到大)。'''
+    folder = os.path.dirname(os.path.abspath(model_path)) if model_path else ""
+    models = [p for p in glob.glob(os.path.join(folder, "ggml-*.bin")) if "silero" not in os.path.basename(p)]  # 略過 VAD 模型
+    return sorted(models, key=os.path.getsize)
+
+def thread_candidates():
+    cpus = os.cpu_count() or 4
+    return sorted({min(n, cpus) for n in (4, 8, cpus)})
+
+def reference_clip(video_path, out_path, seconds=30):
+    '''從影片中段 (略過片頭) 取 seconds 秒的 16 kHz 單聲道音訊，回傳實際長度 (秒)。'''
+    from moviepy.editor import VideoFileClip
+    with VideoFileClip(video_path) as clip:
+        start = min(60, clip.duration / 3)
+        end = min(clip.duration, start + seconds)
+        clip.audio.subclip(start, end).write_audiofile(out_path, fps=16000, nbytes=2, ffmpeg_params=["-ac", "1"], logger=None)
+    return end - start
+
+def measure(whisper_exe, model, clip_path, duration_s, threads, run, lang="auto", decode_args=()):
+    '''回傳 {"rtf", "load_s"}；run(command) 執行 whisper.cpp 並回傳含 stdout/stderr 的結果。'''
+    t0 = time.perf_counter()
+    result = run(whisper_command(whisper_exe, model, clip_path, lang, threads, decode_args))
+    elapsed = time.perf_counter() - t0
+    match = _LOAD_TIME_RE.search(f"{result.stdout or ''}\n{result.stderr or ''}")
+    load_s = float(match.group(1)) / 1000 if match else 0.0
+    return {"rtf": round(max(0.0, elapsed - load_s) / duration_s, 4), "load_s": round(load_s, 2)}
+
+def calibrate(whisper_exe, model_path, clip_path, duration_s, run, lang="auto", progress=None, decode_args=()):
+    '''對 model_path 同資料夾的所有模型與執行緒數實測，回傳 {模型路徑: {執行緒數: 結果}}。'''
+    models, threads = find_models(model_path), thread_candidates()
+    total, done, results = len(models) * len(threads), 0, {}
+    for model in models:
+        for n in threads:
+            result = measure(whisper_exe, model, clip_path, duration_s, n, run, lang, decode_args)
+            results.setdefault(model, {})[str(n)] = result  # JSON 的鍵只能是字串
+            done += 1
+            log(f"校準 {os.path.basename(model)} x {n} 執行緒: RTF {result['rtf']:.3f} (載入 {result['load_s']:.1f} 秒)")
+            if progress: progress(done, total)
+    return results
+
+def pick_model(calibration, target_rtf):
+    '''回傳 (模型路徑, 執行緒數, RTF)：符合目標的模型中最大的一個，都不符合時回傳最快的組合；沒有資料時回傳 None。'''
+    best = []
+    for model, by_threads in (calibration or {}).items():
+        if not os.path.exists(model) or not by_threads: continue
+        threads, result = min(by_threads.items(), key=lambda item: item[1]["rtf"])
+        best.append((model, int(threads), result["rtf"]))
+    if not best: return None
+    meeting = [b for b in best if b[2] <= target_rtf]
+    return max(meeting, key=lambda b: os.path.getsize(b[0])) if meeting else min(best, key=lambda b: b[2])
+
+def summary(calibration):
+    '''回傳給使用者看的結果表 (每個模型最快的執行緒數)。'''
+    lines = []
+    for model, by_threads in sorted(calibration.items(), key=lambda item: os.path.getsize(item[0]) if os.path.exists(item[0]) else 0):
+        threads, result = min(by_threads.items(), key=lambda item: item[1]["rtf"])
+        lines.append(f"{os.path.basename(model)}: RTF {result['rtf']:.3f} ({threads} 執行緒)")
+    return "\n".join(lines)
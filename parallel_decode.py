@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  多行程影格解碼 (高解析度來源)
+# ===================================================================================
+#
+#  說明：
+#  4K60 影片單靠 Tk 主執行緒上的一個 VideoCapture 來不及解碼，
+#  ParallelDecoder 把時間軸切成以關鍵影格開頭的區段，交給多個工作行程預先解碼。
+#  1. 區段邊界來自 ffprobe 列出的關鍵影格 (找不到 ffprobe 時改用固定長度區段)，
+#     每個工作行程有自己的 VideoCapture，跳到區段開頭後依序解碼，不會互相等待。
+#  2. 影格寫入 multiprocessing.shared_memory 中的槽位，行程間只傳遞 (影格編號, 槽位)，
+#     不 pickle 影格本身。所有工作行程共用一個空槽位佇列，記憶體用量固定；
+#     影格編號必須落在「目前播放位置 + 槽位數」之內才能取用槽位，預先解碼的區段不會
+#     占滿槽位而讓目前區段等不到。固定長度區段 (沒有關鍵影格資訊時) 的長度限制在
+#     每個工作行程平均分到的槽位數以內，各工作行程才能同時解碼。
+#  3. 區段 s 交給第 s % workers 個工作行程，同時最多預先排定 lookahead 個區段；
+#     跳轉到已排定範圍之外時遞增世代編號，舊世代的工作與結果一律丟棄。
+#  4. get() 最多只等幾毫秒，不會卡住介面；影格已排定給工作行程但還沒好時 pending() 為 True，
+#     播放器保留上一格畫面等下一次更新，不自己再解碼一次。
+#
+# ===================================================================================
+
+import bisect, queue, subprocess, sys, time
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+from process_util import spawn_context, hidden_main
+from log_util import log
+
+def keyframe_indices(path, fps):
+    '''以 ffprobe 取得關鍵影格的影格編號；沒有 ffprobe 或執行失敗時回傳 None。'''
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+               "-show_entries", "frame=pts_time", "-of", "csv=p=0", path]
+    try:
+        out = subprocess.run(command, capture_output=True, text=True, check=True, timeout=120,
+                             creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0).stdout
+    except (FileNotFoundError, subprocess.SubprocessError) as e:
+        log(f"無法取得關鍵影格，改用固定長度區段: {e}")
+        return None
+    times = [t.strip(',') for t in out.split()]
+    return sorted({int(round(float(t) * fps)) for t in times if t and t != 'N/A'}) or None
+
+def plan_segments(frame_count, keyframes=None, fallback_len=120, min_len=30):
+    '''將時間軸切成 [(first, end), ...] (end 不含)；區段以關鍵影格開頭，太短的區段與下一段合併。'''
+    starts = [0]
+    for k in (keyframes if keyframes else range(fallback_len, frame_count, fallback_len)):
+        if k - starts[-1] >= min_len and k < frame_count: starts.append(k)
+    return list(zip(starts, starts[1:] + [frame_count]))
+
+def _decode_worker(path, shm_name, shape, n_slots, tasks, free, results, generation, position):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((n_slots,) + shape, np.uint8, buffer=shm.buf)
+    cap = cv2.VideoCapture(path)
+    while True:
+        task = tasks.get()
+        if task is None: break
+        gen, first, end, wanted = task
+        if gen != generation.value: continue
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != first: cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        for idx in range(first, end):
+            if gen != generation.value: break
+            if idx < wanted:
+                if not cap.grab(): break
+                continue
+            ret, frame = cap.read()
+            if not ret or frame.shape != shape:
+                results.put((gen, idx, -1)); break  # 影片結尾或無法解碼
+            slot = None
+            while slot is None and gen == generation.value:
+                if idx >= position.value + n_slots:
+                    time.sleep(0.005); continue  # 離播放位置太遠：等顯示端往前播，把槽位留給較早的影格
+                try: slot = free.get(timeout=0.2)
+                except queue.Empty: pass
+            if slot is None: break
+            frames[slot] = frame
+            results.put((gen, idx, slot))
+    cap.release()
+    del frames
+    shm.close()
+
+class ParallelDecoder:
+    def __init__(self, video_path, workers=3, budget_mb=512, lookahead=None, keyframes=None, max_wait=0.5):
+        '''keyframes: 事先在背景取得的關鍵影格 (keyframe_indices 的結果)，None 時在此執行 ffprobe。
+        max_wait: 超過這麼久沒有拿到任何影格時，pending() 改回 False，讓播放器自己解碼。'''
+        cap = cv2.VideoCapture(video_path)
+        w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frame_count, fps = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS) or 30
+        cap.release()
+        self.shape, self.frame_count, self.max_wait = (h, w, 3), frame_count, max_wait
+        frame_bytes = h * w * 3
+        n_slots = max(2 * workers, int(budget_mb * 1048576 // frame_bytes))
+        seg_len = max(1, min(int(fps * 2), n_slots // workers))
+        self.segments = plan_segments(frame_count, keyframes or keyframe_indices(video_path, fps), fallback_len=seg_len, min_len=min(30, seg_len))
+        self.seg_starts = [first for first, _ in self.segments]
+        self.workers, self.lookahead = workers, lookahead or workers
+        self.shm = shared_memory.SharedMemory(create=True, size=frame_bytes * n_slots)
+        self.frames = np.ndarray((n_slots,) + self.shape, np.uint8, buffer=self.shm.buf)
+
+        ctx = spawn_context()
+        self.generation, self.position = ctx.Value('i', 0), ctx.Value('i', 0)
+        self.results = ctx.Queue()
+        self.tasks = [ctx.Queue() for _ in range(workers)]
+        self.free = ctx.Queue()
+        for slot in range(n_slots): self.free.put(slot)
+        self.procs = [ctx.Process(target=_decode_worker, args=(video_path, self.shm.name, self.shape, n_slots, self.tasks[i],
+                                                               self.free, self.results, self.generation, self.position), daemon=True)
+                      for i in range(workers)]
+        with hidden_main():
+            for p in self.procs: p.start()
+
+        self.ready = {}                # 影格編號 -> 槽位
+        self.window_start, self.next_seg, self.eof = 0, 0, None
+        self._restart(0)
+        log(f"多行程解碼: {workers} 個工作行程, {len(self.segments)} 個區段, {n_slots} 個共用槽位 ({frame_bytes * n_slots / 1048576:.0f} MB)")
+
+    def _segment_of(self, frame_idx):
+        return max(0, bisect.bisect_right(self.seg_starts, frame_idx) - 1)
+
+    def _release(self, slot):
+        self.free.put(slot)
+
+    def _schedule(self, seg, wanted=0):
+        first, end = self.segments[seg]
+        self.tasks[seg % self.workers].put((self.generation.value, first, end, wanted))
+
+    def _restart(self, frame_idx):
+        with self.generation.get_lock(): self.generation.value += 1
+        for slot in self.ready.values(): self._release(slot)
+        self.ready.clear()
+        self.window_start, self.eof, self.last_hit = frame_idx, None, time.perf_counter()
+        self.position.value = frame_idx
+        self.next_seg = self._segment_of(frame_idx)
+        self._schedule(self.next_seg, wanted=frame_idx)
+        self.next_seg += 1
+
+    def _drain(self, timeout=None):
+        try: gen, idx, slot = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+        except queue.Empty: return False
+        if gen != self.generation.value or idx < self.window_start:
+            if slot >= 0: self._release(slot)  # 舊世代或已經播過的影格
+        elif slot < 0:
+            self.eof = idx if self.eof is None else min(self.eof, idx)
+        else:
+            self.ready[idx] = slot
+        return True
+
+    def get(self, frame_idx, timeout=0.005):
+        '''回傳指定影格 (共享記憶體的檢視，下一次呼叫 get() 前有效)；逾時或超出影片結尾時回傳 None。
+        在介面執行緒呼叫，只等待很短的時間：還沒解碼好 (例如剛跳轉) 時由呼叫端改用自己的解碼器。'''
+        if not 0 <= frame_idx < self.frame_count: return None
+        # 往回跳或往前跳過一個以上的區段時，從目標影格所在的區段重新開始
+        if frame_idx < self.window_start or self._segment_of(frame_idx) > self._segment_of(self.window_start) + 1:
+            self._restart(frame_idx)
+        while self.next_seg < len(self.segments) and self.next_seg <= self._segment_of(frame_idx) + self.lookahead:
+            self._schedule(self.next_seg)
+            self.next_seg += 1
+        # 已經播過 (或因顯示較慢而跳過) 的影格立即歸還槽位
+        self.window_start = self.position.value = frame_idx
+        for idx in [i for i in self.ready if i < frame_idx]: self._release(self.ready.pop(idx))
+        while self._drain(): pass
+        deadline = time.perf_counter() + timeout
+        while frame_idx not in self.ready and (self.eof is None or frame_idx < self.eof):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not self._drain(remaining):
+                return None
+        slot = self.ready.get(frame_idx)
+        if slot is None: return None
+        self.last_hit = time.perf_counter()
+        return self.frames[slot]
+
+    def pending(self, frame_idx):
+        '''get() 剛錯過的影格是否已排定由工作行程解碼 (尚未完成)；是的話呼叫端應等下一次更新而不要自己再解碼一次。
+        工作行程太久沒有送來影格 (例如解碼卡住) 時回傳 False。'''
+        return (self.window_start <= frame_idx < self.frame_count and self._segment_of(frame_idx) < self.next_seg
+                and (self.eof is None or frame_idx < self.eof) and time.perf_counter() - self.last_hit < self.max_wait)
+
+    def close(self):
+        with self.generation.get_lock(): self.generation.value += 1
+        for q in self.tasks: q.put(None)
+        for p in self.procs:
+            p.join(timeout=1)
+            if p.is_alive(): p.terminate()
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  PCM 串流音訊後端 (pygame.mixer.Channel)
+# ===================================================================================
+#
+#  說明：
+#  取代把 pygame.mixer.music 當作黑盒子主時鐘的作法。
+#  1. 提取出的 temp WAV 本身就是解碼後的 16-bit PCM，以 numpy.memmap 直接映射，
+#     不需整檔讀入記憶體。
+#  2. 背景執行緒每次切出一小段 PCM 區塊，以 Sound(buffer=...) 排入 Channel 佇列，
+#     佇列中永遠只保留一個區塊，偵測到區塊切換時以「區塊起始樣本 + 經過時間」
+#     重新校正時鐘，因此位置以樣本為單位回報，而非 get_pos() 的粗略毫秒。
+#     背景執行緒被耽擱 (GIL 被解碼或繪圖占住) 而讓 Channel 播完時，從游標重新開始播放並校正時鐘。
+#  3. 跳轉只需移動讀取游標並重新送出區塊，不涉及檔案重新載入。
+#  4. 每個區塊經過 stretch_block() 處理：rate != 1 時以 WSOLA 保持音高變速，
+#     輸出的樣本數與消耗的原始樣本數不同，時鐘以原始媒體時間回報。
+#     背景執行緒在排入一個區塊後就先算好下一個區塊，變速運算不會卡在區塊交界；
+#     運算時不持有 self.lock，介面執行緒讀取時鐘不必等待 WSOLA。
+#
+#  介面與 AudioClock 相同，可直接替換。
+#
+# ===================================================================================
+
+import threading, time, wave
+import numpy as np
+import pygame
+from audio_clock import AudioClock
+from log_util import log
+from time_stretch import WsolaStretcher
+
+class PcmAudioPlayer(AudioClock):
+    def __init__(self, block_ms=100, poll_ms=4):
+        super().__init__()
+        self.block_ms, self.poll_s = block_ms, poll_ms / 1000.0
+        self.pcm, self.sample_rate, self.channels = None, 44100, 2
+        self.rate = 1.0
+        self.channel = None
+        self.lock = threading.RLock()
+        self.render_lock = threading.Lock()      # 保護 WSOLA 狀態；持有時不可再取得 self.lock
+        self.cursor = 0                          # 下一個要送出的原始樣本
+        self.blocks = []                         # 已送入 Channel 的區塊: (起始樣本, 原始樣本數)
+        self.prepared = None                     # 預先算好的下一個區塊: (起始樣本, 原始樣本數, Sound)，起始樣本即為游標
+        self.epoch, self.reset_pending = 0, False  # 跳轉或變速時遞增，丟棄在鎖外算到一半的區塊
+        self.stretcher = None
+        self.anchor = (0, time.perf_counter())   # (正在播放區塊的起始樣本, 開始播放的時刻)
+        self.paused_at = None
+        self._feeder = None
+        self._running = False
+
+    # --- 載入 ---
+    def load(self, path):
+        self.unload()
+        with open(path, 'rb') as f:
+            w = wave.open(f)
+            if w.getsampwidth() != 2:
+                raise RuntimeError(f"只支援 16-bit PCM WAV: {path}")
+            self.sample_rate, self.channels, frames = w.getframerate(), w.getnchannels(), w.getnframes()
+            data_offset = f.tell()
+        self.pcm = np.memmap(path, dtype='<i2', mode='r', offset=data_offset, shape=(frames, self.channels))
+        if pygame.mixer.get_init() != (self.sample_rate, -16, self.channels):
+            pygame.mixer.quit()
+            pygame.mixer.init(frequency=self.sample_rate, size=-16, channels=self.channels, buffer=1024)
+        self.channel = pygame.mixer.Channel(0)
+        self.stretcher = WsolaStretcher(self.sample_rate, self.channels)
+        self.loaded = path
+        self.offset_ms, self.started, self.paused = 0, False, False
+        log(f"PCM 音訊已映射: {frames} 樣本, {self.sample_rate} Hz, {self.channels} 聲道")
+
+    def unload(self):
+        '''停止播放並關閉 WAV 的映射，之後才能刪除或重新提取 temp WAV (Windows 不能刪除映射中的檔案)。'''
+        self.stop()
+        with self.lock:
+            pcm, self.pcm, self.loaded = self.pcm, None, None
+        mm = getattr(pcm, '_mmap', None)
+        del pcm
+        if mm is not None:
+            try: mm.close()  # 不等垃圾回收，立即釋放檔案
+            except BufferError: log("PCM 映射仍被引用，將在垃圾回收時釋放")
+
+    # --- 區塊產生 ---
+    def stretch_block(self, block, rate):
+        '''將原始 PCM 區塊轉成播放速率 rate 的輸出；rate == 1 時原樣輸出。'''
+        if rate == 1.0: return block
+        return self.stretcher.process(block, rate)
+
+    def _render_block(self, pcm, start, rate):
+        '''從 start 切出下一個區塊並完成變速處理，回傳 (起始樣本, 原始樣本數, Sound)；不會移動游標。'''
+        with self.render_lock:
+            if self.reset_pending: self.stretcher.reset(); self.reset_pending = False
+            cursor, out = start, np.zeros((0, self.channels), np.int16)
+            while len(out) == 0:  # WSOLA 剛重設時需要累積一個視窗長度的輸入才有輸出
+                n_src = max(1, int(self.sample_rate * self.block_ms / 1000 * rate))
+                block = pcm[cursor:cursor + n_src]
+                if len(block) == 0: return None
+                cursor += len(block)
+                out = self.stretch_block(np.asarray(block), rate)
+            return start, cursor - start, pygame.mixer.Sound(buffer=np.ascontiguousarray(out).tobytes())
+
+    def _next_block(self):
+        item, self.prepared = self.prepared or self._render_block(self.pcm, self.cursor, self.rate), None
+        if item is None: return None
+        self.cursor = item[0] + item[1]
+        self.blocks.append(item[:2])
+        return item[2]
+
+    def _discard_prepared(self):
+        self.prepared, self.reset_pending = None, True
+        self.epoch += 1
+
+    def _feed(self):
+        while self._running:
+            job = None
+            with self.lock:
+                if self.started and not self.paused and self.channel and (self.blocks or self.cursor < len(self.pcm)):
+                    queued, busy = self.channel.get_queue(), self.channel.get_busy()
+                    if queued is None and len(self.blocks) > 1:
+                        # 佇列中的區塊剛開始播放：以它的起始樣本重新校正時鐘
+                        self.blocks.pop(0)
+                        self.anchor = (self.blocks[0][0], time.perf_counter())
+                    if not busy and self.cursor < len(self.pcm):
+                        # 送區塊被耽擱而讓 Channel 播完：從游標重新開始播放，時鐘從這裡接續
+                        self.blocks.clear()
+                        self.anchor = (self.cursor, time.perf_counter())
+                        sound = self._next_block()
+                        if sound is not None: self.channel.play(sound)
+                    elif not busy:
+                        self.blocks.clear()  # 最後一個區塊已播完
+                    elif queued is None:
+                        sound = self._next_block()
+                        if sound is not None: self.channel.queue(sound)
+                    elif self.prepared is None and self.cursor < len(self.pcm):
+                        job = (self.epoch, self.pcm, self.cursor, self.rate)
+            if job:
+                item = self._render_block(*job[1:])  # 先算好下一個區塊 (不持有 self.lock)
+                with self.lock:
+                    if self.epoch == job[0] and self.cursor == job[2]: self.prepared = item
+            time.sleep(self.poll_s)
+
+    def _start(self, ms):
+        with self.lock:
+            if self.pcm is None: return
+            self.channel.stop()
+            self._discard_prepared()
+            self.cursor = min(len(self.pcm), int(ms * self.sample_rate / 1000))
+            self.blocks.clear()
+            self.anchor = (self.cursor, time.perf_counter())
+            sound = self._next_block()
+            if sound is not None: self.channel.play(sound)
+            self.started, self.paused, self.paused_at = True, False, None
+        if not self._running:
+            self._running = True
+            self._feeder = threading.Thread(target=self._feed, daemon=True)
+            self._feeder.start()
+
+    # --- 播放控制 ---
+    def pause(self):
+        with self.lock:
+            if self.started and not self.paused:
+                self.channel.pause()
+                self.paused, self.paused_at = True, time.perf_counter()
+
+    def resume(self):
+        with self.lock:
+            if self.paused:
+                start, t = self.anchor
+                self.anchor = (start, t + time.perf_counter() - self.paused_at)
+                self.channel.unpause()
+                self.paused, self.paused_at = False, None
+
+    def stop(self):
+        self._running = False
+        if self._feeder: self._feeder.join(timeout=1); self._feeder = None
+        with self.lock:
+            if self.channel and pygame.mixer.get_init(): self.channel.stop()
+            self._discard_prepared()
+            self.blocks.clear()
+            self.cursor, self.started, self.paused = 0, False, False
+
+    def set_rate(self, rate):
+        '''改變播放速率；已送出的區塊維持原速，從下一個區塊開始生效。'''
+        with self.lock:
+            self.rate = max(0.25, min(4.0, float(rate)))
+            self._discard_prepared()
+
+    def is_finished(self):
+        return self.started and not self.paused and self.pcm is not None and self.cursor >= len(self.pcm) and not self.blocks and not self.prepared
+
+    # --- 時鐘 ---
+    def position_samples(self):
+        '''目前播放到的原始樣本位置。'''
+        with self.lock:
+            if not self.started: return self.cursor
+            start, t = self.anchor
+            now = self.paused_at if self.paused else time.perf_counter()
+            played = (now - t) * self.sample_rate * self.rate
+            if self.blocks: played = min(played, self.blocks[0][1])
+            return min(start + int(played), len(self.pcm))
+
+    def position_ms(self):
+        return self.position_samples() * 1000 / self.sample_rate
+
+    def seek(self, ms, paused=False):
+        self._seek_t0 = time.perf_counter()
+        self._start(max(0, ms))
+        if paused: self.pause()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  多行程輔助工具
+# ===================================================================================
+#
+#  說明：
+#  各播放器腳本在模組最上層就建立 Tk 視窗 (只有設定讀取放在 __main__ 區塊內)，
+#  Windows 的 spawn 啟動方式會在子行程重新執行主腳本，導致每個工作行程都開出一個視窗。
+#  1. spawn_context() 一律使用 spawn，避免在已有背景執行緒 (音訊、預先解碼) 的行程中 fork。
+#  2. 啟動子行程時包在 hidden_main() 內：暫時移除 __main__.__file__，
+#     子行程就只會匯入工作函式所在的模組，不會重新執行主腳本。
+#
+# ===================================================================================
+
+import sys, multiprocessing
+from contextlib import contextmanager
+
+def spawn_context():
+    return multiprocessing.get_context("spawn")
+
+@contextmanager
+def hidden_main():
+    '''在此區塊內啟動的子行程不會重新執行主腳本。'''
+    main = sys.modules.get('__main__')
+    path = getattr(main, '__file__', None)
+    if path is not None: del main.__file__
+    try:
+        yield
+    finally:
+        if path is not None: main.__file__ = path
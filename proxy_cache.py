@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  低解析度代理檔 (背景產生、依磁碟預算快取)
+# ===================================================================================
+#
+#  說明：
+#  OpenCV 手動渲染的播放器每一格都要以原始解析度解碼，高位元率 (4K、高 bitrate) 的影片
+#  播放與拖曳時間軸都會卡頓，但畫面最後只顯示成畫布大小。
+#  1. 選擇影片後在背景以 ffmpeg 產生縮到畫布高度 (360/540/720/1080 取剛好夠用的一級) 的代理檔：
+#     短 GOP (預設每 12 格一個關鍵影格，設為 1 即為 all-intra)、不含聲音，影格速率固定為
+#     原始影片的 fps，影格編號與時間的換算和原始影片相同。
+#  2. 代理檔完成後，播放與拖曳改從代理檔解碼；字幕、音訊、匯出與燒錄仍使用原始影片。
+#  3. 代理檔依影片路徑、大小、修改時間與設定命名並保留在 root 資料夾 (預設為系統暫存資料夾下的
+#     subplayer_proxies，不放在 /dev/shm 以免占用記憶體)，下次開啟同一部影片
+#     直接使用；總大小超過 budget_mb 時從最久沒用到的開始刪除。
+#
+# ===================================================================================
+
+import glob, hashlib, os, tempfile, time
+from log_util import log
+
+PROXY_HEIGHTS = (360, 540, 720, 1080)
+
+def proxy_height(width, height, canvas_w, canvas_h, heights=PROXY_HEIGHTS):
+    '''回傳代理檔的高度；原始影片本身已不比代理檔大多少時回傳 None (不需要代理檔)。'''
+    if width <= 0 or height <= 0: return None
+    fit = height * min(canvas_w / width, canvas_h / height) if canvas_w > 1 and canvas_h > 1 else 720  # 畫布尚未配置時以 720p 為準
+    target = next((h for h in heights if h >= fit), heights[-1])
+    return target if target < height * 0.75 else None
+
+def proxy_command(ffmpeg, video, out_path, height, fps, gop=12):
+    '''回傳產生代理檔的 ffmpeg 命令 (寬度依比例、取偶數)。'''
+    return [ffmpeg, "-v", "error", "-y", "-i", video, "-map", "0:v:0", "-an", "-sn", "-vf", f"scale=-2:{height}", "-r", f"{fps:.6f}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-tune", "fastdecode", "-pix_fmt", "yuv420p",
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0", "-f", "mp4", out_path]
+
+class ProxyCache:
+    def __init__(self, root=None, budget_mb=4096, gop=12):
+        self.root, self.budget = root or os.path.join(tempfile.gettempdir(), "subplayer_proxies"), budget_mb * 1048576
+        self.gop = max(1, int(gop))
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, video, height):
+        '''代理檔路徑；原始影片被替換或設定改變時名稱不同，舊檔由 evict() 自然淘汰。'''
+        st = os.stat(video)
+        key = f"{os.path.normcase(os.path.abspath(video))}|{st.st_size}|{int(st.st_mtime)}|{height}|{self.gop}"
+        name = os.path.splitext(os.path.basename(video))[0][:40]
+        return os.path.join(self.root, f"{name}_{height}p_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}.mp4")
+
+    def lookup(self, video, height):
+        '''已有代理檔時回傳路徑並更新使用時間，否則回傳 None。'''
+        path = self.path(video, height)
+        if not os.path.exists(path): return None
+        try: os.utime(path)  # 以修改時間記錄最近使用，供 evict() 判斷
+        except OSError: pass
+        return path
+
+    def build(self, video, height, fps, run, ffmpeg="ffmpeg"):
+        '''產生代理檔並回傳路徑；run(command) 執行 ffmpeg (失敗或取消時丟出例外)。
+        先寫到 .part 再改名，中途取消不會留下不完整的代理檔。'''
+        path = self.path(video, height)
+        part = path + ".part"
+        t0 = time.perf_counter()
+        try:
+            run(proxy_command(ffmpeg, video, part, height, fps, self.gop))
+            os.replace(part, path)
+        finally:
+            if os.path.exists(part):
+                try: os.remove(part)
+                except OSError: pass
+        log(f"代理檔完成: {os.path.basename(path)} ({os.path.getsize(path) / 1048576:.0f} MB, {time.perf_counter() - t0:.1f} 秒)")
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        '''總大小超過預算時，從最久沒用到的代理檔開始刪除 (keep 除外)。'''
+        cutoff = time.time() - 86400
+        for p in glob.glob(os.path.join(self.root, "*.part")):  # 程式異常結束時留下的未完成檔
+            try:
+                if os.path.getmtime(p) < cutoff: os.remove(p)
+            except OSError: pass
+        entries = []
+        for p in glob.glob(os.path.join(self.root, "*.mp4")):
+            try: st = os.stat(p)
+            except OSError: continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.budget: break
+            if keep and os.path.normcase(p) == os.path.normcase(keep): continue
+            try: os.remove(p)
+            except OSError as e:
+                log(f"刪除代理檔失敗 (可能正在使用): {e}"); continue
+            total -= size
+            log(f"代理檔超過預算，已刪除: {os.path.basename(p)}")
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  Tk 字幕庫搜尋視窗
+# ===================================================================================
+#
+#  說明：
+#  三個 Tk 版播放器共用的搜尋視窗，查詢 TranscriptIndex 並列出符合的影片與時間。
+#  1. 開啟時在背景執行緒增量更新索引 (只重新索引有變動的字幕)，完成後自動重新查詢；
+#     更新期間仍可用既有的索引查詢。
+#  2. 輸入時延遲 250 ms 再查詢，避免每個按鍵都查一次。
+#  3. 在結果上按兩下 (或 Enter) 呼叫 on_open(影片, 開始毫秒)，由播放器開啟影片並跳到該句。
+#
+# ===================================================================================
+
+import os, threading
+import tkinter as tk
+from tkinter import ttk, filedialog
+
+SEARCH_LIMIT = 200
+
+def format_ms(ms):
+    s = int(ms) // 1000
+    return f"{s // 3600:d}:{s // 60 % 60:02d}:{s % 60:02d}"
+
+class SearchDialog(tk.Toplevel):
+    def __init__(self, parent, index, library_dirs, on_open):
+        '''library_dirs: 要索引的資料夾列表 (會直接加入使用者新增的資料夾)。'''
+        super().__init__(parent)
+        self.title("搜尋字幕庫")
+        self.geometry("820x460")
+        self.index, self.library_dirs, self.on_open = index, library_dirs, on_open
+        self.hits, self.search_job = [], None
+
+        top = tk.Frame(self); top.pack(fill="x", padx=10, pady=(10, 5))
+        self.query_var = tk.StringVar()
+        entry = ttk.Entry(top, textvariable=self.query_var); entry.pack(side="left", fill="x", expand=True)
+        entry.bind("<KeyRelease>", lambda event: self.schedule_search())
+        entry.bind("<Return>", lambda event: self.search())
+        ttk.Button(top, text="加入資料夾...", command=self.add_directory).pack(side="left", padx=(5, 0))
+        entry.focus_set()
+
+        self.tree = ttk.Treeview(self, columns=("video", "time", "text"), show="headings")
+        for column, text, width in (("video", "影片", 200), ("time", "時間", 70), ("text", "字幕", 500)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor="center" if column == "time" else "w", stretch=column == "text")
+        self.tree.pack(fill="both", expand=True, padx=10)
+        self.tree.bind("<Double-1>", lambda event: self.open_selected())
+        self.tree.bind("<Return>", lambda event: self.open_selected())
+        self.status = tk.Label(self, anchor="w"); self.status.pack(fill="x", padx=10, pady=5)
+
+        self.bind("<<IndexUpdated>>", lambda event: self.on_index_updated())
+        self.refresh()
+
+    def refresh(self):
+        '''在背景執行緒增量更新索引。'''
+        self.status.config(text="正在更新字幕索引...")
+        dirs = list(self.library_dirs)
+        def work():
+            try: self.index.update(dirs)
+            finally:
+                try: self.event_generate("<<IndexUpdated>>", when="tail")
+                except tk.TclError: pass  # 視窗已關閉
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_index_updated(self):
+        videos, cues = self.index.stats()
+        self.status.config(text=f"已索引 {videos} 部影片、{cues} 句字幕")
+        if self.query_var.get().strip(): self.search()
+
+    def add_directory(self):
+        path = filedialog.askdirectory(parent=self)
+        if path and path not in self.library_dirs:
+            self.library_dirs.append(path)
+            self.refresh()
+
+    def schedule_search(self):
+        if self.search_job: self.after_cancel(self.search_job)
+        self.search_job = self.after(250, self.search)
+
+    def search(self):
+        self.search_job = None
+        self.hits = self.index.search(self.query_var.get(), limit=SEARCH_LIMIT)
+        self.tree.delete(*self.tree.get_children())
+        for i, hit in enumerate(self.hits):
+            self.tree.insert("", "end", iid=str(i), values=(os.path.basename(hit['video']), format_ms(hit['start']), hit['text'].replace("\n", " / ")))
+        self.status.config(text=f"找到 {len(self.hits)} 句" + (" (只顯示前面的結果)" if len(self.hits) >= SEARCH_LIMIT else ""))
+
+    def open_selected(self):
+        selection = self.tree.selection()
+        if selection:
+            hit = self.hits[int(selection[0])]
+            self.on_open(hit['video'], hit['start'])
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  字幕編解碼器 (SRT / WebVTT / ASS)
+# ===================================================================================
+#
+#  說明：
+#  取代 pysrt 的輕量字幕讀寫模組，供各版本播放器共用。
+#  1. 以單一預先編譯的正規表示式掃描全文，時間碼直接轉成整數毫秒。
+#  2. 容忍 whisper.cpp 常見的格式瑕疵：缺少序號、缺少空行、毫秒位數不足、
+#     逗號/句點混用、BOM 與 \r\n 換行、結束時間早於開始時間等。
+#  3. 寫出時先組成完整字串再一次寫入，避免逐行 f.write。
+#     有逐字時間 (cue['words']) 時可寫成 ASS，把原文依詞切成連續的時間片段，每段只把當下唸的詞
+#     變色，VLC (libass) 的顯示與 OpenCV / PyQt 播放器的逐字高亮相同。
+#  4. 直接執行本檔 (`python subtitle_codec.py`) 可對 10k 條字幕與 pysrt 進行效能比較。
+#
+#  字幕資料格式與播放器一致：
+#  [{'start': 毫秒, 'end': 毫秒, 'original': 原文, 'translated': 翻譯}, ...]
+#
+# ===================================================================================
+
+import re, time
+
+_TIMESTAMP = r'(\d+:)?(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+_CUE_RE = re.compile(
+    r'^[ \t]*' + _TIMESTAMP + r'[ \t]*-->[ \t]*' + _TIMESTAMP + r'[^\n]*'
+    # 字幕內文 (不含時間碼那一行的換行，內文是空的時也能認出緊接的下一句)：直到空行、下一組 (可含序號的) 時間碼或檔尾為止
+    r'(.*?)(?=\n[ \t]*\n|\n(?:[ \t]*\d+[ \t]*\n)?[ \t]*(?:\d+:)?\d{1,2}:\d{1,2}[,.]\d{1,3}[ \t]*-->|\n?\Z)',
+    re.M | re.S)
+_TAG_RE = re.compile(r'</?[a-zA-Z][^>]*>')
+
+def _to_ms(h, m, s, frac):
+    return (int(h[:-1]) * 3600000 if h else 0) + int(m) * 60000 + int(s) * 1000 + int(frac.ljust(3, '0'))
+
+def parse_srt(text):
+    '''解析 SRT (或 WebVTT) 文字，回傳以毫秒為單位的字幕清單。'''
+    text = text.lstrip('﻿').replace('\r\n', '\n').replace('\r', '\n')
+    cues = []
+    for m in _CUE_RE.finditer(text):
+        body = _TAG_RE.sub('', m.group(9)).strip()
+        if not body:
+            continue
+        start = _to_ms(*m.group(1, 2, 3, 4))
+        end = _to_ms(*m.group(5, 6, 7, 8))
+        cues.append({'start': start, 'end': end if end >= start else start, 'original': body, 'translated': ''})
+    return cues
+
+parse_vtt = parse_srt
+
+def load_srt(path, encoding='utf-8'):
+    '''讀取字幕檔；無法解碼的位元組會被替換，而不是讓整個流程失敗。'''
+    with open(path, 'r', encoding=encoding, errors='replace') as f:
+        return parse_srt(f.read())
+
+def format_timestamp(ms, sep=','):
+    h, ms = divmod(max(0, int(ms)), 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+def _cue_text(cue):
+    translated = cue.get('translated')
+    return f"{cue['original']}\n{translated}" if translated else cue['original']
+
+def format_srt(cues):
+    return ''.join(f"{i}\n{format_timestamp(c['start'])} --> {format_timestamp(c['end'])}\n{_cue_text(c)}\n\n"
+                   for i, c in enumerate(cues, 1))
+
+def format_vtt(cues):
+    return 'WEBVTT\n\n' + ''.join(f"{format_timestamp(c['start'], '.')} --> {format_timestamp(c['end'], '.')}\n{_cue_text(c)}\n\n"
+                                  for c in cues)
+
+_ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1280
+PlayResY: 720
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Original,Arial,40,&H00FFFFFF,&H00FFFFFF,&H00000000,&H96000000,0,0,0,0,100,100,0,0,1,2,1,2,20,20,20,1
+Style: Translated,Arial,34,&H0096DCDC,&H0096DCDC,&H00000000,&H96000000,0,0,0,0,100,100,0,0,1,2,1,2,20,20,20,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+def _ass_time(ms):
+    h, ms = divmod(max(0, int(ms)), 3600000)
+    m, ms = divmod(ms, 60000)
+    return f"{h:d}:{m:02d}:{ms // 1000:02d}.{ms % 1000 // 10:02d}"
+
+def _ass_text(text):
+    return text.replace('{', '(').replace('}', ')').replace('\n', '\\N')
+
+_ASS_HIGHLIGHT = "&H0028C8FF&"  # 與 SubtitleRenderer 的 highlight (255, 200, 40) 相同，ASS 為 BGR
+
+def _word_slices(cue):
+    '''回傳 [(開始, 結束, ASS 文字), ...]：連續的時間片段，詞唸到的期間只有該詞變色，其餘時間為一般原文。'''
+    text, slices, t = cue['original'], [], cue['start']
+    for start, end, char_start, char_end in cue['words']:
+        start, end = max(start, t), min(end, cue['end'])
+        if end <= start: continue
+        if start > t: slices.append((t, start, _ass_text(text)))
+        slices.append((start, end, f"{_ass_text(text[:char_start])}{{\\1c{_ASS_HIGHLIGHT}}}{_ass_text(text[char_start:char_end])}"
+                                   f"{{\\r}}{_ass_text(text[char_end:])}"))
+        t = end
+    if t < cue['end'] or not slices: slices.append((t, cue['end'], _ass_text(text)))
+    return slices
+
+def format_ass(cues):
+    '''寫成 ASS：原文與翻譯各為事件 (libass 會自動上下排開，原文在上)；有逐字時間的原文切成多個首尾相接的事件。'''
+    events = []
+    for c in cues:
+        # 同時顯示的底部事件由先到後往上疊，翻譯先寫才會在原文下方；之後接續的原文片段沿用同一個位置
+        if c.get('translated'): events.append(f"Dialogue: 0,{_ass_time(c['start'])},{_ass_time(c['end'])},Translated,,0,0,0,,{_ass_text(c['translated'])}\n")
+        slices = _word_slices(c) if c.get('words') else [(c['start'], c['end'], _ass_text(c['original']))]
+        events.extend(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Original,,0,0,0,,{text}\n" for start, end, text in slices)
+    return _ASS_HEADER + ''.join(events)
+
+def save_srt(path, cues):
+    with open(path, 'w', encoding='utf-8') as f: f.write(format_srt(cues))
+
+def save_vtt(path, cues):
+    with open(path, 'w', encoding='utf-8') as f: f.write(format_vtt(cues))
+
+# --- 效能比較 ---
+def _synthetic_srt(n_cues):
+    return format_srt([{'start': i * 2000, 'end': i * 2000 + 1800, 'original': f"テスト字幕 {i} 行目", 'translated': f"測試字幕第 {i} 行"}
+                       for i in range(n_cues)])
+
+def benchmark(n_cues=10000, repeat=5):
+    text = _synthetic_srt(n_cues)
+    def best_of(fn):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+        return best * 1000
+    cues = parse_srt(text)
+    results = {'codec_parse_ms': best_of(lambda: parse_srt(text)), 'codec_format_ms': best_of(lambda: format_srt(cues))}
+    try:
+        import pysrt
+    except ImportError:
+        pysrt = None
+    if pysrt:
+        subs = pysrt.from_string(text)
+        results['pysrt_parse_ms'] = best_of(lambda: pysrt.from_string(text))
+        results['pysrt_to_ms_ms'] = best_of(lambda: [(s.start.ordinal, s.end.ordinal) for s in subs])
+        def pysrt_write():
+            return ''.join(f"{i+1}\n{s.start} --> {s.end}\n{s.text}\n\n" for i, s in enumerate(subs))
+        results['pysrt_format_ms'] = best_of(pysrt_write)
+    return results
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"[BENCH] {name}: {value:.1f}")
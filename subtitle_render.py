@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  字幕疊加與逐字高亮 (OpenCV 版播放器)
+# ===================================================================================
+#
+#  說明：
+#  取代每一格都把整張影格轉成 PIL、重新量字與畫字的 draw_subtitle_on_image()。
+#  1. 每句字幕只以 PIL 畫一次：一般版與「原文全部高亮」版兩張字幕條，轉成預先乘上
+#     alpha 的 numpy 陣列並快取 (依文字與影格大小，最多保留 max_cached 句)。
+#  2. 每一格只把字幕條以整數運算疊到影格底部；有逐字時間時，再把目前這個詞的
+#     小方塊從高亮版疊上去，逐字追蹤幾乎不增加成本。
+#  3. 疊加直接在 BGR 影格上進行，呼叫端需傳入可以修改的影格 (快取中的影格要先複製)。
+#
+# ===================================================================================
+
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw
+from word_timing import word_at
+
+class _Layer:
+    def __init__(self, premul, inv_alpha, boxes):
+        self.premul, self.inv_alpha, self.boxes = premul, inv_alpha, boxes
+
+class SubtitleRenderer:
+    def __init__(self, fonts, padding=20, bg_color=(0, 0, 0, 150), colors=((255, 255, 255), (220, 220, 150)),
+                 highlight=(255, 200, 40), max_cached=16):
+        '''fonts: {'original': 字型, 'translated': 字型}；colors 為 (原文, 翻譯) 的顏色。'''
+        self.fonts, self.padding, self.bg_color = fonts, padding, bg_color
+        self.colors, self.highlight = colors, highlight
+        self.cache, self.max_cached = OrderedDict(), max_cached
+
+    def draw(self, frame, cue, ms):
+        '''把字幕 (與 ms 時正在唸的詞) 疊到 BGR 影格底部，直接修改 frame。'''
+        frame_h, frame_w = frame.shape[:2]
+        base, marked = self._layers(cue, frame_w)
+        band_h = min(base.premul.shape[0], frame_h)
+        top = frame_h - base.premul.shape[0]
+        i = word_at(cue.get('words'), ms)
+        box = marked.boxes[i] if i >= 0 else None
+        if box and (box[1] + top < 0 or box[0] >= frame_w): box = None
+        if box:
+            x0, y0, x1, y1 = box[0], box[1], min(box[2], frame_w), box[3]
+            word_roi = frame[top + y0:top + y1, x0:x1]
+            original = word_roi.copy()  # 詞的方塊要從原始影格疊高亮版，不能疊兩次背景
+        self._blend(frame[frame_h - band_h:], base, slice(-band_h, None), slice(None))
+        if box:
+            word_roi[:] = original
+            self._blend(word_roi, marked, slice(y0, y1), slice(x0, x1))
+
+    @staticmethod
+    def _blend(roi, layer, rows, cols):
+        premul, inv_alpha = layer.premul[rows, cols], layer.inv_alpha[rows, cols]
+        roi[:] = ((roi * inv_alpha + premul) // 255).astype(np.uint8)
+
+    def _layers(self, cue, frame_w):
+        key = (cue['original'], cue.get('translated') or '', bool(cue.get('words')), frame_w)
+        layers = self.cache.get(key)
+        if layers is None:
+            layers = self.cache[key] = self._render(cue, frame_w)
+            if len(self.cache) > self.max_cached: self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return layers
+
+    def _render(self, cue, frame_w):
+        original, translated = cue['original'], cue.get('translated') or ''
+        font, font_tr = self.fonts['original'], self.fonts['translated']
+        measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+        bbox = measure.textbbox((0, 0), original, font=font)
+        original_h = bbox[3] - bbox[1]
+        translated_h = 0
+        if translated:
+            bbox = measure.textbbox((0, 0), translated, font=font_tr)
+            translated_h = bbox[3] - bbox[1]
+        total_h = original_h + translated_h + 30
+        y = 15
+
+        images = []
+        for color in (self.colors[0], self.highlight):
+            img = Image.new('RGBA', (frame_w, total_h), self.bg_color)
+            draw = ImageDraw.Draw(img)
+            draw.text((self.padding, y), original, font=font, fill=color)
+            if translated: draw.text((self.padding, y + original_h + 5), translated, font=font_tr, fill=self.colors[1])
+            images.append(img)
+
+        # 詞的方塊：依字元位置量出前綴寬度；原文有多行時以行高推算所在的行
+        lines = original.split('\n')
+        line_h = original_h / len(lines)
+        boxes = []
+        for _, _, start, end in cue.get('words') or ():
+            line = original.count('\n', 0, start)
+            line_start = original.rfind('\n', 0, start) + 1
+            x0 = self.padding + int(font.getlength(original[line_start:start]))
+            x1 = self.padding + int(np.ceil(font.getlength(original[line_start:end])))
+            y0 = max(0, int(y + line * line_h) - 2)
+            boxes.append((x0, y0, max(x0 + 1, x1), min(total_h, int(y + (line + 1) * line_h) + 8)))
+        return tuple(_Layer(*self._premultiply(img), boxes) for img in images)
+
+    @staticmethod
+    def _premultiply(img):
+        '''RGBA 圖片 -> (BGR * alpha, 255 - alpha)，皆為 uint16 以便整數疊加。'''
+        rgba = np.asarray(img, dtype=np.uint16)
+        alpha = rgba[..., 3:4]
+        return rgba[..., 2::-1] * alpha, 255 - alpha
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# 輔助模組都放在專案根目錄，測試時加入匯入路徑
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
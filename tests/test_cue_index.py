@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from cue_index import CueIndex
+
+def make():
+    # 刻意不依開始時間排列，編號仍對應原清單
+    return CueIndex([(3000, 4000), (1000, 2000), (5000, 5000)])
+
+def test_find_inclusive_end():
+    index = make()
+    assert [index.find(ms) for ms in (0, 1000, 2000, 2001, 3500, 5000, 5001)] == [-1, 1, 1, -1, 0, 2, -1]
+
+def test_next_and_prev_cue():
+    index = make()
+    assert index.next_cue(0) == 1 and index.next_cue(1000) == 0 and index.next_cue(5000) == -1
+    assert index.prev_cue(3200) == 1    # 本句才開始不到 500 ms，跳到上一句
+    assert index.prev_cue(3800) == 0    # 否則回到本句開頭
+    assert index.prev_cue(100) == 1
+
+def test_next_boundary():
+    index = make()
+    assert [index.next_boundary(ms) for ms in (0, 1000, 2001, 4001, 5001)] == [1000, 2001, 3000, 5000, None]
+
+def test_empty_and_from_cues():
+    assert len(CueIndex([])) == 0 and CueIndex([]).find(0) == -1 and CueIndex([]).prev_cue(0) == -1
+    index = CueIndex.from_cues([{'start': 10, 'end': 20}])
+    assert len(index) == 1 and index.find(15) == 0
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import threading
+from lazy_translate import LazyTranslation
+
+class FakeTranslator:
+    def __init__(self, calls, gate=None, fail=False):
+        self.calls, self.gate, self.fail = calls, gate, fail
+
+    def translate_batch(self, texts):
+        if self.gate: self.gate.wait(5)
+        if self.fail: raise RuntimeError("offline")
+        self.calls.append(list(texts))
+        return [t.upper() for t in texts]
+
+def spans(n):
+    return [(i * 1000, i * 1000 + 900) for i in range(n)]
+
+def test_translates_all_pending_starting_at_position():
+    calls, positioned = [], threading.Event()
+    def make_translator():
+        positioned.wait(5)  # 工作執行緒在設定播放位置之後才開始選第一批
+        return FakeTranslator(calls)
+    texts = [f"t{i}" for i in range(10)]
+    lazy = LazyTranslation(make_translator, spans(10), texts, pending=range(10), notify=lambda: None, batch_size=4, first_batch=2)
+    lazy.set_position(6500)
+    positioned.set()
+    lazy.thread.join(5)
+    # 從正在顯示的這一句往後翻譯，批次逐漸變大，最後才回頭補播放位置之前的字幕
+    assert calls == [["t6", "t7"], ["t8", "t9", "t0", "t1"], ["t2", "t3", "t4", "t5"]]
+    assert lazy.remaining == 0
+    assert sorted(lazy.drain()) == [(i, f"T{i}") for i in range(10)]
+    assert lazy.drain() == []
+
+def test_only_pending_cues_are_translated():
+    calls = []
+    lazy = LazyTranslation(lambda: FakeTranslator(calls), spans(5), ["a", "b", "c", "d", "e"], pending=[1, 3], notify=lambda: None)
+    lazy.thread.join(5)
+    assert sorted(lazy.drain()) == [(1, "B"), (3, "D")]
+
+def test_stop_discards_in_flight_batch():
+    calls, gate = [], threading.Event()
+    lazy = LazyTranslation(lambda: FakeTranslator(calls, gate), spans(4), list("abcd"), pending=range(4), notify=lambda: None)
+    lazy.stop()
+    gate.set()
+    lazy.thread.join(5)
+    assert lazy.drain() == [] and lazy.remaining == 4
+
+def test_translator_error_stops_quietly():
+    lazy = LazyTranslation(lambda: FakeTranslator([], fail=True), spans(3), list("abc"), pending=range(3), notify=lambda: None)
+    lazy.thread.join(5)
+    assert not lazy.thread.is_alive() and lazy.remaining == 3
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+from proxy_cache import ProxyCache, proxy_height, proxy_command
+
+def test_proxy_height():
+    assert proxy_height(3840, 2160, 1280, 720) == 720
+    assert proxy_height(3840, 2160, 800, 450) == 540
+    assert proxy_height(1920, 1080, 1, 1) == 720          # 畫布尚未配置
+    assert proxy_height(1280, 720, 1280, 720) is None     # 原始影片不比代理檔大多少
+    assert proxy_height(0, 0, 1280, 720) is None
+
+def test_proxy_command():
+    cmd = proxy_command("ffmpeg", "in.mp4", "out.mp4", 540, 29.97, gop=1)
+    assert cmd[0] == "ffmpeg" and cmd[-1] == "out.mp4"
+    assert cmd[cmd.index("-vf") + 1] == "scale=-2:540" and cmd[cmd.index("-g") + 1] == "1" and "-an" in cmd
+
+def fake_ffmpeg(size):
+    def run(command):
+        with open(command[-1], 'wb') as f: f.write(b'\0' * size)
+    return run
+
+def test_build_and_lookup(tmp_path):
+    video = tmp_path / "movie.mp4"
+    video.write_bytes(b'video')
+    cache = ProxyCache(root=str(tmp_path / "proxies"))
+    assert cache.lookup(str(video), 540) is None
+    path = cache.build(str(video), 540, 25.0, fake_ffmpeg(10))
+    assert os.path.basename(path).startswith("movie_540p_") and not os.path.exists(path + ".part")
+    assert cache.lookup(str(video), 540) == path and cache.lookup(str(video), 720) is None
+    video.write_bytes(b'replaced video')                   # 原始影片被替換時不再使用舊代理檔
+    assert cache.lookup(str(video), 540) is None
+
+def test_failed_build_leaves_no_partial_file(tmp_path):
+    video = tmp_path / "movie.mp4"
+    video.write_bytes(b'video')
+    cache = ProxyCache(root=str(tmp_path / "proxies"))
+    def run(command):
+        open(command[-1], 'wb').close()
+        raise RuntimeError("cancelled")
+    with pytest.raises(RuntimeError):
+        cache.build(str(video), 540, 25.0, run)
+    assert os.listdir(cache.root) == []
+
+def test_evict_oldest_over_budget(tmp_path):
+    cache = ProxyCache(root=str(tmp_path / "proxies"), budget_mb=3)
+    paths = []
+    for i in range(3):
+        video = tmp_path / f"v{i}.mp4"
+        video.write_bytes(b'video')
+        paths.append(cache.build(str(video), 540, 25.0, fake_ffmpeg(1048576)))
+        os.utime(paths[-1], (1000 + i, 1000 + i))
+    cache.budget = 2 * 1048576
+    cache.evict(keep=paths[0])
+    assert [os.path.exists(p) for p in paths] == [True, False, True]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from subtitle_codec import parse_srt, load_srt, format_srt, format_vtt, format_ass, format_timestamp
+
+SRT = "1\n00:00:01,000 --> 00:00:02,500\nHello\n\n2\n00:00:03,000 --> 00:00:04,000\n<i>Two</i>\nlines\n\n"
+
+def test_parse_srt_basic():
+    cues = parse_srt(SRT)
+    assert [(c['start'], c['end'], c['original']) for c in cues] == [(1000, 2500, 'Hello'), (3000, 4000, 'Two\nlines')]
+    assert all(c['translated'] == '' for c in cues)
+
+def test_parse_srt_crlf_bom_and_missing_blank_line():
+    text = "﻿1\r\n00:00:01,000 --> 00:00:02,000\r\nA\r\n2\r\n00:00:02,000 --> 00:00:03,000\r\nB"
+    assert [c['original'] for c in parse_srt(text)] == ['A', 'B']
+
+def test_parse_srt_empty_cue_does_not_take_next_index():
+    text = "1\n00:00:01,000 --> 00:00:02,000\n\n2\n00:00:03,000 --> 00:00:04,000\nB\n"
+    assert [(c['start'], c['original']) for c in parse_srt(text)] == [(3000, 'B')]
+    text = "1\n00:00:01,000 --> 00:00:02,000\n2\n00:00:03,000 --> 00:00:04,000\nB\n"
+    assert [(c['start'], c['original']) for c in parse_srt(text)] == [(3000, 'B')]
+
+def test_parse_vtt_short_timestamps_and_reversed_end():
+    cues = parse_srt("WEBVTT\n\n01:02.5 --> 01:01.000 align:start\nX\n")
+    assert (cues[0]['start'], cues[0]['end']) == (62500, 62500)
+
+def test_format_timestamp():
+    assert format_timestamp(3723004) == "01:02:03,004"
+    assert format_timestamp(-5, '.') == "00:00:00.000"
+
+def test_srt_round_trip(tmp_path):
+    cues = [{'start': 0, 'end': 1500, 'original': 'Hi', 'translated': '你好'},
+            {'start': 2000, 'end': 3000, 'original': 'Bye', 'translated': ''}]
+    path = tmp_path / "a.srt"
+    path.write_text(format_srt(cues), encoding='utf-8')
+    back = load_srt(str(path))
+    assert [(c['start'], c['end'], c['original']) for c in back] == [(0, 1500, 'Hi\n你好'), (2000, 3000, 'Bye')]
+
+def test_format_vtt():
+    out = format_vtt([{'start': 1000, 'end': 2000, 'original': 'A', 'translated': ''}])
+    assert out == "WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nA\n\n"
+
+def test_format_ass_translation_before_original():
+    out = format_ass([{'start': 0, 'end': 1000, 'original': 'a{b}\nc', 'translated': 'T'}])
+    events = [line for line in out.splitlines() if line.startswith('Dialogue:')]
+    assert events == ["Dialogue: 0,0:00:00.00,0:00:01.00,Translated,,0,0,0,,T",
+                      "Dialogue: 0,0:00:00.00,0:00:01.00,Original,,0,0,0,,a(b)\\Nc"]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import os
+from transcript_index import TranscriptIndex, tokenize, build_query, find_subtitle, scan_videos
+
+def write_video(folder, name, srt, suffix='.srt'):
+    video = folder / name
+    video.write_bytes(b'')
+    (folder / (os.path.splitext(name)[0] + suffix)).write_text(srt, encoding='utf-8')
+    return str(video)
+
+def srt(*cues):
+    return ''.join(f"{i}\n00:00:{s:02d},000 --> 00:00:{s + 1:02d},000\n{text}\n\n" for i, (s, text) in enumerate(cues, 1))
+
+def test_tokenize_and_build_query():
+    assert tokenize("Hello 你好嗎") == "hello 你好 好嗎 嗎"
+    assert build_query("Hello 你好") == '"hello"* "你好"'
+    assert build_query("你") == '"你"*'
+    assert build_query("  ") == ''
+
+def test_find_subtitle_prefers_combined(tmp_path):
+    video = write_video(tmp_path, "a.mp4", srt((1, "x")))
+    (tmp_path / "a_combined.srt").write_text(srt((1, "x")), encoding='utf-8')
+    assert find_subtitle(video) == str(tmp_path / "a_combined.srt")
+    assert find_subtitle(str(tmp_path / "none.mp4")) is None
+
+def test_scan_videos_only_with_subtitles(tmp_path):
+    video = write_video(tmp_path, "a.mkv", srt((1, "x")))
+    (tmp_path / "b.mp4").write_bytes(b'')
+    assert scan_videos([str(tmp_path)]) == [(video, str(tmp_path / "a.srt"))]
+
+def test_update_search_and_remove(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+    b = write_video(media, "b.mp4", srt((5, "hello again"), (1, "Hello there")))
+    a = write_video(media, "a.mp4", srt((3, "今天天氣很好"), (2, "say hello")))
+    index = TranscriptIndex(str(tmp_path / "index.db"))
+    try:
+        assert index.update([str(media)]) == (2, 0)
+        assert index.update([str(media)]) == (0, 0)          # 沒有變動時不重新索引
+        hits = index.search("hel")
+        assert [(os.path.basename(h['video']), h['start']) for h in hits] == [("a.mp4", 2000), ("b.mp4", 1000), ("b.mp4", 5000)]
+        assert [h['text'] for h in index.search("天氣")] == ["今天天氣很好"]
+        assert index.search("氣很好") and not index.search("天好")
+        assert index.stats() == (2, 4)
+        os.remove(os.path.splitext(a)[0] + ".srt")
+        assert index.update([str(media)]) == (0, 1)
+        assert index.search("天氣") == [] and index.stats() == (1, 2)
+        assert [h['video'] for h in index.search("again")] == [b]
+    finally:
+        index.close()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from cue_index import CueIndex
+from ui_update import UiUpdater, slider_step, next_tick_interval
+
+def test_ui_updater_renders_only_changes():
+    calls = []
+    ui = UiUpdater(slider=calls.append)
+    ui.render(slider=1); ui.render(slider=1); ui.render(slider=2)
+    ui.invalidate('slider'); ui.render(slider=2)
+    assert calls == [1, 2, 2]
+
+def test_slider_step():
+    assert slider_step(5000, 10000, 600) == 300 and slider_step(20000, 10000, 600) == 600 and slider_step(5, 0, 600) == 0
+
+def test_short_video_without_cue_change_ticks_slowly():
+    # 10 秒的影片、600 像素的進度條：每格約 17 ms，但進度條最多每 100 ms 更新一次
+    assert next_tick_interval(5000, 10000, 600) == 100
+
+def test_cue_boundary_is_exact():
+    index = CueIndex([(5030, 6000)])
+    assert next_tick_interval(5000, 10000, 600, index) == 30
+    assert next_tick_interval(5000, 10000, 600, index, rate=2.0) == 15
+    assert next_tick_interval(5000, 10000, 600, CueIndex([(5001, 6000)])) == 15   # min_ms
+
+def test_long_video_waits_for_next_pixel_or_max():
+    assert next_tick_interval(0, 3600000, 600) == 1000
+    assert next_tick_interval(0, 0, 600) == 1000
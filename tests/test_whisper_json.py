@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import json
+from whisper_json import parse_whisper_json, load_transcript
+
+def token(start, end, text, p):
+    return {'text': text, 'offsets': {'from': start, 'to': end}, 'p': p}
+
+DATA = {
+    'result': {'language': 'en'},
+    'transcription': [
+        {'text': ' Hello world', 'offsets': {'from': 0, 'to': 1000},
+         'tokens': [token(0, 0, '[_BEG_]', 0.1), token(0, 400, ' Hello', 0.8), token(400, 1000, ' world', 0.6)]},
+        {'text': '  ', 'offsets': {'from': 1000, 'to': 1500}, 'tokens': []},
+        {'text': 'Bye', 'offsets': {'from': 2000, 'to': 1900}},
+    ],
+}
+
+def test_parse_whisper_json():
+    cues, language = parse_whisper_json(DATA)
+    assert language == 'en' and len(cues) == 2
+    first, second = cues
+    assert (first['start'], first['end'], first['original'], first['translated']) == (0, 1000, 'Hello world', '')
+    assert abs(first['confidence'] - 0.7) < 1e-9     # 特殊 token 不計入
+    assert first['words'] == ((0, 400, 0, 5), (400, 1000, 6, 11))
+    assert (second['end'], second['confidence'], second['words']) == (2000, None, ())
+
+def test_language_falls_back_to_params():
+    assert parse_whisper_json({'params': {'language': 'ja'}})[1] == 'ja'
+    assert parse_whisper_json({}) == ([], None)
+
+def test_load_transcript(tmp_path):
+    path = tmp_path / "out.json"
+    path.write_text(json.dumps(DATA), encoding='utf-8')
+    cues, language = load_transcript(str(path))
+    assert language == 'en' and [c['original'] for c in cues] == ['Hello world', 'Bye']
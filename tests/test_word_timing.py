@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from word_timing import segment_tokens, group_words, align_words, word_at
+from subtitle_codec import format_ass
+
+def token(start, end, text, p=0.9):
+    return {'text': text, 'offsets': {'from': start, 'to': end}, 'p': p}
+
+def test_segment_tokens_skips_special_tokens():
+    segment = {'tokens': [token(0, 0, '[_BEG_]'), token(0, 100, ' Hi'), token(100, 100, '<|endoftext|>'), token(100, 200, '')]}
+    assert segment_tokens(segment) == [(0, 100, ' Hi')]
+
+def test_group_words_latin_and_cjk():
+    tokens = [(0, 100, ' Hel'), (100, 200, 'lo'), (200, 300, ' world'), (300, 400, '你'), (400, 500, '好')]
+    assert group_words(tokens) == [(0, 200, ' Hello'), (200, 300, ' world'), (300, 400, '你'), (400, 500, '好')]
+
+def test_align_words_skips_missing_words():
+    words = [(0, 100, ' Hello'), (100, 200, ' ???'), (200, 300, ' world')]
+    assert align_words("Hello, world", words) == ((0, 100, 0, 5), (200, 300, 7, 12))
+
+def test_word_at():
+    words = ((0, 100, 0, 5), (200, 300, 7, 12))
+    assert [word_at(words, ms) for ms in (0, 99, 100, 250, 300)] == [0, 0, -1, 1, -1]
+    assert word_at(None, 0) == -1
+
+def test_format_ass_word_slices_are_contiguous():
+    cue = {'start': 0, 'end': 3000, 'original': 'one two', 'translated': '', 'words': ((500, 1000, 0, 3), (1000, 2000, 4, 7))}
+    events = [line.split(',', 9) for line in format_ass([cue]).splitlines() if line.startswith('Dialogue:')]
+    assert [(e[1], e[2]) for e in events] == [("0:00:00.00", "0:00:00.50"), ("0:00:00.50", "0:00:01.00"),
+                                              ("0:00:01.00", "0:00:02.00"), ("0:00:02.00", "0:00:03.00")]
+    assert [e[9] for e in events] == ["one two", "{\\1c&H0028C8FF&}one{\\r} two", "one {\\1c&H0028C8FF&}two{\\r}", "one two"]
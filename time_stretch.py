@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  WSOLA 時間伸縮 (保持音高的變速播放)
+# ===================================================================================
+#
+#  說明：
+#  以 WSOLA (Waveform Similarity Overlap-Add) 改變播放速度但不改變音高，
+#  供 PcmAudioPlayer 在背景執行緒預先處理 numpy PCM 區塊。
+#  1. 輸出端以固定步長 Hs (半個視窗) 疊加 Hann 視窗的音框；
+#     輸入端每個音框前進 Hs * rate，因此 rate > 1 時變快、rate < 1 時變慢。
+#  2. 每個音框在 ±tolerance 範圍內以 np.correlate 一次算出所有候選位移的相關值，
+#     選擇與上一音框「自然延續」最相似的位置，避免相位不連續造成的雜音。
+#  3. 為串流設計：可連續餵入區塊，內部保留不足一個音框的輸入與重疊尾端，
+#     因此輸出相對輸入約有一個視窗長度的延遲。
+#
+# ===================================================================================
+
+import numpy as np
+
+class WsolaStretcher:
+    def __init__(self, sample_rate, channels, win_ms=40, tolerance_ms=10):
+        self.N = max(64, int(sample_rate * win_ms / 1000) // 2 * 2)
+        self.Hs = self.N // 2
+        self.tolerance = max(1, int(sample_rate * tolerance_ms / 1000))
+        self.channels = channels
+        # 週期性 Hann 視窗在 50% 重疊時總和恰為 1
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.N) / self.N)).astype(np.float32)[:, None]
+        self.reset()
+
+    def reset(self):
+        self.buf = np.zeros((0, self.channels), np.float32)
+        self.buf_start = 0        # buf[0] 對應的絕對輸入樣本
+        self.pos = 0.0            # 下一個音框的名目輸入位置
+        self.prev_end = None      # 上一個音框的自然延續位置
+        self.ola = np.zeros((self.N, self.channels), np.float32)
+
+    def process(self, block, rate):
+        '''餵入一段 int16 PCM，回傳目前可輸出的 int16 PCM (可能為空)。'''
+        self.buf = np.concatenate([self.buf, block.astype(np.float32)])
+        buf_end = self.buf_start + len(self.buf)
+        out = []
+        while True:
+            nominal = int(self.pos)
+            lo = max(self.buf_start, nominal - self.tolerance)
+            hi = nominal + self.tolerance
+            need = hi + self.N if self.prev_end is None else max(hi, self.prev_end) + self.N
+            if need > buf_end: break
+            if self.prev_end is None:
+                chosen = max(self.buf_start, nominal)
+            else:
+                ref = self.buf[self.prev_end - self.buf_start:self.prev_end - self.buf_start + self.N].mean(axis=1)
+                region = self.buf[lo - self.buf_start:hi + self.N - self.buf_start].mean(axis=1)
+                chosen = lo + int(np.argmax(np.correlate(region, ref, 'valid')))
+            self.ola += self.buf[chosen - self.buf_start:chosen - self.buf_start + self.N] * self.window
+            out.append(self.ola[:self.Hs].copy())
+            self.ola = np.concatenate([self.ola[self.Hs:], np.zeros((self.Hs, self.channels), np.float32)])
+            self.prev_end = chosen + self.Hs
+            self.pos += self.Hs * rate
+        # 丟棄之後不會再用到的輸入
+        keep_from = min(int(self.pos) - self.tolerance, self.prev_end if self.prev_end is not None else int(self.pos))
+        drop = max(0, keep_from - self.buf_start)
+        if drop:
+            self.buf = self.buf[drop:]
+            self.buf_start += drop
+        if not out:
+            return np.zeros((0, self.channels), np.int16)
+        return np.clip(np.concatenate(out), -32768, 32767).astype(np.int16)
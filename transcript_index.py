@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  字幕全文索引 (SQLite FTS5)
+# ===================================================================================
+#
+#  說明：
+#  影片庫裡的字幕檔多了以後，要找某句話在哪部影片、哪個時間點出現，只能逐一打開字幕。
+#  TranscriptIndex 把各影片旁的字幕存進磁碟上的 SQLite FTS5 反向索引，查詢只需數毫秒。
+#  1. 每部影片只索引一個字幕檔，依序優先使用 _combined.srt (含翻譯)、.srt、_orig.srt。
+#  2. update() 只重新索引 mtime 或大小有變的字幕，已刪除的影片從索引移除，
+#     重複呼叫的成本只有掃描資料夾與 stat。
+#  3. FTS5 內建的 unicode61 斷詞會把整段中日韓文字當成一個詞，因此中日韓文字先切成
+#     重疊的兩字詞 (bigram) 再存入；查詢時以相同方式切成片語，一到多字的查詢都能命中。
+#     (trigram 斷詞需要 SQLite 3.34 以上，且無法查詢兩個字的詞。)
+#  4. 每個執行緒使用自己的連線 (WAL 模式)，背景更新索引時介面執行緒仍可查詢。
+#
+# ===================================================================================
+
+import os, re, sqlite3, threading, time
+from subtitle_codec import load_srt
+from log_util import log
+
+VIDEO_EXTS = ('.mp4', '.mkv', '.mov', '.avi', '.webm', '.m4v')
+SUBTITLE_SUFFIXES = ('_combined.srt', '.srt', '_orig.srt')
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af\uff66-\uff9f'  # 假名、漢字、諺文、半形片假名
+_RUN_RE = re.compile(f'[{_CJK}]+|[^\\s{_CJK}]+')
+_CJK_RE = re.compile(f'[{_CJK}]')
+_WORD_RE = re.compile(r'\w+')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, video TEXT UNIQUE, subtitle TEXT, mtime REAL, size INTEGER);
+CREATE TABLE IF NOT EXISTS cues (id INTEGER PRIMARY KEY, file_id INTEGER, start INTEGER, end INTEGER, text TEXT, tokens TEXT);
+CREATE INDEX IF NOT EXISTS cues_file ON cues(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS cue_fts USING fts5(tokens, content='cues', content_rowid='id');
+'''
+
+def tokenize(text):
+    '''存入索引的詞：中日韓文字切成重疊的兩字詞，每段最後一個字另外保留，讓單字查詢也能命中。'''
+    tokens = []
+    for run in _RUN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return ' '.join(tokens)
+
+def build_query(text):
+    '''把使用者輸入轉成 FTS5 查詢：中日韓文字為兩字詞片語，其他文字為字首比對，各段之間為 AND。'''
+    terms = []
+    for run in _RUN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            terms.append(f'"{run}"*' if len(run) == 1 else '"' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+        else:
+            terms.extend(f'"{word}"*' for word in _WORD_RE.findall(run))
+    return ' '.join(terms)
+
+def find_subtitle(video_path):
+    '''回傳影片旁優先使用的字幕檔，沒有字幕時回傳 None。'''
+    base = os.path.splitext(video_path)[0]
+    for suffix in SUBTITLE_SUFFIXES:
+        if os.path.exists(base + suffix): return base + suffix
+    return None
+
+def scan_videos(roots):
+    '''遞迴列出 roots 底下有字幕的影片：[(影片, 字幕), ...]。'''
+    found = []
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if name.lower().endswith(VIDEO_EXTS):
+                    video = os.path.join(dirpath, name)
+                    subtitle = find_subtitle(video)
+                    if subtitle: found.append((video, subtitle))
+    return found
+
+class TranscriptIndex:
+    def __init__(self, db_path="subtitle_index.db"):
+        self.db_path = os.path.abspath(db_path)
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        with self.write_lock: self.conn.executescript(_SCHEMA)
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def update(self, roots):
+        '''增量更新 roots 底下的影片字幕，回傳 (重新索引數, 移除數)。'''
+        t0, conn = time.perf_counter(), self.conn
+        roots = [os.path.abspath(r) for r in roots if os.path.isdir(r)]
+        known = {video: (subtitle, mtime, size) for video, subtitle, mtime, size in conn.execute("SELECT video, subtitle, mtime, size FROM files")}
+        seen, changed = set(), 0
+        for video, subtitle in scan_videos(roots):
+            seen.add(video)
+            st = os.stat(subtitle)
+            if known.get(video) != (subtitle, st.st_mtime, st.st_size):
+                self.add(video, subtitle)
+                changed += 1
+        in_roots = lambda path: any(os.path.commonpath([root, path]) == root for root in roots)
+        removed = [video for video in known if video not in seen and in_roots(video)]
+        for video in removed: self.remove(video)
+        log(f"字幕索引更新: {changed} 個重新索引, {len(removed)} 個移除, 共 {len(seen)} 部影片 ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        return changed, len(removed)
+
+    def add(self, video, subtitle=None):
+        '''(重新) 索引一部影片的字幕；subtitle 省略時自動尋找。'''
+        subtitle = subtitle or find_subtitle(video)
+        if not subtitle: return 0
+        st = os.stat(subtitle)
+        cues = load_srt(subtitle)
+        with self.write_lock, self.conn as conn:
+            self._delete(conn, video)
+            file_id = conn.execute("INSERT INTO files (video, subtitle, mtime, size) VALUES (?, ?, ?, ?)",
+                                   (video, subtitle, st.st_mtime, st.st_size)).lastrowid
+            for cue in cues:
+                tokens = tokenize(cue['original'])
+                rowid = conn.execute("INSERT INTO cues (file_id, start, end, text, tokens) VALUES (?, ?, ?, ?, ?)",
+                                     (file_id, cue['start'], cue['end'], cue['original'], tokens)).lastrowid
+                conn.execute("INSERT INTO cue_fts (rowid, tokens) VALUES (?, ?)", (rowid, tokens))
+        return len(cues)
+
+    def remove(self, video):
+        with self.write_lock, self.conn as conn: self._delete(conn, video)
+
+    def _delete(self, conn, video):
+        row = conn.execute("SELECT id FROM files WHERE video = ?", (video,)).fetchone()
+        if not row: return
+        # 外部內容的 FTS5 表需以 'delete' 指令帶入原本的內容才能移除
+        conn.execute("INSERT INTO cue_fts (cue_fts, rowid, tokens) SELECT 'delete', id, tokens FROM cues WHERE file_id = ?", row)
+        conn.execute("DELETE FROM cues WHERE file_id = ?", row)
+        conn.execute("DELETE FROM files WHERE id = ?", row)
+
+    def search(self, text, limit=200):
+        '''回傳 [{'video', 'subtitle', 'start', 'end', 'text'}, ...]，依影片與時間排序。'''
+        query = build_query(text)
+        if not query: return []
+        rows = self.conn.execute(
+            "SELECT f.video, f.subtitle, c.start, c.end, c.text FROM cue_fts JOIN cues c ON c.id = cue_fts.rowid "
+            "JOIN files f ON f.id = c.file_id WHERE cue_fts MATCH ? ORDER BY f.video, c.start LIMIT ?", (query, limit)).fetchall()
+        return [dict(zip(('video', 'subtitle', 'start', 'end', 'text'), row)) for row in rows]
+
+    def stats(self):
+        return self.conn.execute("SELECT (SELECT COUNT(*) FROM files), (SELECT COUNT(*) FROM cues)").fetchone()
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn: conn.close(); self.local.conn = None
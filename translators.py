@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  字幕翻譯後端 (線上 Google / 離線 CTranslate2)
+# ===================================================================================
+#
+#  說明：
+#  原本翻譯固定使用 GoogleTranslator，一句一次網路往返，速度受限於延遲與流量限制，離線時無法使用。
+#  1. 所有後端都提供 translate_batch(texts, progress=None) -> 譯文列表，失敗的句子回傳空字串。
+#  2. OfflineTranslator 以 CTranslate2 在 CPU 上執行本機的翻譯模型 (例如轉換後的 OPUS-MT 或 NLLB)：
+#     模型在每個工作行程啟動時只載入一次，字幕分批送到行程池平行翻譯。
+#  3. 依語言對在 config.json 的 "translators" 選擇後端，依序比對 "來源>目標"、"來源>*"、
+#     "*>目標"、"*"，都沒有時使用 Google，例如：
+#       "translators": {"ja>zh-TW": {"backend": "ctranslate2", "model": "D:/models/opus-mt-ja-zh",
+#                                    "workers": 2, "threads": 2, "batch_size": 16},
+#                       "*": {"backend": "google"}}
+#     NLLB 類模型另外設定 "source_prefix": "jpn_Jpan"、"target_prefix": "zho_Hant"。
+#  4. 建立好的後端依設定快取重複使用 (行程池不會每部影片重開)，程式結束時呼叫 shutdown()。
+#  5. 直接執行本檔可比較各後端的吞吐量：python translators.py config.json ja zh-TW
+#
+# ===================================================================================
+
+import json, os, sys, threading, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from process_util import spawn_context, hidden_main
+from log_util import log
+
+# whisper.cpp 的語言代碼與 Google 不同的部分
+_GOOGLE_CODES = {'zh': 'zh-CN', 'he': 'iw'}
+
+class GoogleTranslatorBackend:
+    name = "google"
+
+    def __init__(self, source, target):
+        self.source, self.target = _GOOGLE_CODES.get(source, source), target
+        self.local = threading.local()
+
+    def _translator(self):
+        # GoogleTranslator.translate() 會修改物件本身的狀態，同時翻譯的工作與背景翻譯各用自己的物件
+        translator = getattr(self.local, 'translator', None)
+        if translator is None:
+            from deep_translator import GoogleTranslator
+            translator = self.local.translator = GoogleTranslator(source=self.source, target=self.target)
+        return translator
+
+    def translate_batch(self, texts, progress=None):
+        translator, results = self._translator(), []
+        for i, text in enumerate(texts):
+            try: results.append(translator.translate(text) or "")
+            except Exception as e:
+                log(f"Google 翻譯失敗: {e}"); results.append("")
+            if progress: progress(i + 1, len(texts))
+        return results
+
+    def close(self):
+        pass
+
+# --- 離線翻譯的工作行程 (模型在 initializer 中載入一次，之後每批都沿用) ---
+_worker = {}
+
+def _load_tokenizer(path):
+    import sentencepiece
+    return sentencepiece.SentencePieceProcessor(model_file=path)
+
+def _init_worker(model_dir, threads, beam_size, source_prefix, target_prefix):
+    import ctranslate2
+    spm = lambda *names: next((os.path.join(model_dir, n) for n in names if os.path.exists(os.path.join(model_dir, n))), None)
+    source_spm = spm("source.spm", "sentencepiece.bpe.model", "spm.model")
+    if source_spm is None: raise FileNotFoundError(f"找不到 sentencepiece 模型: {model_dir}")
+    source = _load_tokenizer(source_spm)
+    _worker.update(translator=ctranslate2.Translator(model_dir, device="cpu", inter_threads=1, intra_threads=threads),
+                   source=source, target=_load_tokenizer(spm("target.spm")) if spm("target.spm") else source,
+                   beam_size=beam_size, source_prefix=source_prefix, target_prefix=target_prefix)
+
+def _translate_chunk(texts):
+    w = _worker
+    tokens = [([w['source_prefix']] if w['source_prefix'] else []) + w['source'].encode(t, out_type=str) + ["</s>"] for t in texts]
+    prefix = [[w['target_prefix']] for _ in texts] if w['target_prefix'] else None
+    results = w['translator'].translate_batch(tokens, target_prefix=prefix, beam_size=w['beam_size'], max_decoding_length=256)
+    out = []
+    for r in results:
+        hyp = [t for t in r.hypotheses[0] if t != w['target_prefix']]
+        out.append(w['target'].decode(hyp))
+    return out
+
+def _ping():
+    return os.getpid()
+
+class OfflineTranslator:
+    name = "ctranslate2"
+
+    def __init__(self, model, workers=2, threads=2, batch_size=16, beam_size=2, source_prefix=None, target_prefix=None):
+        '''model: CTranslate2 轉換後的模型資料夾；workers x threads 為使用的 CPU 核心數。'''
+        if not os.path.isdir(model): raise FileNotFoundError(f"找不到離線翻譯模型: {model}")
+        self.batch_size = batch_size
+        self.pool = ProcessPoolExecutor(workers, mp_context=spawn_context(), initializer=_init_worker,
+                                        initargs=(model, threads, beam_size, source_prefix, target_prefix))
+        self.lock = threading.Lock()
+        t0 = time.perf_counter()
+        # 先啟動所有工作行程並載入模型；之後提交工作時不會再產生新的行程
+        try:
+            with self.lock, hidden_main():
+                futures = [self.pool.submit(_ping) for _ in range(workers)]
+            for f in futures: f.result()
+        except Exception:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        log(f"離線翻譯: 載入 {model} ({workers} 個行程 x {threads} 執行緒, {time.perf_counter() - t0:.1f} 秒)")
+
+    def translate_batch(self, texts, progress=None):
+        chunks = [(i, texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        results = [""] * len(texts)
+        with self.lock, hidden_main():
+            futures = {self.pool.submit(_translate_chunk, chunk): i for i, chunk in chunks}
+        done = 0
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                try: translated = future.result()
+                except Exception as e:
+                    log(f"離線翻譯失敗 (第 {i + 1} 句起): {e}"); continue
+                results[i:i + len(translated)] = translated
+                done += len(translated)
+                if progress: progress(done, len(texts))
+        except BaseException:
+            for future in futures: future.cancel()
+            raise
+        return results
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def translator_spec(config, source, target):
+    '''依語言對回傳 config.json 中的後端設定。'''
+    table = (config or {}).get("translators", {})
+    for key in (f"{source}>{target}", f"{source}>*", f"*>{target}", "*"):
+        if key in table: return table[key]
+    return {"backend": "google"}
+
+_cache, _cache_lock = {}, threading.Lock()
+
+def get_translator(config, source, target):
+    '''回傳 (快取的) 翻譯後端；離線模型無法載入時改用 Google。'''
+    spec = translator_spec(config, source, target)
+    offline = spec.get("backend") == "ctranslate2"
+    key = json.dumps(spec, sort_keys=True) if offline else ("google", source, target)
+    with _cache_lock:
+        if offline and key not in _cache:
+            try: _cache[key] = OfflineTranslator(**{k: v for k, v in spec.items() if k != "backend"})
+            except Exception as e:
+                log(f"離線翻譯無法使用 ({e})，改用 Google 翻譯")
+                _cache[key] = None  # 之後同樣的設定直接使用 Google，不再重試
+        backend = _cache.get(key)
+        if backend is None:
+            # Google 後端只依語言對快取：同一個離線設定涵蓋的其他語言對各自有自己的後端
+            backend = _cache.get(("google", source, target)) or GoogleTranslatorBackend(source, target)
+            _cache[("google", source, target)] = backend
+        return backend
+
+def shutdown():
+    with _cache_lock:
+        for backend in set(_cache.values()) - {None}: backend.close()
+        _cache.clear()
+
+# --- 效能比較 ---
+def benchmark(config, source, target, texts):
+    '''回傳 {後端: 每秒句數}，線上與離線後端翻譯同一批字幕。'''
+    results = {}
+    for backend in {get_translator({}, source, target), get_translator(config, source, target)}:
+        t0 = time.perf_counter()
+        backend.translate_batch(texts)
+        results[backend.name] = len(texts) / (time.perf_counter() - t0)
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:] + ["config.json", "ja", "zh-TW"][len(sys.argv) - 1:]
+    config_path, source, target = args[:3]
+    with open(config_path, encoding='utf-8') as f: config = json.load(f)
+    sample = [f"これはテスト用の字幕です。番号 {i} の文を翻訳します。" for i in range(64)]
+    for name, value in benchmark(config, source, target, sample).items():
+        print(f"[BENCH] {name}: {value:.1f} 句/秒")
+    shutdown()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  介面增量更新層
+# ===================================================================================
+#
+#  說明：
+#  播放器每次更新時先算出「應該顯示的狀態」(目前字幕編號、進度條整數位置、播放狀態)，
+#  交給 UiUpdater 與上次實際繪製的狀態比較，只有改變的部分才會呼叫元件的設定函式。
+#  next_tick_interval() 則依照下一個字幕切換點與下一格進度條的時間計算更新間隔，
+#  取代固定週期的計時器。字幕切換點準時觸發；進度條最多每 slider_min_ms 更新一次，
+#  短片沒有字幕變化時也不會每十幾毫秒醒來一次。
+#
+# ===================================================================================
+
+_UNSET = object()
+
+class UiUpdater:
+    def __init__(self, **renderers):
+        '''renderers: 狀態名稱 -> 只接受新值的更新函式，例如 slider=scale.set。'''
+        self.renderers = renderers
+        self.last = {}
+
+    def render(self, **state):
+        for key, value in state.items():
+            if self.last.get(key, _UNSET) != value:
+                self.last[key] = value
+                self.renderers[key](value)
+
+    def invalidate(self, *keys):
+        '''強制下次 render 時重新繪製 (例如換影片或元件被外部改寫後)。'''
+        if keys:
+            for key in keys: self.last.pop(key, None)
+        else:
+            self.last.clear()
+
+def slider_step(pos_ms, length_ms, steps):
+    if length_ms <= 0: return 0
+    return max(0, min(steps, pos_ms * steps // length_ms))
+
+def next_tick_interval(pos_ms, length_ms, steps, cue_index=None, rate=1.0, min_ms=15, max_ms=1000, slider_min_ms=100):
+    '''回傳距離下一次畫面需要改變的毫秒數 (下一個字幕切換點，或下一格進度條但至少 slider_min_ms)。'''
+    rate, delays = rate if rate > 0 else 1.0, []
+    if length_ms > 0:
+        step = slider_step(pos_ms, length_ms, steps)
+        if step < steps:
+            delays.append(max(slider_min_ms, (-(-(step + 1) * length_ms // steps) - pos_ms) / rate))
+    if cue_index is not None:
+        boundary = cue_index.next_boundary(pos_ms)
+        if boundary is not None: delays.append((boundary - pos_ms) / rate)
+    if not delays:
+        return max_ms
+    return int(max(min_ms, min(max_ms, min(delays))))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  VLC 播放器管理
+# ===================================================================================
+#
+#  說明：
+#  整個程式只建立一個 libVLC 實例與一個 media player，換影片時重複使用，
+#  避免每次處理影片都重新掃描外掛並遺留舊的實例。
+#  1. 只有實例參數 (例如硬體解碼模式 --avcodec-hw) 改變時才釋放並重建實例；
+#     重建前已預先解析的影片會在新實例上重新解析。
+#  2. preparse() 在選擇影片後就以 parse_with_options 非同步解析媒體，
+#     真正開啟時直接使用已解析的 Media 物件。
+#  3. timings 記錄實例建立、媒體開啟與開始播放所花費的時間 (毫秒)。
+#  4. attach_subtitles() 把記憶體中的字幕寫到 tmpfs (若有) 的暫存檔，並以
+#     media.slaves_add 掛到 Media 上，不需在影片旁寫檔或更名原始字幕。
+#
+# ===================================================================================
+
+import os, tempfile, time, vlc
+from pathlib import Path
+from log_util import log
+
+# Linux 的 /dev/shm 為記憶體檔案系統；其他平台退回系統暫存資料夾
+SUBTITLE_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+
+class VlcPlayerManager:
+    def __init__(self, base_args=("--no-sub-autodetect-file",), on_player_created=None):
+        self.base_args = list(base_args)
+        self.on_player_created = on_player_created
+        self.instance, self.player, self.args = None, None, None
+        self.preparsed = {}
+        self.timings = {}
+        self._open_started = None
+        self._subtitle_file, self._stale_subtitle_files = None, []
+
+    def instance_args(self, hw_mode=None):
+        '''hw_mode: --avcodec-hw 的值 (例如 "none"、"d3d11va")；None 或 "any" 使用 VLC 預設。'''
+        return self.base_args + ([f"--avcodec-hw={hw_mode}"] if hw_mode and hw_mode != 'any' else [])
+
+    def ensure(self, hw_mode=None):
+        '''回傳可重複使用的 media player；實例參數改變時才重建。'''
+        args = self.instance_args(hw_mode)
+        if self.instance is not None and args == self.args:
+            return self.player
+        paths = list(self.preparsed)  # Media 屬於舊實例，重建後重新解析
+        self.release()
+        t0 = time.perf_counter()
+        self.instance = vlc.Instance(args)
+        self.timings['instance_ms'] = (time.perf_counter() - t0) * 1000
+        self.args = args
+        self.player = self.instance.media_player_new()
+        self.player.event_manager().event_attach(vlc.EventType.MediaPlayerPlaying, self._on_playing)
+        if self.on_player_created: self.on_player_created(self.player)
+        log(f"VLC 實例已建立，參數: {args}，耗時 {self.timings['instance_ms']:.0f} ms")
+        for path in paths: self.preparse(path)
+        return self.player
+
+    def preparse(self, path, timeout_ms=5000):
+        '''非同步預先解析媒體 (在 libVLC 的執行緒進行，立即返回)。'''
+        if self.instance is None or path in self.preparsed: return
+        media = self.instance.media_new(path)
+        media.parse_with_options(vlc.MediaParseFlag.local, timeout_ms)
+        self.preparsed[path] = media
+
+    def open(self, path):
+        '''將影片設定到共用的 player，優先使用已預先解析的 Media。'''
+        t0 = time.perf_counter()
+        media = self.preparsed.pop(path, None)
+        reused = media is not None
+        if media is None: media = self.instance.media_new(path)
+        self.player.set_media(media)
+        self.timings['media_open_ms'] = (time.perf_counter() - t0) * 1000
+        self.timings['media_preparsed'] = reused
+        self._open_started = time.perf_counter()
+        return media
+
+    def attach_subtitles(self, media, srt_text, suffix=".srt"):
+        '''將字幕文字以 slave 方式掛到 media (需在 play() 之前呼叫)；ASS 字幕傳入 suffix=".ass"。'''
+        self._remove_subtitle_file()
+        fd, path = tempfile.mkstemp(prefix="subplayer_", suffix=suffix, dir=SUBTITLE_TEMP_DIR)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f: f.write(srt_text)
+        self._subtitle_file = path
+        media.slaves_add(vlc.MediaSlaveType.subtitle, 4, Path(path).as_uri())
+        log(f"已掛載字幕軌: {path}")
+
+    def replace_subtitles(self, srt_text, suffix=".srt"):
+        '''播放中更新字幕 (例如背景翻譯有了新的譯文)：新的字幕檔以 slave 加到 player 並選用。
+        VLC 仍可能開著舊檔，舊檔等下一部影片掛載字幕或釋放時才刪除。'''
+        if not self.player: return
+        fd, path = tempfile.mkstemp(prefix="subplayer_", suffix=suffix, dir=SUBTITLE_TEMP_DIR)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f: f.write(srt_text)
+        if self._subtitle_file: self._stale_subtitle_files.append(self._subtitle_file)
+        self._subtitle_file = path
+        self.player.add_slave(vlc.MediaSlaveType.subtitle, Path(path).as_uri(), True)
+        log(f"已更新字幕軌: {path}")
+
+    def _remove_subtitle_file(self):
+        if self._subtitle_file: self._stale_subtitle_files.append(self._subtitle_file)
+        for path in self._stale_subtitle_files:
+            try: os.remove(path)
+            except OSError as e: log(f"刪除暫存字幕失敗: {e}")
+        self._subtitle_file, self._stale_subtitle_files = None, []
+
+    def _on_playing(self, event):
+        if self._open_started is not None:
+            self.timings['open_to_playing_ms'] = (time.perf_counter() - self._open_started) * 1000
+            self._open_started = None
+            log(f"VLC 計時: {self.timings}")
+
+    def release(self):
+        if self.player:
+            self.player.stop()
+            self.player.release()
+        for media in self.preparsed.values(): media.release()
+        if self.instance: self.instance.release()
+        self.instance, self.player, self.args = None, None, None
+        self.preparsed.clear()
+        self._remove_subtitle_file()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  讀取 whisper.cpp 的 JSON 輸出 (-ojf)
+# ===================================================================================
+#
+#  說明：
+#  取代「whisper.cpp 寫 SRT → 讀回 → 解析」的流程：SRT 會丟掉 token 機率與辨識出的語言，
+#  而且每部影片多一次寫檔、讀檔與解析。
+#  1. 一次讀取 -ojf 的 JSON，直接建成播放器使用的字幕清單，每句另外保留
+#     'confidence' (該句 token 機率的平均) 與 'words' (逐字時間，見 word_timing.py)。
+#  2. 回傳 whisper.cpp 辨識出的語言 (-l auto 時才有意義)，翻譯時可作為來源語言。
+#  3. SRT 只在最後由 subtitle_codec.save_srt() 輸出到影片旁，供其他播放器使用。
+#
+# ===================================================================================
+
+import json
+from word_timing import segment_tokens, group_words, align_words
+from log_util import log
+
+def load_whisper_json(path):
+    '''讀取 -ojf 的輸出檔 (無法解碼的位元組會被替換)。'''
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return json.load(f)
+
+def _confidence(segment):
+    probs = [t['p'] for t in segment.get('tokens', ()) if 'p' in t and not t.get('text', '').startswith(('[_', '<|'))]
+    return sum(probs) / len(probs) if probs else None
+
+def parse_whisper_json(data):
+    '''回傳 (字幕清單, 辨識語言)；字幕格式與 subtitle_codec 相同，另有 'confidence' 與 'words'。'''
+    cues = []
+    for segment in data.get('transcription', []):
+        text = segment.get('text', '').strip()
+        if not text: continue
+        start, end = segment['offsets']['from'], segment['offsets']['to']
+        cues.append({'start': start, 'end': max(start, end), 'original': text, 'translated': '',
+                     'confidence': _confidence(segment), 'words': align_words(text, group_words(segment_tokens(segment)))})
+    language = data.get('result', {}).get('language') or data.get('params', {}).get('language')
+    return cues, language
+
+def load_transcript(path, low_confidence=0.5):
+    '''讀取並解析 -ojf 的輸出，記錄語言與低信心句數，回傳 (字幕清單, 辨識語言)。'''
+    cues, language = parse_whisper_json(load_whisper_json(path))
+    low = sum(1 for cue in cues if cue['confidence'] is not None and cue['confidence'] < low_confidence)
+    log(f"whisper.cpp 輸出: {len(cues)} 句, 語言 {language}, 低信心 (< {low_confidence}) {low} 句")
+    return cues, language
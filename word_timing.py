@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  逐字時間 (whisper.cpp -ojf)
+# ===================================================================================
+#
+#  說明：
+#  SRT 只有整句的時間，字幕只能整行顯示。whisper.cpp -ojf 輸出的 JSON (由 whisper_json.py 讀取)
+#  中每個 token 都有開始/結束時間，這裡把 token 合併成詞並對齊到字幕文字上。
+#  1. 以空白開頭的 token 開始一個新詞；中日韓文字沒有空白，每個 token 各自成為一個詞。
+#     [_BEG_]、[_TT_xxx] 等特殊 token 直接略過。
+#  2. 每句字幕的詞存成 cue['words'] = ((開始毫秒, 結束毫秒, 起始字元, 結束字元), ...)，
+#     以字元位置指向 cue['original']，不重複存放文字；找不到對應文字的詞直接略過。
+#  3. word_at() 回傳某個時間點正在唸的詞，一句只有十幾個詞，線性搜尋即可。
+#
+# ===================================================================================
+
+import re
+
+_CJK_RE = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af\uff66-\uff9f]')  # 假名、漢字、諺文
+
+def segment_tokens(segment):
+    '''回傳一段的 [(開始毫秒, 結束毫秒, token 文字), ...]，不含特殊 token。'''
+    return [(t['offsets']['from'], t['offsets']['to'], t['text']) for t in segment.get('tokens', ())
+            if t.get('text') and not t['text'].startswith(('[_', '<|'))]
+
+def group_words(tokens):
+    '''把 token 合併成詞：[(開始毫秒, 結束毫秒, 文字), ...]。'''
+    words = []
+    for start, end, text in tokens:
+        if words and not text[:1].isspace() and not _CJK_RE.match(text) and not _CJK_RE.match(words[-1][2][-1:]):
+            words[-1] = (words[-1][0], end, words[-1][2] + text)
+        else:
+            words.append((start, end, text))
+    return words
+
+def align_words(text, words):
+    '''把詞對齊到字幕文字上，回傳 ((開始毫秒, 結束毫秒, 起始字元, 結束字元), ...)。'''
+    aligned, pos = [], 0
+    for start, end, word in words:
+        word = word.strip()
+        index = text.find(word, pos) if word else -1
+        if index < 0: continue  # 例如被切開的多位元組字元
+        aligned.append((start, end, index, index + len(word)))
+        pos = index + len(word)
+    return tuple(aligned)
+
+def word_at(words, ms):
+    '''回傳 ms 時正在唸的詞的編號，沒有則回傳 -1。'''
+    for i, (start, end, _, _) in enumerate(words or ()):
+        if start <= ms < end: return i
+        if ms < start: break
+    return -1
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# ===================================================================================
+#  每個處理工作的暫存資料夾
+# ===================================================================================
+#
+#  說明：
+#  取代寫在目前資料夾的共用 temp_audio.wav，讓多部影片可以同時處理而不互相覆蓋。
+#  1. 每個工作建立自己的資料夾；/dev/shm (tmpfs) 可寫且剩餘空間足夠時優先使用，
+#     否則退回系統暫存資料夾。
+#  2. path(name, filename) 登記工作產生的檔案 (音訊、原始 SRT、快取…)，
+#     export() 把最終結果 (例如字幕) 複製到影片旁邊。
+#  3. cleanup() 依登記的相反順序刪除檔案再移除資料夾，可重複呼叫；
+#     搭配 with 使用時離開區塊即清除。程式異常結束留下的資料夾由 sweep_stale() 清除。
+#
+# ===================================================================================
+
+import os, re, shutil, tempfile, time
+from log_util import log
+
+def workspace_root(min_free_mb=2048):
+    '''回傳存放工作資料夾的根目錄。'''
+    base = tempfile.gettempdir()
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) and shutil.disk_usage("/dev/shm").free >= min_free_mb * 1048576:
+        base = "/dev/shm"
+    root = os.path.join(base, "subplayer_jobs")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+def sweep_stale(root=None, max_age_hours=24):
+    '''刪除超過 max_age_hours 未更動的工作資料夾 (上次程式異常結束時留下的)。'''
+    root = root or workspace_root()
+    cutoff = time.time() - max_age_hours * 3600
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            log(f"已清除過期的工作資料夾: {entry.path}")
+
+class JobWorkspace:
+    def __init__(self, video_path, root=None):
+        self.video_path = video_path
+        name = re.sub(r'[^\w.-]+', '_', os.path.splitext(os.path.basename(video_path))[0])[:40]
+        self.dir = tempfile.mkdtemp(prefix=f"{name}_", dir=root or workspace_root())
+        self.artifacts = {}
+        self.closed = False
+        log(f"建立工作資料夾: {self.dir}")
+
+    def path(self, name, filename):
+        '''登記並回傳工作資料夾中的檔案路徑。'''
+        path = os.path.join(self.dir, filename)
+        self.artifacts[name] = path
+        return path
+
+    def export(self, name, dest):
+        '''將登記的檔案複製到 dest (例如影片旁的字幕檔)。'''
+        shutil.copyfile(self.artifacts[name], dest)
+        log(f"已輸出 {name}: {dest}")
+        return dest
+
+    def size_bytes(self):
+        return sum(os.path.getsize(p) for p in self.artifacts.values() if os.path.exists(p))
+
+    def cleanup(self):
+        if self.closed: return
+        self.closed = True
+        for name, path in reversed(list(self.artifacts.items())):
+            try: os.remove(path)
+            except FileNotFoundError: pass
+            except OSError as e: log(f"刪除暫存檔 {name} 失敗: {e}")
+        shutil.rmtree(self.dir, ignore_errors=True)
+        log(f"已清除工作資料夾: {self.dir}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()